@@ -0,0 +1,5 @@
+"""
+Benchmarks measuring the per-step overhead of `Loop` against a bare `for batch in dl` loop.
+
+Run with `python -m benchmarks` (see `python -m benchmarks --help`).
+"""
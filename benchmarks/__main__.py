@@ -0,0 +1,95 @@
+import argparse
+import os
+import sys
+from typing import Any, Optional
+
+from .cases import all_cases
+from .runner import DEFAULT_TOLERANCE, compare, load_results, run, save_results
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def _parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Measure the per-step overhead of dloop.Loop against a bare for loop.",
+    )
+    parser.add_argument("--steps", type=int, default=10_000, help="steps per run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (the median is kept)")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument(
+        "--output", default="benchmark_results.json", help="file the results are written to"
+    )
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline to compare to")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="relative slowdown reported as a regression (raised for noisy cases)",
+    )
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="write the results to the baseline"
+    )
+    return parser.parse_args(argv)
+
+
+def _print_results(results: dict[str, Any], baseline: Optional[dict[str, Any]]) -> None:
+    header = (
+        f"{'case':<54} {'raw':>9} {'loop':>9} {'overhead':>9} {'baseline':>9} "
+        f"{'relative':>8} {'baseline':>8} {'blocks':>7} {'low-alloc':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name) if baseline else None
+        base_str = f"{base['loop_ns_per_step']:9.0f}" if base else f"{'-':>9}"
+        if base and "relative_loop" in base:
+            base_relative = f"{base['relative_loop']:8.2f}"
+        else:
+            base_relative = f"{'-':>8}"
+        print(
+            f"{name:<54} {result['raw_ns_per_step']:9.0f} {result['loop_ns_per_step']:9.0f} "
+            f"{result['overhead_ns_per_step']:9.0f} {base_str} "
+            f"{result['relative_loop']:8.2f} {base_relative} "
+            f"{result['blocks_per_step']:7.2f} {result['low_allocation_blocks_per_step']:9.2f}"
+        )
+    print(
+        "(ns/step, ns/step relative to a bare loop over a generator, and memory blocks allocated "
+        "per step with and without low_allocation=True)"
+    )
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = _parse_args(argv)
+
+    cases = [case for case in all_cases() if args.filter in case.name]
+    results = run(cases, n_steps=args.steps, repeat=args.repeat)
+    save_results(args.output, results)
+
+    baseline = load_results(args.baseline)
+    _print_results(results, baseline)
+
+    if args.update_baseline:
+        save_results(args.baseline, results)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"No baseline found at {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, tolerance=args.tolerance)
+    if regressions:
+        # only report the cases that are slower again when measured a second time, so that a
+        # burst of load on the machine doesn't fail the comparison
+        print(f"Measuring {len(regressions)} slower case(s) again")
+        cases = [case for case in cases if case.name in regressions]
+        results = run(cases, n_steps=args.steps, repeat=args.repeat)
+        regressions = compare(results, baseline, tolerance=args.tolerance)
+    for name in regressions:
+        print(f"REGRESSION: {name}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import itertools
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from typing import Any, Callable, Literal, Optional
+
+from dloop import Event
+
+DataloaderKind = Literal["list", "generator", "slow"]
+EventKind = Literal["step", "time", "condition"]
+
+DATALOADER_KINDS: tuple[DataloaderKind, ...] = ("list", "generator", "slow")
+EVENT_KINDS: tuple[EventKind, ...] = ("step", "time", "condition")
+EVENT_COUNTS = (0, 1, 10, 100)
+# Chunk size of the chunked cases, run without events and with 10 events of each kind
+CHUNK_SIZE = 16
+
+# Work done by the slow producer for each batch
+_SLOW_PRODUCER_WORK = 200
+
+
+class _Unsized:
+    """Iterable hiding the length of the wrapped one, to force the unknown length path."""
+
+    def __init__(self, iterable: Iterable):
+        self.iterable = iterable
+
+    def __iter__(self) -> Iterator:
+        return iter(self.iterable)
+
+
+def _generator(n_steps: int) -> Iterator[int]:
+    yield from range(n_steps)
+
+
+def _slow_producer(n_steps: int) -> Iterator[int]:
+    for i in range(n_steps):
+        sum(range(_SLOW_PRODUCER_WORK))
+        yield i
+
+
+def make_dataloader(kind: DataloaderKind, n_steps: int) -> Iterable:
+    """
+    Create a dataloader yielding `n_steps` batches.
+
+    Args:
+        kind: "list", "generator", or "slow" (a generator doing some work for each batch)
+        n_steps: Number of batches
+
+    Returns:
+        Iterable: The dataloader. Only the "list" dataloader has a length
+    """
+    if kind == "list":
+        return list(range(n_steps))
+    elif kind == "generator":
+        return _generator(n_steps)
+    elif kind == "slow":
+        return _slow_producer(n_steps)
+    raise ValueError(f"Unknown dataloader {kind=}")
+
+
+def _every_n_global_steps(n: int) -> Callable[[Any], bool]:
+    def condition(loop_state) -> bool:
+        return (loop_state.global_step + 1) % n == 0
+
+    return condition
+
+
+def make_events(kind: EventKind, count: int) -> dict[str, Event]:
+    """
+    Create `count` events of the given kind, with periods 1, 2, ..., count.
+
+    Args:
+        kind: "step" (every_n_steps), "time" (every_n_seconds, in milliseconds), or "condition"
+            (a condition function)
+        count: Number of events
+
+    Returns:
+        dict[str, Event]: The events
+    """
+    if kind == "step":
+        return {f"step_{i}": Event(every_n_steps=i + 1) for i in range(count)}
+    elif kind == "time":
+        return {f"time_{i}": Event(every_n_seconds=(i + 1) / 1000) for i in range(count)}
+    elif kind == "condition":
+        return {
+            f"condition_{i}": Event(condition_function=_every_n_global_steps(i + 1))
+            for i in range(count)
+        }
+    raise ValueError(f"Unknown event {kind=}")
+
+
+@dataclass(frozen=True)
+class Case:
+    """A benchmark configuration."""
+
+    dataloader: DataloaderKind
+    known_length: bool
+    event_kind: Optional[EventKind]
+    n_events: int
+    chunk_size: Optional[int] = None
+
+    @property
+    def name(self) -> str:
+        length = "known" if self.known_length else "unknown"
+        events = f"{self.n_events}_{self.event_kind}" if self.n_events else "no"
+        name = f"{self.dataloader}/{length}_length/{events}_events"
+        if self.chunk_size is not None:
+            name += f"/chunk_{self.chunk_size}"
+        return name
+
+
+def all_cases() -> list[Case]:
+    """
+    Every combination of dataloader, length path, event kind and number of events, and the
+    chunked mode (with `CHUNK_SIZE`) without events and with 10 events of each kind.
+
+    Returns:
+        list[Case]: The cases, with a single case without events per dataloader, length path and
+            mode
+    """
+    cases = []
+    for dataloader, known_length in itertools.product(DATALOADER_KINDS, (True, False)):
+        cases.append(Case(dataloader, known_length, None, 0))
+        for event_kind, n_events in itertools.product(EVENT_KINDS, EVENT_COUNTS):
+            if n_events:
+                cases.append(Case(dataloader, known_length, event_kind, n_events))
+        cases.append(Case(dataloader, known_length, None, 0, CHUNK_SIZE))
+        for event_kind in EVENT_KINDS:
+            cases.append(Case(dataloader, known_length, event_kind, 10, CHUNK_SIZE))
+    return cases
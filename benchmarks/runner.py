@@ -0,0 +1,262 @@
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+from collections.abc import Iterable
+from typing import Any, Optional
+
+from dloop import Loop
+from dloop.chunking import get_iter_chunks_with_events
+from dloop.iter_logic import get_iter_dl_with_events
+
+from .cases import Case, DataloaderKind, _Unsized, make_dataloader, make_events
+
+# A case is reported as a regression if its median ns/step, relative to the reference loop,
+# exceeds the baseline by this fraction
+DEFAULT_TOLERANCE = 0.25
+
+# ... or by this many times the run-to-run noise of the case, if larger
+NOISE_FACTOR = 3
+
+# ... and by at least this many ns/step, below which differences are noise
+MIN_REGRESSION_NS = 25
+
+# ... or if it allocates more memory blocks per step than the baseline by this amount
+BLOCKS_PER_STEP_TOLERANCE = 0.5
+
+# Dataloader of the reference loop, timed around each run of `Loop` to cancel out changes in the
+# speed of the machine (frequency scaling, other load)
+_REFERENCE: DataloaderKind = "generator"
+
+# Steps of the allocation benchmark, which keeps everything yielded alive
+_ALLOCATION_STEPS = 1000
+
+
+def _raw_ns_per_step(kind: DataloaderKind, n_steps: int) -> float:
+    dl = make_dataloader(kind, n_steps)
+
+    start = time.perf_counter_ns()
+    for _ in dl:
+        pass
+    return (time.perf_counter_ns() - start) / n_steps
+
+
+def _loop_inputs(case: Case, n_steps: int) -> tuple[Iterable, Optional[dict], Optional[int]]:
+    dl = make_dataloader(case.dataloader, n_steps)
+    events = make_events(case.event_kind, case.n_events) if case.event_kind else None
+    if case.known_length:
+        dataloader_len = n_steps
+    else:
+        # lists have a length, hide it to benchmark the pairwise strategy
+        dl = _Unsized(dl) if case.dataloader == "list" else dl
+        dataloader_len = None
+    return dl, events, dataloader_len
+
+
+def _loop_ns_per_step(case: Case, n_steps: int) -> float:
+    dl, events, dataloader_len = _loop_inputs(case, n_steps)
+
+    start = time.perf_counter_ns()
+    loop = Loop(
+        dl,
+        events=events,
+        max_epochs=1,
+        dataloader_len=dataloader_len,
+        chunk_size=case.chunk_size,
+    )
+    for _ in loop:
+        pass
+    return (time.perf_counter_ns() - start) / n_steps
+
+
+def blocks_per_step(case: Case, low_allocation: bool, n_steps: int = _ALLOCATION_STEPS) -> float:
+    """
+    Count the memory blocks allocated per step for what `get_iter_dl_with_events` (or
+    `get_iter_chunks_with_events`, for chunked cases) yields.
+
+    Everything yielded (the tuple, the LoopState and batch_events) is kept alive, so the growth
+    of the number of allocated blocks is what each step allocates for the caller. Chunks always
+    intern their events, so `low_allocation` doesn't change chunked cases.
+
+    Args:
+        case: Case to benchmark
+        low_allocation: Whether to use the low-allocation mode
+        n_steps: Number of steps
+
+    Returns:
+        float: Memory blocks allocated per step
+    """
+    # a first run fills the free lists (e.g. of tuples) that the measured run then allocates
+    # from, so that the count doesn't depend on what ran before
+    _count_blocks(case, low_allocation, n_steps)
+    blocks, n_measured_steps = _count_blocks(case, low_allocation, n_steps)
+    return blocks / n_measured_steps
+
+
+def _count_blocks(case: Case, low_allocation: bool, n_steps: int) -> tuple[int, int]:
+    # blocks allocated by the steps after the warm-up, and their number
+    dl, events, dataloader_len = _loop_inputs(case, n_steps)
+    if case.chunk_size is None:
+        iterator = get_iter_dl_with_events(
+            dl,
+            dl_len=dataloader_len,
+            max_epochs=1,
+            events=events,
+            return_loop_state=True,
+            low_allocation=low_allocation,
+        )
+    else:
+        iterator = get_iter_chunks_with_events(
+            dl, case.chunk_size, dl_len=dataloader_len, max_epochs=1, events=events
+        )
+    yielded = [None] * n_steps  # preallocated, so storing the results doesn't allocate
+
+    gc.disable()
+    try:
+        # warm up: the first step (or chunk) creates the scheduler's bookkeeping
+        yielded[0] = next(iterator)
+        n_warmup_steps = len(yielded[0][0]) if case.chunk_size is not None else 1
+        start = sys.getallocatedblocks()
+        for i, item in enumerate(iterator, start=1):
+            yielded[i] = item
+        blocks = sys.getallocatedblocks() - start
+    finally:
+        gc.enable()
+    return blocks, n_steps - n_warmup_steps
+
+
+def _median_and_noise(runs: list[float]) -> tuple[float, float]:
+    # the median of the runs, and their median absolute deviation relative to it
+    median = statistics.median(runs)
+    deviation = statistics.median(abs(run - median) for run in runs)
+    return median, deviation / median if median else 0.0
+
+
+def run_case(case: Case, n_steps: int, repeat: int) -> dict[str, float]:
+    """
+    Benchmark a case, keeping the median of `repeat` runs to reduce noise.
+
+    Each run of `Loop` is timed between two runs of a reference loop (a bare loop over a
+    generator), and its ns/step is also reported relative to them: the machine can change
+    speed from one case to the next, but barely within a run.
+
+    Args:
+        case: Case to benchmark
+        n_steps: Number of steps of each run
+        repeat: Number of runs
+
+    Returns:
+        dict[str, float]: ns/step of the bare loop, of `Loop`, and their difference, `Loop`'s
+            ns/step relative to the reference loop and the run-to-run noise of that ratio
+            (relative median absolute deviation), and the memory blocks allocated per step with
+            and without the low-allocation mode
+    """
+    raw, _ = _median_and_noise([_raw_ns_per_step(case.dataloader, n_steps) for _ in range(repeat)])
+    loops = []
+    relative_loops = []
+    for _ in range(repeat):
+        before = _raw_ns_per_step(_REFERENCE, n_steps)
+        loop = _loop_ns_per_step(case, n_steps)
+        after = _raw_ns_per_step(_REFERENCE, n_steps)
+        loops.append(loop)
+        relative_loops.append(2 * loop / (before + after))
+    loop = statistics.median(loops)
+    relative_loop, noise = _median_and_noise(relative_loops)
+    return {
+        "raw_ns_per_step": raw,
+        "loop_ns_per_step": loop,
+        "overhead_ns_per_step": loop - raw,
+        "relative_loop": relative_loop,
+        "loop_noise": noise,
+        "blocks_per_step": blocks_per_step(case, low_allocation=False),
+        "low_allocation_blocks_per_step": blocks_per_step(case, low_allocation=True),
+    }
+
+
+def run(cases: list[Case], n_steps: int, repeat: int) -> dict[str, Any]:
+    """
+    Benchmark all cases.
+
+    Args:
+        cases: Cases to benchmark
+        n_steps: Number of steps of each run
+        repeat: Number of runs per case
+
+    Returns:
+        dict[str, Any]: JSON-serializable results, with the run metadata and the results per case
+    """
+    return {
+        "metadata": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "n_steps": n_steps,
+            "repeat": repeat,
+        },
+        "results": {case.name: run_case(case, n_steps, repeat) for case in cases},
+    }
+
+
+def save_results(path: str, results: dict[str, Any]) -> None:
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_results(path: str) -> Optional[dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _is_slower(result: dict[str, float], base: dict[str, float], tolerance: float) -> bool:
+    # the tolerance is raised for noisy cases, and for fast ones where a few ns/step are noise
+    noise = max(result.get("loop_noise", 0.0), base.get("loop_noise", 0.0))
+    tolerance = max(tolerance, NOISE_FACTOR * noise, MIN_REGRESSION_NS / base["loop_ns_per_step"])
+    key = "loop_ns_per_step"
+    if "relative_loop" in result and "relative_loop" in base:
+        # compare relative to the reference loop, if both sides timed it
+        key = "relative_loop"
+    return result[key] > base[key] * (1 + tolerance)
+
+
+def compare(
+    results: dict[str, Any],
+    baseline: dict[str, Any],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> list[str]:
+    """
+    Find the cases that got slower than the baseline.
+
+    A case is slower if its median ns/step (relative to the reference loop, if both sides have
+    it) exceeds the baseline's by more than `tolerance`, or by more than `NOISE_FACTOR` times
+    the noise measured for the case (in either run) if that's larger, and by at least
+    `MIN_REGRESSION_NS`.
+
+    Args:
+        results: Results of `run`
+        baseline: Results of a previous `run`
+        tolerance: Allowed relative slowdown of `Loop`'s ns/step
+
+    Returns:
+        list[str]: Names of the cases slower than the baseline, or allocating more memory blocks
+            per step. Cases and measurements missing from either side are ignored
+    """
+    regressions = []
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        if _is_slower(result, base, tolerance):
+            regressions.append(name)
+            continue
+        for key in ["blocks_per_step", "low_allocation_blocks_per_step"]:
+            if key in result and key in base:
+                if result[key] > base[key] + BLOCKS_PER_STEP_TOLERANCE:
+                    regressions.append(name)
+                    break
+    return regressions
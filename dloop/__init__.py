@@ -1,12 +1,52 @@
 import importlib.metadata
 
 # Import key classes
+from .checkpoint import CheckpointWriter, load_checkpoint
+from .chunking import Chunk
+from .clock import VirtualClock
+from .distributed import LocalTimeSync
 from .events import Event, LoopEvents
-from .loop import Loop
+from .exceptions import DataloaderErrorRateExceeded
+from .loop import AsyncLoop, Loop
+from .metrics import Metrics
+from .mixing import MixedIterable, SourceBatch, SourceEpochEnd
+from .pipeline import Pipeline
+from .profiling import Profiler
+from .recovery import DataloaderError, ErrorPolicy
+from .schedule import EventSchedule
+from .timing import StepTimingStats
+from .triggers import Trigger, after, at, every, when
 from .types import LoopState
 
 # figure out version dynamically
 __version__ = importlib.metadata.version("dloop")
 
 # Define public API
-__all__ = ["Event", "LoopEvents", "Loop", "LoopState"]
+__all__ = [
+    "AsyncLoop",
+    "CheckpointWriter",
+    "Chunk",
+    "DataloaderError",
+    "DataloaderErrorRateExceeded",
+    "ErrorPolicy",
+    "Event",
+    "EventSchedule",
+    "LocalTimeSync",
+    "LoopEvents",
+    "Loop",
+    "LoopState",
+    "Metrics",
+    "MixedIterable",
+    "Pipeline",
+    "Profiler",
+    "SourceBatch",
+    "SourceEpochEnd",
+    "StepTimingStats",
+    "Trigger",
+    "VirtualClock",
+    "after",
+    "at",
+    "every",
+    "load_checkpoint",
+    "when",
+]
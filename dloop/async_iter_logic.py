@@ -0,0 +1,292 @@
+from collections import deque
+from collections.abc import AsyncGenerator, AsyncIterable
+from typing import Any, Callable, Optional
+
+from .clock import Clock, monotonic_clock
+from .events import Event, LoopEvents
+from .iter_logic import Batch, iter_dl_known_length, iter_dl_unknown_length_with_pairwise_load
+from .prefetch import DEFAULT_PREFETCH_DEPTH, aprefetch
+from .scheduler import EventScheduler
+from .types import LoopPosition, LoopState
+
+# Number of batches the iterators of `iter_logic` take before yielding a step: the current one and,
+# with the pairwise strategy, the next one
+_N_AHEAD = 2
+
+
+async def _askip(aiterable: AsyncIterable, n: int) -> AsyncGenerator[Any, None]:
+    # async counterpart of `islice(iterable, n, None)`
+    i = 0
+    async for item in aiterable:
+        if i >= n:
+            yield item
+        i += 1
+
+
+class _EpochBatches:
+    # the batches of an epoch fetched so far, iterated by the sync iterator
+    def __init__(self):
+        self.ready = deque()
+        self.n_fetched = 0
+        self.exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.ready:
+            return self.ready.popleft()
+        if not self.exhausted:
+            raise RuntimeError("The batch wasn't fetched ahead")
+        raise StopIteration
+
+
+class _AsyncEpochs:
+    """
+    Sync view of an async dataloader, so that the iterators of `iter_logic` do the bookkeeping of
+    the steps over it. The batches of each epoch are fetched ahead (see `_aiter_steps`), so that
+    iterating over them never has to wait.
+    """
+
+    def __init__(self, dl: AsyncIterable, prefetch_depth: int):
+        self.dl = dl
+        self.prefetch_depth = prefetch_depth
+        # epochs started but not iterated over yet, and the one being fetched
+        self._started: deque[_EpochBatches] = deque()
+        self.current: Optional[_EpochBatches] = None
+        self._batches: Optional[AsyncGenerator] = None
+
+    def skip(self, n: int) -> "_AsyncEpochs":
+        # seeking is done when the epoch starts being fetched
+        return self
+
+    def __iter__(self):
+        return self._started.popleft()
+
+    async def start(self, epoch: int, epoch_step: int) -> None:
+        """Start fetching the batches of `epoch` in the background, from `epoch_step` on."""
+        await self.aclose()
+        if hasattr(self.dl, "set_epoch"):
+            self.dl.set_epoch(epoch)
+        dl = self.dl
+        if epoch_step:
+            dl = dl.skip(epoch_step) if hasattr(dl, "skip") else _askip(dl, epoch_step)
+        self._batches = aprefetch(dl, self.prefetch_depth)
+        self.current = _EpochBatches()
+        self._started.append(self.current)
+
+    async def fill(self, n: int) -> None:
+        """Fetch batches of the current epoch until n are ready or the epoch is exhausted."""
+        current = self.current
+        while not current.exhausted and len(current.ready) < n:
+            try:
+                current.ready.append(await self._batches.__anext__())
+            except StopAsyncIteration:
+                current.exhausted = True
+            else:
+                current.n_fetched += 1
+
+    async def aclose(self) -> None:
+        """Stop fetching in the background."""
+        if self._batches is not None:
+            await self._batches.aclose()
+            self._batches = None
+
+
+async def _aiter_steps(
+    iter_f: Callable[..., Any],
+    dl: AsyncIterable,
+    max_epochs: Optional[int],
+    prefetch_depth: int,
+    resume_from: Optional[LoopPosition],
+    clock: Optional[Clock],
+    start_time: Optional[float],
+    **kwargs,
+) -> AsyncGenerator[tuple[Batch, LoopState], None]:
+    # drives the sync iterator `iter_f` over the async dataloader, fetching the batches it takes
+    # before resuming it
+    start = resume_from or LoopPosition()
+    if start_time is None:
+        # the time spent fetching the first batches counts
+        start_time = (clock or monotonic_clock)() - start.elapsed_seconds
+    epochs = _AsyncEpochs(dl, prefetch_depth)
+    steps = iter_f(
+        epochs,
+        max_epochs=max_epochs,
+        resume_from=resume_from,
+        clock=clock,
+        start_time=start_time,
+        **kwargs,
+    )
+    epoch = start.epoch
+    try:
+        await epochs.start(epoch, start.epoch_step)
+        while True:
+            await epochs.fill(_N_AHEAD)
+            current = epochs.current
+            if (
+                current.exhausted
+                and not current.ready
+                and current.n_fetched
+                and (max_epochs is None or epoch < max_epochs - 1)
+            ):
+                # the iterator may start the next epoch before its next step. An empty epoch
+                # ends the iteration instead
+                epoch += 1
+                await epochs.start(epoch, 0)
+                await epochs.fill(_N_AHEAD)
+
+            step = next(steps, None)
+            if step is None:
+                return
+            yield step
+            if step[1].training_end:
+                return
+            # don't keep the batch alive while the next one is loaded
+            step = None
+    finally:
+        steps.close()
+        # stop fetching in the background if we stop early
+        await epochs.aclose()
+
+
+def aiter_dl_known_length(
+    dl: AsyncIterable,
+    dl_len: int,
+    max_epochs: Optional[int] = None,
+    max_steps: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+    prefetch_depth: int = DEFAULT_PREFETCH_DEPTH,
+    resume_from: Optional[LoopPosition] = None,
+    clock: Optional[Clock] = None,
+    start_time: Optional[float] = None,
+) -> AsyncGenerator[tuple[Batch, LoopState], None]:
+    """
+    Async counterpart of `iter_dl_known_length`, yielding the same (batch, loop_state) pairs.
+
+    Batches are fetched by a background asyncio task that keeps up to `prefetch_depth` batches
+    ready, so network-bound fetching overlaps with the work done on each batch. The steps are
+    counted by `iter_dl_known_length` itself, over the fetched batches.
+
+    Args:
+        dl: The async dataloader to iterate over
+        dl_len: Length of the dataloader
+        max_epochs: Maximum number of epochs to iterate
+        max_steps: Maximum number of steps to iterate
+        max_seconds: Maximum number of seconds to iterate
+        prefetch_depth: Maximum number of batches fetched ahead
+        resume_from: Position to start iterating from, when resuming an interrupted loop. The
+            batches done in its epoch are skipped with the dataloader's `skip(n)` method if it
+            has one, and otherwise fetched and discarded
+        clock: Function returning the current time in seconds, read once per step.
+            Defaults to a monotonic clock
+        start_time: Clock reading at which the loop started. Defaults to reading the clock when
+            iteration begins (minus the elapsed seconds of resume_from)
+
+    Returns:
+        Async generator yielding (batch, loop_state) tuples
+    """
+    return _aiter_steps(
+        iter_dl_known_length,
+        dl,
+        dl_len=dl_len,
+        max_epochs=max_epochs,
+        max_steps=max_steps,
+        max_seconds=max_seconds,
+        prefetch_depth=prefetch_depth,
+        resume_from=resume_from,
+        clock=clock,
+        start_time=start_time,
+    )
+
+
+def aiter_dl_unknown_length(
+    dl: AsyncIterable,
+    max_epochs: Optional[int] = None,
+    max_steps: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+    prefetch_depth: int = DEFAULT_PREFETCH_DEPTH,
+    resume_from: Optional[LoopPosition] = None,
+    clock: Optional[Clock] = None,
+    start_time: Optional[float] = None,
+) -> AsyncGenerator[tuple[Batch, LoopState], None]:
+    """
+    Async counterpart of `iter_dl_unknown_length_with_pairwise_load`, which counts the steps over
+    the batches fetched by a background asyncio task. Each batch is yielded once the next one is
+    available (or the dl is exhausted), to be able to tell when the epoch is done, and iteration
+    stops on an empty epoch. Resuming works as in `aiter_dl_known_length`.
+    """
+    return _aiter_steps(
+        iter_dl_unknown_length_with_pairwise_load,
+        dl,
+        max_epochs=max_epochs,
+        max_steps=max_steps,
+        max_seconds=max_seconds,
+        prefetch_depth=prefetch_depth,
+        resume_from=resume_from,
+        clock=clock,
+        start_time=start_time,
+    )
+
+
+async def aget_iter_dl_with_events(
+    dl: AsyncIterable,
+    dl_len: Optional[int] = None,
+    max_epochs: Optional[int] = None,
+    max_steps: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+    events: Optional[dict[Any, Event]] = None,
+    prefetch_depth: int = DEFAULT_PREFETCH_DEPTH,
+    resume_from: Optional[LoopPosition] = None,
+    clock: Optional[Clock] = None,
+) -> AsyncGenerator[tuple[Any, set[LoopEvents]], None]:
+    """
+    Async counterpart of `get_iter_dl_with_events`.
+
+    Condition functions of the events may be coroutine functions, in which case they are awaited.
+
+    Args:
+        dl: The async dataloader to iterate over
+        dl_len: Optional length of the dataloader (if known)
+        max_epochs: Maximum number of epochs to iterate
+        max_steps: Maximum number of steps to iterate
+        max_seconds: Maximum number of seconds to iterate
+        events: Dictionary mapping event keys to Event instances
+        prefetch_depth: Maximum number of batches fetched ahead
+        resume_from: Position to start iterating from, when resuming an interrupted loop
+        clock: Function returning the current time in seconds, read once per step and shared by
+            max_seconds and the time-based events. Defaults to a monotonic clock
+
+    Returns:
+        Async generator yielding (batch, batch_events) tuples
+    """
+    scheduler = EventScheduler(events)
+    kwargs = {
+        "max_epochs": max_epochs,
+        "max_steps": max_steps,
+        "max_seconds": max_seconds,
+        "prefetch_depth": prefetch_depth,
+        "resume_from": resume_from,
+        "clock": clock,
+    }
+    batches: AsyncGenerator
+    if dl_len is not None:
+        batches = aiter_dl_known_length(dl, dl_len=dl_len, **kwargs)
+    else:
+        batches = aiter_dl_unknown_length(dl, **kwargs)
+
+    try:
+        async for batch, loop_state in batches:
+            batch_events = set()
+            if loop_state.epoch_end:
+                batch_events.add(LoopEvents.EPOCH_END)
+
+            if loop_state.training_end:
+                batch_events.add(LoopEvents.TRAINING_END)
+
+            batch_events |= await scheduler.atriggered_events(loop_state)
+
+            yield batch, batch_events
+    finally:
+        # stop fetching in the background if the consumer stops early
+        await batches.aclose()
@@ -0,0 +1,162 @@
+import math
+from collections.abc import Iterable
+from typing import Any, Optional
+
+from .state import event_key_id
+from .types import LoopState
+
+
+class _Boundary:
+    def __init__(self, start: float):
+        # elapsed seconds at the last occurrence (or the start of the run)
+        self.last = start
+        self.n_intervals = 0
+        self.mean_interval = 0.0
+        # seconds from the step of the last occurrence to the next step (e.g. an eval)
+        self.tail = 0.0
+
+    def predicted_end(self, max_seconds: float) -> float:
+        """Elapsed seconds at which the last occurrence that fits in `max_seconds` completes."""
+        if self.mean_interval <= 0:
+            return max_seconds
+        n_fitting = math.floor((max_seconds - self.last - self.tail) / self.mean_interval)
+        return self.last + max(n_fitting, 0) * self.mean_interval + self.tail
+
+
+class BudgetPlanner:
+    """
+    Plan where a time-limited loop ends, so it doesn't stop in the middle of an epoch or an eval.
+
+    Boundaries are event keys (e.g. `LoopEvents.EPOCH_END`, or an expensive "Eval" event) after
+    which ending the loop wastes no work. The time between consecutive occurrences of each boundary
+    is measured, along with the time the boundary step itself takes (e.g. running the eval). On a
+    boundary step, if no boundary is predicted to complete again within `max_seconds`, training
+    ends on that step instead of at the first step past the deadline.
+
+    Until a boundary has occurred, its interval is unknown and it isn't taken into account, so the
+    loop still stops at `max_seconds` if no boundary is reached in time.
+    """
+
+    def __init__(self, max_seconds: float, boundaries: Iterable[Any], start: float = 0.0):
+        """
+        Initialize the planner.
+
+        Args:
+            max_seconds: Time budget, in seconds since the loop started
+            boundaries: Event keys (custom or LoopEvents) on whose steps the loop may end
+            start: Elapsed seconds when the loop (re)started, from which the first occurrence of
+                each boundary is measured
+        """
+        self.max_seconds = max_seconds
+        self.boundaries = frozenset(boundaries)
+        self._state: dict[Any, _Boundary] = {}
+        # boundaries that occurred on the previous step, whose tail is measured on this one
+        self._previous: list[_Boundary] = []
+        self._previous_time = 0.0
+        self._start = start
+        # bookkeeping before the steps accounted for since the last one done, if they changed it
+        self._state_before_steps: Optional[dict] = None
+
+    def update(self, loop_state: LoopState, batch_events: Iterable[Any]) -> bool:
+        """
+        Account for a step, and set the predicted seconds until training ends as its
+        `eta_seconds`.
+
+        Must be called once per step, in order.
+
+        Args:
+            loop_state: State of the step
+            batch_events: Keys of the events triggered on the step
+
+        Returns:
+            bool: Whether training should end on this step
+        """
+        now = loop_state.elapsed_seconds
+        if self._state_before_steps is None and (
+            self._previous or not self.boundaries.isdisjoint(batch_events)
+        ):
+            self._state_before_steps = self._get_state()
+        if self._previous:
+            for boundary in self._previous:
+                boundary.tail = now - self._previous_time
+            self._previous = []
+
+        stop = stop_candidate = False
+        if not self.boundaries.isdisjoint(batch_events):
+            stop_candidate = True
+            for key in self.boundaries.intersection(batch_events):
+                boundary = self._state.get(key)
+                if boundary is None:
+                    boundary = self._state[key] = _Boundary(self._start)
+                interval = now - boundary.last
+                boundary.n_intervals += 1
+                boundary.mean_interval += (interval - boundary.mean_interval) / boundary.n_intervals
+                boundary.last = now
+                self._previous.append(boundary)
+            self._previous_time = now
+
+        known = [boundary for boundary in self._state.values() if boundary.n_intervals]
+        if stop_candidate and known:
+            # end here if no boundary can be reached (and completed) again within the budget
+            stop = all(
+                boundary.last + boundary.mean_interval + boundary.tail > self.max_seconds
+                for boundary in known
+            )
+
+        end = self.max_seconds
+        if stop:
+            end = now
+        elif known:
+            end = min(end, max(boundary.predicted_end(self.max_seconds) for boundary in known))
+        loop_state.eta_seconds = max(end - now, 0.0)
+        return stop
+
+    def _mark_done(self) -> None:
+        """Mark the steps accounted for so far as done, so that they're part of the saved state."""
+        self._state_before_steps = None
+
+    def _get_state(self, steps_done: bool = True) -> dict:
+        """
+        Bookkeeping to persist.
+
+        Args:
+            steps_done: Whether the steps accounted for are done. Otherwise, they're repeated
+                when resuming, so the bookkeeping from before them is returned
+        """
+        if not steps_done and self._state_before_steps is not None:
+            return self._state_before_steps
+        ids = {key: event_key_id(key) for key in self._state}
+        return {
+            "boundaries": {
+                ids[key]: {
+                    "last": boundary.last,
+                    "n_intervals": boundary.n_intervals,
+                    "mean_interval": boundary.mean_interval,
+                    "tail": boundary.tail,
+                }
+                for key, boundary in self._state.items()
+            },
+            "previous": [
+                ids[key] for key, boundary in self._state.items() if boundary in self._previous
+            ],
+            "previous_seconds": self._previous_time,
+        }
+
+    def _set_state(self, state: dict) -> None:
+        """
+        Restore the bookkeeping returned by `_get_state`.
+        """
+        keys_by_id = {event_key_id(key): key for key in self.boundaries}
+        self._state = {}
+        self._previous = []
+        for key_id, boundary_state in state["boundaries"].items():
+            if key_id not in keys_by_id:
+                continue
+            boundary = self._state[keys_by_id[key_id]] = _Boundary(boundary_state["last"])
+            boundary.n_intervals = boundary_state["n_intervals"]
+            boundary.mean_interval = boundary_state["mean_interval"]
+            boundary.tail = boundary_state["tail"]
+            if key_id in state["previous"]:
+                self._previous.append(boundary)
+        self._previous_time = state["previous_seconds"]
+        self._state_before_steps = None
@@ -0,0 +1,203 @@
+import concurrent.futures
+import os
+import pickle
+import tempfile
+import time
+from collections import deque
+from typing import Any, BinaryIO, Callable, Optional
+
+from .types import LoopState
+
+# Function taking a fast in-memory copy of the training state (model, optimizer, ...), called on
+# the training thread. The copy must not change while it's written in the background
+Snapshot = Callable[[], Any]
+
+# Function serializing a checkpoint to a binary file, like `pickle.dump` or `torch.save`
+Writer = Callable[[Any, BinaryIO], Any]
+
+# Size of the chunks in which rate-limited writes are flushed
+_THROTTLE_CHUNK_SIZE = 1 << 20
+
+
+class _ThrottledFile:
+    """Binary file wrapper that sleeps as needed to keep writes under `bytes_per_second`."""
+
+    def __init__(self, f: BinaryIO, bytes_per_second: float):
+        self._f = f
+        self._bytes_per_second = bytes_per_second
+        self._n_written = 0
+        self._started_at = time.perf_counter()
+
+    def write(self, data) -> int:
+        view = memoryview(data).cast("B")
+        for start in range(0, len(view), _THROTTLE_CHUNK_SIZE):
+            chunk = view[start : start + _THROTTLE_CHUNK_SIZE]
+            self._f.write(chunk)
+            self._n_written += len(chunk)
+            ahead = self._n_written / self._bytes_per_second - (
+                time.perf_counter() - self._started_at
+            )
+            if ahead > 0:
+                time.sleep(ahead)
+        return len(view)
+
+    def __getattr__(self, name):
+        # seek, tell, flush, ... are forwarded to the file
+        return getattr(self._f, name)
+
+
+class CheckpointWriter:
+    """
+    Write checkpoints in a background thread, so saving doesn't stall the training loop.
+
+    On every checkpoint, the training state is copied in memory on the training thread (with the
+    `snapshot` function), and the copy is serialized and written to disk by a background thread,
+    while training continues. Checkpoints are written to a temporary file which then replaces the
+    destination, so a checkpoint file is never partially written.
+
+    At most `max_in_flight` snapshots are kept in memory waiting to be (or being) written; a new
+    checkpoint waits until one of them is written. With the default of 1, one snapshot is written
+    while the next steps run, like a double buffer.
+
+    Example:
+        ```python
+        writer = CheckpointWriter(
+            "checkpoints/step-{global_step}.pt",
+            snapshot=lambda: {k: v.cpu().clone() for k, v in model.state_dict().items()},
+            write=torch.save,
+        )
+        loop = Loop(dataloader, max_steps=100_000, events=events, checkpoint=writer,
+                    checkpoint_on=["HourlyCheckpoint"])
+        ```
+    """
+
+    def __init__(
+        self,
+        path: str,
+        snapshot: Snapshot,
+        write: Writer = pickle.dump,
+        max_in_flight: int = 1,
+        max_bytes_per_second: Optional[float] = None,
+    ):
+        """
+        Initialize the writer.
+
+        Args:
+            path: Path of the checkpoint files. May contain `{epoch}` and `{global_step}`
+                placeholders, filled with the step the checkpoint is taken on
+            snapshot: Function returning a copy of the training state, which is written to
+                `path` along with the loop state as `{"loop": loop_state, "state": snapshot()}`
+            write: Function serializing the checkpoint to a binary file
+            max_in_flight: Maximum number of snapshots waiting to be written or being written
+            max_bytes_per_second: If provided, writes are slowed down to this rate, to leave I/O
+                bandwidth for the dataloader
+
+        Raises:
+            ValueError: If max_in_flight < 1 or max_bytes_per_second <= 0
+        """
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be >= 1, got {max_in_flight=}")
+        if max_bytes_per_second is not None and max_bytes_per_second <= 0:
+            raise ValueError(f"max_bytes_per_second must be > 0, got {max_bytes_per_second=}")
+
+        self.path = path
+        self.snapshot = snapshot
+        self.write = write
+        self.max_in_flight = max_in_flight
+        self.max_bytes_per_second = max_bytes_per_second
+
+        # writes are done one at a time, in order, by a single thread
+        self._pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._in_flight: deque[concurrent.futures.Future] = deque()
+
+    def save(self, loop_state_dict: dict, loop_state: LoopState) -> str:
+        """
+        Take a snapshot and write it in the background.
+
+        Blocks while `max_in_flight` snapshots are in flight.
+
+        Args:
+            loop_state_dict: State of the loop (see `Loop.state_dict`), stored in the checkpoint
+                to resume the loop from it
+            loop_state: State of the step the checkpoint is taken on
+
+        Returns:
+            str: Path the checkpoint is written to
+
+        Raises:
+            Exception: The exception raised by a previous write, if any failed
+        """
+        self._collect(block=len(self._in_flight) >= self.max_in_flight)
+
+        path = self.path.format(epoch=loop_state.epoch, global_step=loop_state.global_step)
+        checkpoint = {"loop": loop_state_dict, "state": self.snapshot()}
+
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="dloop-checkpoint"
+            )
+        self._in_flight.append(self._pool.submit(self._write, path, checkpoint))
+        return path
+
+    def _write(self, path: str, checkpoint: dict) -> None:
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".dloop-checkpoint-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                out = f
+                if self.max_bytes_per_second is not None:
+                    out = _ThrottledFile(f, self.max_bytes_per_second)
+                self.write(checkpoint, out)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _collect(self, block: bool) -> None:
+        # forget the finished writes, waiting for the oldest one if `block`, and re-raise the
+        # exception of a failed write
+        in_flight = self._in_flight
+        if block:
+            in_flight[0].result()
+        while in_flight and in_flight[0].done():
+            in_flight.popleft().result()
+
+    def wait(self) -> None:
+        """
+        Wait for all the pending writes to finish.
+
+        Raises:
+            Exception: The exception raised by a write, if any failed
+        """
+        in_flight, self._in_flight = self._in_flight, deque()
+        concurrent.futures.wait(in_flight)
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+        for future in in_flight:
+            future.result()
+
+    @property
+    def n_pending(self) -> int:
+        """Number of snapshots waiting to be written or being written."""
+        return sum(not future.done() for future in self._in_flight)
+
+
+def load_checkpoint(path: str, read: Callable[[BinaryIO], Any] = pickle.load) -> dict:
+    """
+    Read a checkpoint written by a `CheckpointWriter`.
+
+    Args:
+        path: Path of the checkpoint file
+        read: Function deserializing the checkpoint, matching the writer's `write` (e.g.
+            `torch.load`)
+
+    Returns:
+        dict: The checkpoint, as `{"loop": loop_state, "state": snapshot}`. Pass the loop state to
+        `Loop.load_state_dict` to resume the loop from the checkpoint
+    """
+    with open(path, "rb") as f:
+        return read(f)
@@ -0,0 +1,379 @@
+import math
+from array import array
+from bisect import bisect_left
+from collections.abc import Generator, Iterable, Iterator
+from itertools import accumulate, chain, islice
+from typing import Any, Callable, Optional
+
+from .clock import Clock, monotonic_clock
+from .events import Event
+from .iter_logic import NoLenIterationStrategy, _check_arguments, _check_count_limits
+from .mixing import SourceBatch, SourceEpochEnd
+from .prefetch import DEFAULT_PREFETCH_DEPTH, PrefetchIterable
+from .scheduler import EventScheduler
+from .types import LoopPosition, LoopState
+from .utils import iter_epoch
+
+
+class Chunk:
+    """
+    Consecutive batches of a loop, delivered together.
+
+    The position of each batch is stored in compact arrays (one entry per batch), and the events
+    triggered on each batch in `events`. A chunk never spans the end of an epoch or of training:
+    it's cut short after the batch ending them.
+    """
+
+    __slots__ = (
+        "batches",
+        "events",
+        "epoch",
+        "global_step",
+        "epoch_step",
+        "epoch_end",
+        "training_end",
+        "elapsed_seconds",
+        "eta_seconds",
+        "n_samples",
+        "n_tokens",
+        "paused_seconds",
+    )
+
+    def __init__(self):
+        self.batches: list = []
+        # events triggered on each batch
+        self.events: list = []
+        self.epoch = array("q")
+        self.global_step = array("q")
+        self.epoch_step = array("q")
+        self.epoch_end = array("b")
+        self.training_end = array("b")
+        self.elapsed_seconds = array("d")
+        # NaN where no ETA was predicted
+        self.eta_seconds = array("d")
+        self.n_samples = array("q")
+        self.n_tokens = array("q")
+        # seconds the loop was paused before the chunk (see `wall_seconds`)
+        self.paused_seconds = 0.0
+
+    def append(self, batch: Any, loop_state: LoopState, batch_events: Any) -> None:
+        self.batches.append(batch)
+        self.events.append(batch_events)
+        self.epoch.append(loop_state.epoch)
+        self.global_step.append(loop_state.global_step)
+        self.epoch_step.append(loop_state.epoch_step)
+        self.epoch_end.append(loop_state.epoch_end)
+        self.training_end.append(loop_state.training_end)
+        self.elapsed_seconds.append(loop_state.elapsed_seconds)
+        eta_seconds = loop_state.eta_seconds
+        self.eta_seconds.append(math.nan if eta_seconds is None else eta_seconds)
+        self.n_samples.append(loop_state.n_samples)
+        self.n_tokens.append(loop_state.n_tokens)
+
+    def __len__(self) -> int:
+        return len(self.batches)
+
+    @property
+    def wall_seconds(self) -> array:
+        """Seconds since the loop started of each batch, including the time it was paused."""
+        paused_seconds = self.paused_seconds
+        return array("d", [seconds + paused_seconds for seconds in self.elapsed_seconds])
+
+    def loop_state(self, i: int) -> LoopState:
+        """
+        State of a batch of the chunk.
+
+        Args:
+            i: Index of the batch in the chunk (negative indices count from the end)
+
+        Returns:
+            LoopState: The state
+        """
+        eta_seconds = self.eta_seconds[i]
+        return LoopState(
+            epoch=self.epoch[i],
+            global_step=self.global_step[i],
+            epoch_step=self.epoch_step[i],
+            epoch_end=bool(self.epoch_end[i]),
+            training_end=bool(self.training_end[i]),
+            elapsed_seconds=self.elapsed_seconds[i],
+            eta_seconds=None if math.isnan(eta_seconds) else eta_seconds,
+            n_samples=self.n_samples[i],
+            n_tokens=self.n_tokens[i],
+            paused_seconds=self.paused_seconds,
+        )
+
+
+def _contiguous_chunk(
+    batches: list,
+    epoch: int,
+    global_step: int,
+    epoch_step: int,
+    elapsed_seconds: array,
+    n_samples: array,
+    n_tokens: array,
+) -> Chunk:
+    # a chunk of consecutive steps of an epoch, with arrays filled without a per-batch loop
+    n = len(batches)
+    chunk = Chunk.__new__(Chunk)
+    chunk.batches = batches
+    chunk.events = []
+    chunk.epoch = array("q", [epoch]) * n
+    chunk.global_step = array("q", range(global_step, global_step + n))
+    chunk.epoch_step = array("q", range(epoch_step, epoch_step + n))
+    chunk.epoch_end = array("b", bytes(n))
+    chunk.training_end = array("b", bytes(n))
+    chunk.elapsed_seconds = elapsed_seconds
+    chunk.eta_seconds = array("d", [math.nan]) * n
+    chunk.n_samples = n_samples
+    chunk.n_tokens = n_tokens
+    chunk.paused_seconds = 0.0
+    return chunk
+
+
+def _load_batches(
+    batches_iter: Iterator, n: int, clock: Clock, start_time: float, max_seconds: Optional[float]
+) -> tuple[list, array, bool]:
+    # load up to n batches, reading the clock after each one like the steps do, and stop on the
+    # batch reaching max_seconds. Returns the batches, their elapsed seconds and whether time is up
+    batches: list = []
+    elapsed_seconds = array("d")
+    for batch in islice(batches_iter, n):
+        seconds = clock() - start_time
+        batches.append(batch)
+        elapsed_seconds.append(seconds)
+        if max_seconds is not None and seconds >= max_seconds:
+            return batches, elapsed_seconds, True
+    return batches, elapsed_seconds, False
+
+
+def _cumulative_counts(
+    batches: list, count_fn: Optional[Callable[[Any], int]], count: int
+) -> array:
+    # count after each batch, starting from `count`
+    if count_fn is None:
+        return array("q", [count]) * len(batches)
+    return array("q", islice(accumulate(map(count_fn, batches), initial=count), 1, None))
+
+
+def _limit_index(counts: array, limit: Optional[int]) -> Optional[int]:
+    # index of the first batch whose count reaches the limit, if any
+    if limit is None or counts[-1] < limit:
+        return None
+    return bisect_left(counts, limit)
+
+
+def get_iter_chunks_with_events(
+    dl: Iterable,
+    chunk_size: int,
+    dl_len: Optional[int] = None,
+    max_epochs: Optional[int] = None,
+    max_steps: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+    events: Optional[dict[Any, Event]] = None,
+    no_len_iteration_strategy: NoLenIterationStrategy = "pairwise",
+    prefetch_depth: Optional[int] = None,
+    resume_from: Optional[LoopPosition] = None,
+    clock: Optional[Clock] = None,
+    start_time: Optional[float] = None,
+    batch_size_fn: Optional[Callable[[Any], int]] = None,
+    token_count_fn: Optional[Callable[[Any], int]] = None,
+    max_samples: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    source_epoch_end: bool = False,
+) -> Generator[tuple[Chunk, LoopState, set], None, None]:
+    """
+    Create an iterator that yields chunks of up to `chunk_size` consecutive batches along with
+    their events, like grouping the steps of `get_iter_dl_with_events` with `iter_chunks`, with
+    the bookkeeping done once per chunk instead of once per batch.
+
+    The batches of a chunk are loaded at once, its position arrays are filled from ranges, and
+    the events of all its batches are computed in a single pass over the scheduler (see
+    `EventScheduler.triggered_events_chunk`). As batch by batch, the clock is read after loading
+    each batch, and training ends on the batch reaching max_seconds, which ends its chunk. The
+    sample and token limits are checked like `get_iter_dl_with_events` does.
+
+    Args:
+        dl: The dataloader to iterate over
+        chunk_size: Maximum number of batches per chunk
+        dl_len: Optional length of the dataloader (if known). If not, one batch is loaded ahead
+            to tell whether the epoch ends
+        max_epochs: Maximum number of epochs to iterate
+        max_steps: Maximum number of steps to iterate
+        max_seconds: Maximum number of seconds to iterate
+        events: Dictionary mapping event keys to Event instances
+        no_len_iteration_strategy: Strategy for dataloaders with unknown length: "pairwise" or
+            "prefetch" ("lookahead_free" isn't supported, as a chunk holds several batches)
+        prefetch_depth: Number of batches loaded ahead in a background thread. Used by the
+            "prefetch" strategy (defaults to 2) and, if provided, for dataloaders of known length
+        resume_from: Position to start iterating from, when resuming an interrupted loop
+        clock: Function returning the current time in seconds, read once per batch. Defaults to
+            a monotonic clock
+        start_time: Clock reading at which the loop started. Defaults to reading the clock when
+            iteration begins (minus the elapsed seconds of resume_from)
+        batch_size_fn: Function returning the number of samples of a batch
+        token_count_fn: Function returning the number of tokens of a batch
+        max_samples: Training ends on the batch on which n_samples reaches it
+        max_tokens: Training ends on the batch on which n_tokens reaches it
+        source_epoch_end: If True, batches are `SourceBatch`es, and `SourceEpochEnd(source)` is
+            added to the events of the batches ending an epoch of their source
+
+    Returns:
+        Generator yielding (chunk, loop_state, chunk_events) tuples, where loop_state is the
+        state of the last batch of the chunk, and chunk_events the union of the events triggered
+        on its batches
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be >= 1, got {chunk_size=}")
+    max_seconds = _check_count_limits(
+        max_epochs, max_steps, max_seconds, batch_size_fn, token_count_fn, max_samples, max_tokens
+    )
+    _check_arguments(max_epochs=max_epochs, max_steps=max_steps, max_seconds=max_seconds)
+
+    if dl_len is not None:
+        if prefetch_depth is not None:
+            dl = PrefetchIterable(dl, prefetch_depth)
+    elif no_len_iteration_strategy == "prefetch":
+        dl = PrefetchIterable(dl, prefetch_depth or DEFAULT_PREFETCH_DEPTH)
+    elif no_len_iteration_strategy != "pairwise":
+        raise ValueError(f"Unsupported {no_len_iteration_strategy=} for chunks")
+
+    scheduler = EventScheduler(events)
+    clock = clock or monotonic_clock
+    start = resume_from or LoopPosition()
+    if start_time is None:
+        start_time = clock() - start.elapsed_seconds
+
+    # like iter_dl_known_length, a known length bounds the number of epochs of a step limit
+    n_epochs = max_epochs
+    if n_epochs is None and max_steps is not None and dl_len is not None:
+        n_epochs = math.ceil(max_steps / dl_len)
+
+    global_step = start.global_step
+    epoch = start.epoch
+    n_samples = start.n_samples
+    n_tokens = start.n_tokens
+    if max_steps is not None and global_step >= max_steps:
+        return
+
+    while n_epochs is None or epoch < n_epochs:
+        last_epoch = n_epochs is not None and epoch == n_epochs - 1
+
+        # when resuming, seek to the first batch that wasn't done
+        epoch_step = start.epoch_step if epoch == start.epoch else 0
+        first_epoch_step = epoch_step
+        batches_iter = iter_epoch(dl, epoch, epoch_step)
+        # batches loaded ahead, when the length is unknown
+        ahead: list = []
+        epoch_end = False
+        while not epoch_end:
+            n = chunk_size
+            if max_steps is not None:
+                n = min(n, max_steps - global_step)
+
+            if dl_len is not None:
+                n = min(n, dl_len - epoch_step)
+                batches, elapsed_seconds, time_limit_reached = _load_batches(
+                    batches_iter, n, clock, start_time, max_seconds
+                )
+                if not batches:
+                    break  # the dataloader is shorter than dl_len
+                epoch_end = epoch_step + len(batches) == dl_len
+            else:
+                batches, elapsed_seconds, time_limit_reached = _load_batches(
+                    chain(ahead, batches_iter), n, clock, start_time, max_seconds
+                )
+                if not batches:
+                    break
+                # load a batch ahead to tell whether the epoch ends, unless the dl ran out
+                ahead = []
+                if len(batches) == n or time_limit_reached:
+                    ahead.extend(islice(batches_iter, 1))
+                epoch_end = not ahead
+
+            samples = _cumulative_counts(batches, batch_size_fn, n_samples)
+            tokens = _cumulative_counts(batches, token_count_fn, n_tokens)
+            training_end = (
+                time_limit_reached
+                or (max_steps is not None and global_step + len(batches) == max_steps)
+                or (last_epoch and epoch_end)
+            )
+            # training ends on the first batch reaching a count limit, the rest aren't used
+            limits = [
+                i
+                for i in (_limit_index(samples, max_samples), _limit_index(tokens, max_tokens))
+                if i is not None
+            ]
+            if limits:
+                cut = min(limits) + 1
+                if cut < len(batches):
+                    del batches[cut:], samples[cut:], tokens[cut:], elapsed_seconds[cut:]
+                    epoch_end = False
+                training_end = True
+
+            chunk = _contiguous_chunk(
+                batches, epoch, global_step, epoch_step, elapsed_seconds, samples, tokens
+            )
+            last = len(batches) - 1
+            chunk.epoch_end[last] = epoch_end
+            chunk.training_end[last] = training_end
+            chunk.events = chunk_batch_events = scheduler.triggered_events_chunk(chunk)
+            if source_epoch_end:
+                for i, batch in enumerate(batches):
+                    if batch.epoch_end:
+                        chunk_batch_events[i] = chunk_batch_events[i] | {
+                            SourceEpochEnd(batch.source)
+                        }
+
+            yield chunk, chunk.loop_state(last), set().union(*chunk_batch_events)
+            # don't keep the batches alive while the next ones are loaded
+            chunk = batches = None
+
+            if training_end:
+                return
+            global_step += last + 1
+            epoch_step += last + 1
+            n_samples, n_tokens = samples[last], tokens[last]
+
+        if epoch_step == first_epoch_step:
+            return  # empty dl, nothing to iterate over
+        epoch += 1
+
+
+def iter_chunks(
+    iterator: Iterable[tuple[Any, LoopState, Any]], chunk_size: int, source_epoch_end: bool = False
+) -> Generator[tuple[Chunk, LoopState, set], None, None]:
+    """
+    Group the (batch, loop_state, batch_events) tuples of a loop into chunks of up to
+    `chunk_size` consecutive batches, cut short at the end of every epoch and of training.
+
+    Args:
+        iterator: Iterator as returned by `get_iter_dl_with_events(..., return_loop_state=True)`
+        chunk_size: Maximum number of batches per chunk
+        source_epoch_end: If True, batches are `SourceBatch`es, and `SourceEpochEnd(source)` is
+            added to the events of the batches ending an epoch of their source
+
+    Returns:
+        Generator yielding (chunk, loop_state, chunk_events) tuples, where loop_state is the
+        state of the last batch of the chunk, and chunk_events the union of the events triggered
+        on its batches
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be >= 1, got {chunk_size=}")
+
+    chunk = Chunk()
+    chunk_events: set = set()
+    loop_state = None
+    for batch, loop_state, batch_events in iterator:
+        if source_epoch_end and isinstance(batch, SourceBatch) and batch.epoch_end:
+            batch_events = batch_events | {SourceEpochEnd(batch.source)}
+
+        chunk.append(batch, loop_state, batch_events)
+        chunk_events |= batch_events
+        if len(chunk) == chunk_size or loop_state.epoch_end or loop_state.training_end:
+            yield chunk, loop_state, chunk_events
+            chunk = Chunk()
+            chunk_events = set()
+
+    if len(chunk):
+        yield chunk, loop_state, chunk_events
@@ -0,0 +1,94 @@
+import itertools
+import time
+from typing import Callable
+
+# A clock is a function returning the current time in seconds. Only differences between its
+# readings are used, so it doesn't need to be wall time.
+Clock = Callable[[], float]
+
+# Default clock: monotonic, high resolution and unaffected by system clock updates
+monotonic_clock: Clock = time.perf_counter
+
+# Clock that always reads 0, for loops that don't need to measure time. Reading it is cheaper than
+# reading any real clock
+stopped_clock: Clock = itertools.repeat(0.0).__next__
+
+
+class VirtualClock:
+    """
+    Clock that only moves when told to, to simulate time-based behaviour deterministically.
+
+    Example:
+        ```python
+        clock = VirtualClock(tick=0.5)  # every step takes half a second
+        loop = Loop(dataloader, max_seconds=3600, clock=clock, events=...)
+        ```
+    """
+
+    def __init__(self, start: float = 0.0, tick: float = 0.0):
+        """
+        Initialize the clock.
+
+        Args:
+            start: Initial time in seconds
+            tick: Seconds the clock advances after each reading. Since loops read the clock once
+                per step, this simulates steps of `tick` seconds
+        """
+        self.time = start
+        self.tick = tick
+
+    def __call__(self) -> float:
+        now = self.time
+        self.time += self.tick
+        return now
+
+    def advance(self, seconds: float) -> None:
+        """
+        Move the clock forward.
+
+        Args:
+            seconds: Number of seconds to advance
+        """
+        self.time += seconds
+
+
+class PausableClock:
+    """
+    Clock that stops while paused, so the time spent paused doesn't count.
+
+    Wraps another clock, subtracting the seconds spent paused from its readings. While paused,
+    every reading returns the time at which the clock was paused.
+    """
+
+    def __init__(self, clock: Clock):
+        """
+        Initialize the clock.
+
+        Args:
+            clock: The clock to wrap
+        """
+        self.clock = clock
+        # total seconds spent paused (not including the current pause)
+        self.paused_seconds = 0.0
+        self._paused_at = None
+
+    def __call__(self) -> float:
+        if self._paused_at is not None:
+            return self._paused_at - self.paused_seconds
+        return self.clock() - self.paused_seconds
+
+    @property
+    def paused(self) -> bool:
+        """Whether the clock is paused."""
+        return self._paused_at is not None
+
+    def pause(self) -> None:
+        """Stop the clock. Does nothing if it's already paused."""
+        if self._paused_at is None:
+            self._paused_at = self.clock()
+
+    def resume(self) -> None:
+        """Restart the clock. Does nothing if it isn't paused."""
+        if self._paused_at is not None:
+            self.paused_seconds += self.clock() - self._paused_at
+            self._paused_at = None
@@ -0,0 +1,96 @@
+import multiprocessing
+from typing import Any, Callable, Optional
+
+from .clock import Clock
+
+# Type definition for the synchronization hook of time-based decisions
+# A collective that takes the local value of each rank and returns the same agreed value (e.g. the
+# maximum over ranks, or the value of rank 0) on every rank
+TimeSync = Callable[[float], float]
+
+
+def synchronized_clock(
+    clock: Clock, start_time: float, time_sync: TimeSync, every_n_steps: int = 1
+) -> Clock:
+    """
+    Wrap a clock that is read once per step so that all ranks read the same time.
+
+    Every `every_n_steps` readings, the time elapsed since `start_time` is agreed on through
+    `time_sync`. In between, the last agreed time is returned, so time-based decisions only change
+    at synchronization points and every rank takes them on the same step.
+
+    Args:
+        clock: Local clock
+        start_time: Local clock reading at which the loop started
+        time_sync: Collective returning the same value on every rank
+        every_n_steps: Number of readings between synchronizations
+
+    Returns:
+        Clock: The synchronized clock. Readings are `start_time` plus the agreed elapsed time
+    """
+    if every_n_steps < 1:
+        raise ValueError(f"every_n_steps must be >= 1, got {every_n_steps=}")
+
+    n_readings = 0
+    agreed_time = start_time
+
+    def read() -> float:
+        nonlocal n_readings, agreed_time
+        if n_readings % every_n_steps == 0:
+            agreed_time = start_time + time_sync(clock() - start_time)
+        n_readings += 1
+        return agreed_time
+
+    return read
+
+
+class _LocalRankSync:
+    def __init__(self, values: Any, barrier: Any, rank: int):
+        self.values = values
+        self.barrier = barrier
+        self.rank = rank
+
+    def __call__(self, value: float) -> float:
+        self.values[self.rank] = value
+        self.barrier.wait()
+        agreed = max(self.values)
+        # nobody writes the next value before everyone has read this one
+        self.barrier.wait()
+        return agreed
+
+
+class LocalTimeSync:
+    """
+    All-reduce (max) over processes of the same machine, built on shared memory.
+
+    Meant for tests and single-node jobs without a distributed framework. Create it in the parent
+    process and pass `for_rank(rank)` to each of the `world_size` processes.
+    """
+
+    def __init__(self, world_size: int, context: Optional[Any] = None):
+        """
+        Initialize the shared state.
+
+        Args:
+            world_size: Number of processes taking part in every synchronization
+            context: multiprocessing context the processes are started with. Defaults to the
+                default context
+        """
+        context = context or multiprocessing.get_context()
+        self.world_size = world_size
+        self._values = context.Array("d", world_size)
+        self._barrier = context.Barrier(world_size)
+
+    def for_rank(self, rank: int) -> TimeSync:
+        """
+        Hook to pass to the Loop of the process with the given rank.
+
+        Args:
+            rank: Rank of the process, in [0, world_size)
+
+        Returns:
+            TimeSync: The hook
+        """
+        if not 0 <= rank < self.world_size:
+            raise ValueError(f"rank must be in [0, {self.world_size}), got {rank=}")
+        return _LocalRankSync(self._values, self._barrier, rank)
@@ -1,7 +1,9 @@
-import time
 from enum import Enum, auto, unique
 from functools import partial
+from typing import Optional
 
+from .monitors import MonitorMode, _Divergence, _Plateau
+from .triggers import Trigger
 from .types import LoopState
 
 
@@ -45,6 +47,17 @@ class Event:
         at_step=None,
         every_n_seconds=None,
         at_time=None,
+        trigger: Optional[Trigger] = None,
+        every_n_samples: Optional[int] = None,
+        every_n_tokens: Optional[int] = None,
+        on_plateau: Optional[str] = None,
+        on_divergence: Optional[str] = None,
+        patience: int = 10,
+        min_delta: float = 0.0,
+        mode: MonitorMode = "min",
+        ema_alpha: Optional[float] = None,
+        divergence_threshold: Optional[float] = None,
+        end_training: bool = False,
     ):
         """
         Initialize an event with a triggering condition.
@@ -55,31 +68,80 @@ class Event:
             every_n_steps (int, optional): Trigger every N steps
             at_step (int, optional): Trigger at a specific step (once)
             every_n_seconds (float, optional): Trigger every N seconds of training
-            at_time (float, optional): Trigger once when training reaches this time in seconds
+            at_time (float, optional): Trigger once when training reaches this time in seconds,
+                measured from the start of the loop
+            trigger (Trigger, optional): Combination of step-based triggers (see `every`, `at`,
+                `after`, `when`), evaluated only on the steps where it may fire
+            every_n_samples (int, optional): Trigger on the step on which the number of samples
+                seen (`LoopState.n_samples`, counted with the loop's `batch_size_fn`) reaches the
+                next multiple of N
+            every_n_tokens (int, optional): Trigger on the step on which the number of tokens
+                seen (`LoopState.n_tokens`, counted with the loop's `token_count_fn`) reaches the
+                next multiple of N
+            on_plateau (str, optional): Trigger when the metric of this name, reported with
+                `Loop.report`, hasn't improved by more than `min_delta` for `patience` reports in a
+                row (and again after every `patience` more reports without improvement)
+            on_divergence (str, optional): Trigger when the metric of this name, reported with
+                `Loop.report`, is NaN or infinite, or worse than `divergence_threshold`
+            patience (int): Number of reports without improvement before `on_plateau` triggers
+            min_delta (float): Minimum change of the metric counted as an improvement
+            mode (str): Whether lower ("min") or higher ("max") values of the metric are better
+            ema_alpha (float, optional): If provided, `on_plateau` tracks the exponential moving
+                average of the metric with this weight per report, to smooth noisy values
+            divergence_threshold (float, optional): Value past which `on_divergence` triggers
+            end_training (bool): If True, training ends on the step the metric event triggers on
+                (for early stopping)
         """
         self._condition_functions = []
+        self._custom_condition = condition_function
+        self._step_conditions = {}
         self._time_conditions = {}
+        # conditions on the sample and token counts, as {LoopState attribute: N}
+        self._count_conditions = {}
+        self._trigger = trigger
+        # metric-driven conditions, as (metric name, monitor), fed by `Loop.report`
+        self._monitors = []
+        self._end_training = end_training
 
-        # Track time-based event state
-        self._start_time = time.time()
-        self._last_triggered_time = self._start_time
+        # Track time-based event state, in seconds since the loop started
+        self._last_triggered_time = 0.0
         self._at_time_triggered = False
+        # Track count-based event state: the count at which each count condition triggers next
+        self._next_counts = {}
 
         if condition_function is not None:
             self._condition_functions.append(condition_function)
 
         if every_n_steps is not None:
+            self._step_conditions["every_n_steps"] = every_n_steps
             self._condition_functions.append(partial(_every_n_steps, n_steps=every_n_steps))
 
         if at_step is not None:
+            self._step_conditions["at_step"] = at_step
             self._condition_functions.append(partial(_at_step, step=at_step))
 
+        if trigger is not None:
+            self._condition_functions.append(trigger)
+
         if every_n_seconds is not None:
             self._time_conditions["every_n_seconds"] = every_n_seconds
 
         if at_time is not None:
             self._time_conditions["at_time"] = at_time
 
+        for attribute, n in (("n_samples", every_n_samples), ("n_tokens", every_n_tokens)):
+            if n is not None:
+                if n < 1:
+                    raise ValueError(f"every_{attribute} must be >= 1, got {n}")
+                self._count_conditions[attribute] = n
+                self._next_counts[attribute] = n
+
+        if on_plateau is not None:
+            self._monitors.append((on_plateau, _Plateau(patience, min_delta, mode, ema_alpha)))
+
+        if on_divergence is not None:
+            self._monitors.append((on_divergence, _Divergence(divergence_threshold, mode)))
+
     def should_trigger(self, loop_state) -> bool:
         """
         Determine if the event should trigger based on current loop state.
@@ -91,11 +153,12 @@ class Event:
             bool: True if the event should trigger, False otherwise
         """
         # Check regular conditions
-        if any(cf(loop_state) for cf in self._condition_functions):
-            return True
+        for cf in self._condition_functions:
+            if cf(loop_state):
+                return True
 
         # Check time-based conditions
-        current_time = time.time()
+        current_time = loop_state.elapsed_seconds
 
         # Check every_n_seconds condition
         if "every_n_seconds" in self._time_conditions:
@@ -107,8 +170,129 @@ class Event:
         # Check at_time condition (triggers once)
         if "at_time" in self._time_conditions and not self._at_time_triggered:
             target_time = self._time_conditions["at_time"]
-            if current_time - self._start_time >= target_time:
+            if current_time >= target_time:
                 self._at_time_triggered = True
                 return True
 
+        # Check count-based conditions
+        for attribute, n in self._count_conditions.items():
+            count = getattr(loop_state, attribute)
+            if count >= self._next_counts[attribute]:
+                self._next_counts[attribute] = (count // n + 1) * n
+                return True
+
+        return False
+
+    def _next_trigger_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        """
+        Earliest global step >= `global_step` at which a step-based condition triggers.
+
+        `every_n_steps` counts epoch steps, so the result assumes the current epoch doesn't end
+        before then; callers must recompute it when a new epoch starts.
+
+        Args:
+            global_step: Global step to start searching from
+            epoch_step: Epoch step corresponding to `global_step`
+
+        Returns:
+            Optional[int]: The global step, or None if no step-based condition will trigger
+        """
+        next_step = None
+
+        if "every_n_steps" in self._step_conditions:
+            n_steps = self._step_conditions["every_n_steps"]
+            next_step = global_step + (-(epoch_step + 1)) % n_steps
+
+        if "at_step" in self._step_conditions:
+            step = self._step_conditions["at_step"]
+            if step >= global_step and (next_step is None or step < next_step):
+                next_step = step
+
+        if self._trigger is not None:
+            step = self._trigger.next_step(global_step, epoch_step)
+            if step is not None and (next_step is None or step < next_step):
+                next_step = step
+
+        return next_step
+
+    def _report(self, name: str, value: float) -> bool:
+        """
+        Feed a reported metric value to the metric-driven conditions watching it.
+
+        Args:
+            name: Name of the metric
+            value: The value
+
+        Returns:
+            bool: True if a metric-driven condition triggers
+        """
+        triggered = False
+        for metric, monitor in self._monitors:
+            if metric == name and monitor.update(value):
+                triggered = True
+        return triggered
+
+    def _step_triggers(self, loop_state: LoopState) -> bool:
+        """
+        Whether a step-based condition triggers, evaluated in the same order as `should_trigger`.
+        Only needed for events with a `trigger`, whose `_next_trigger_step` is a lower bound.
+        """
+        for cf in self._condition_functions:
+            if cf is not self._custom_condition and cf(loop_state):
+                return True
         return False
+
+    @property
+    def _is_step_based(self) -> bool:
+        return bool(self._step_conditions) or self._trigger is not None
+
+    @property
+    def _reads_clock(self) -> bool:
+        """Whether triggering may depend on the elapsed time, so the loop has to read the clock."""
+        return (
+            bool(self._time_conditions)
+            or self._custom_condition is not None
+            or (self._trigger is not None and not self._trigger._static)
+        )
+
+    @property
+    def _has_state(self) -> bool:
+        """Whether the event has bookkeeping to persist when saving the loop state."""
+        return (
+            bool(self._time_conditions)
+            or bool(self._count_conditions)
+            or (self._trigger is not None and self._trigger._get_state() is not None)
+            or any(monitor._get_state() is not None for _, monitor in self._monitors)
+        )
+
+    def _get_state(self) -> dict:
+        """
+        Time-based bookkeeping to persist.
+        """
+        state = {
+            "last_triggered_seconds": self._last_triggered_time,
+            "at_time_triggered": self._at_time_triggered,
+        }
+        if self._next_counts:
+            state["next_counts"] = dict(self._next_counts)
+        if self._trigger is not None and self._trigger._get_state() is not None:
+            state["trigger"] = self._trigger._get_state()
+        monitors = [monitor._get_state() for _, monitor in self._monitors]
+        if any(monitor_state is not None for monitor_state in monitors):
+            state["monitors"] = monitors
+        return state
+
+    def _set_state(self, state: dict) -> None:
+        """
+        Restore the bookkeeping returned by `_get_state`.
+        """
+        self._last_triggered_time = state["last_triggered_seconds"]
+        self._at_time_triggered = state["at_time_triggered"]
+        for attribute, count in state.get("next_counts", {}).items():
+            if attribute in self._next_counts:
+                self._next_counts[attribute] = count
+        if "trigger" in state and self._trigger is not None:
+            self._trigger._set_state(state["trigger"])
+        for (_, monitor), monitor_state in zip(self._monitors, state.get("monitors", ())):
+            if monitor_state is not None:
+                monitor._set_state(monitor_state)
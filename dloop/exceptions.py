@@ -0,0 +1,2 @@
+class DataloaderErrorRateExceeded(RuntimeError):
+    """Raised when the dataloader fails on too many batches to keep recovering."""
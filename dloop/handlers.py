@@ -0,0 +1,200 @@
+import concurrent.futures
+import copy
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any, Callable, Literal, Optional
+
+from .types import LoopState
+
+HandlerExecutor = Literal["inline", "thread", "process"]
+Backpressure = Literal["block", "drop", "coalesce"]
+
+# Type definition for event handlers, called with the state of the step the event triggered on
+Handler = Callable[[LoopState], Any]
+
+
+@dataclass
+class HandlerError:
+    """An exception raised by an event handler."""
+
+    key: Any
+    handler: Handler
+    global_step: int
+    exception: BaseException
+
+
+class _RegisteredHandler:
+    def __init__(
+        self,
+        key: Any,
+        fn: Handler,
+        executor: HandlerExecutor,
+        max_in_flight: int,
+        backpressure: Backpressure,
+    ):
+        self.key = key
+        self.fn = fn
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self.backpressure = backpressure
+
+        # (future, global_step) of the calls submitted and not yet collected
+        self.in_flight: deque[tuple[concurrent.futures.Future, int]] = deque()
+        # most recent call waiting for room, when coalescing
+        self.pending: Optional[LoopState] = None
+        self.n_dropped = 0
+
+
+class EventDispatcher:
+    """
+    Run the handlers registered for each event, inline or in a thread or process pool.
+
+    Every handler has at most `max_in_flight` calls submitted and not finished. When a handler
+    falls behind, a new call either waits for room ("block"), is discarded ("drop"), or replaces
+    the call already waiting for room ("coalesce"), so only the most recent state is handled.
+
+    Exceptions raised by handlers are collected as `HandlerError`s instead of being raised.
+    """
+
+    def __init__(self):
+        self._handlers: dict[Any, list[_RegisteredHandler]] = {}
+        self._coalescing: list[_RegisteredHandler] = []
+        self._pools: dict[HandlerExecutor, concurrent.futures.Executor] = {}
+        self.errors: list[HandlerError] = []
+
+    def register(
+        self,
+        key: Any,
+        fn: Handler,
+        executor: HandlerExecutor = "inline",
+        max_in_flight: int = 1,
+        backpressure: Backpressure = "block",
+    ) -> None:
+        """
+        Register a handler for an event.
+
+        Args:
+            key: Event key (custom or LoopEvents)
+            fn: Function called with the LoopState of every step the event triggers on. With the
+                "process" executor, it and the event keys must be picklable
+            executor: Where to run the handler: "inline", or in a "thread" or "process" pool
+            max_in_flight: Maximum number of calls of the handler submitted and not finished
+            backpressure: What to do with a call when `max_in_flight` calls are in flight:
+                "block" until one finishes, "drop" the call, or "coalesce" it with the calls
+                waiting for room, keeping only the most recent one
+
+        Raises:
+            ValueError: If the executor or backpressure policy is unknown, or max_in_flight < 1
+        """
+        if executor not in ("inline", "thread", "process"):
+            raise ValueError(f"Unknown {executor=}")
+        if backpressure not in ("block", "drop", "coalesce"):
+            raise ValueError(f"Unknown {backpressure=}")
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be >= 1, got {max_in_flight=}")
+
+        handler = _RegisteredHandler(key, fn, executor, max_in_flight, backpressure)
+        self._handlers.setdefault(key, []).append(handler)
+        if backpressure == "coalesce":
+            self._coalescing.append(handler)
+
+    def __bool__(self) -> bool:
+        return bool(self._handlers)
+
+    def dispatch(self, batch_events: Iterable, loop_state: LoopState) -> None:
+        """
+        Call the handlers of the triggered events.
+
+        Args:
+            batch_events: Keys of the events triggered on the step
+            loop_state: State of the step
+        """
+        for handler in self._coalescing:
+            if handler.pending is not None:
+                self._collect(handler)
+
+        for key in batch_events:
+            for handler in self._handlers.get(key, ()):
+                self._call(handler, loop_state)
+
+    def _pool(self, executor: HandlerExecutor) -> concurrent.futures.Executor:
+        pool = self._pools.get(executor)
+        if pool is None:
+            if executor == "thread":
+                pool = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="dloop-handler")
+            else:
+                pool = concurrent.futures.ProcessPoolExecutor()
+            self._pools[executor] = pool
+        return pool
+
+    def _call(self, handler: _RegisteredHandler, loop_state: LoopState) -> None:
+        if handler.executor == "inline":
+            try:
+                handler.fn(loop_state)
+            except Exception as e:
+                # any error of the handler is surfaced as LoopEvents.EXCEPTION, not raised
+                self.errors.append(HandlerError(handler.key, handler.fn, loop_state.global_step, e))
+            return
+
+        # the handler runs after the loop moved on, when the LoopState may have been reused
+        loop_state = copy.copy(loop_state)
+        self._collect(handler)
+        if len(handler.in_flight) >= handler.max_in_flight:
+            if handler.backpressure == "drop":
+                handler.n_dropped += 1
+                return
+            if handler.backpressure == "coalesce":
+                if handler.pending is not None:
+                    handler.n_dropped += 1
+                handler.pending = loop_state
+                return
+            # block until a call finishes
+            concurrent.futures.wait(
+                [future for future, _ in handler.in_flight],
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            self._collect(handler)
+
+        self._submit(handler, loop_state)
+
+    def _submit(self, handler: _RegisteredHandler, loop_state: LoopState) -> None:
+        future = self._pool(handler.executor).submit(handler.fn, loop_state)
+        handler.in_flight.append((future, loop_state.global_step))
+
+    def _collect(self, handler: _RegisteredHandler) -> None:
+        # forget the finished calls (recording their exceptions), and submit the coalesced call
+        # if there's room for it
+        in_flight = handler.in_flight
+        for _ in range(len(in_flight)):
+            future, global_step = in_flight.popleft()
+            if not future.done():
+                in_flight.append((future, global_step))
+                continue
+            exception = future.exception()
+            if exception is not None:
+                self.errors.append(HandlerError(handler.key, handler.fn, global_step, exception))
+
+        if handler.pending is not None and len(in_flight) < handler.max_in_flight:
+            loop_state, handler.pending = handler.pending, None
+            self._submit(handler, loop_state)
+
+    def close(self) -> None:
+        """Wait for all the calls in flight (and coalesced calls waiting for room) to finish."""
+        for handlers in self._handlers.values():
+            for handler in handlers:
+                while handler.in_flight or handler.pending is not None:
+                    concurrent.futures.wait([future for future, _ in handler.in_flight])
+                    self._collect(handler)
+
+        for pool in self._pools.values():
+            pool.shutdown(wait=True)
+        self._pools = {}
+
+    @property
+    def n_dropped(self) -> dict[Any, int]:
+        """Number of calls dropped or coalesced away, by event key."""
+        n_dropped: dict[Any, int] = {}
+        for key, handlers in self._handlers.items():
+            n_dropped[key] = sum(handler.n_dropped for handler in handlers)
+        return n_dropped
@@ -1,29 +1,28 @@
+import dataclasses
 import math
-import time
-from collections.abc import Generator, Iterable
-from typing import Any, Literal, Optional
+from collections.abc import Generator, Iterable, Iterator
+from typing import Any, Callable, Literal, Optional
 
+from .budget import BudgetPlanner
+from .clock import Clock, monotonic_clock
 from .events import Event, LoopEvents
-from .types import LoopState
+from .prefetch import DEFAULT_PREFETCH_DEPTH, PrefetchIterable
+from .scheduler import EventScheduler
+from .types import LoopPosition, LoopState
+from .utils import iter_epoch
 
-try:
-    from itertools import pairwise
-except ImportError:  # python < 3.10
-    from itertools import tee
-
-    # from more-itertools
-    def pairwise(iterable):
-        """Returns an iterator of paired items, overlapping, from the original
+Batch = Any
 
-        >>> take(4, pairwise(count()))
-        [(0, 1), (1, 2), (2, 3), (3, 4)]
-        """
-        a, b = tee(iterable)
-        next(b, None)
-        return zip(a, b)
+# Marks that a dataloader iterator is exhausted
+_EXHAUSTED = object()
 
-
-Batch = Any
+# batch_events of the low-allocation mode without events, indexed by epoch_end + 2 * training_end
+_INTERNED_END_EVENTS = (
+    frozenset(),
+    frozenset([LoopEvents.EPOCH_END]),
+    frozenset([LoopEvents.TRAINING_END]),
+    frozenset([LoopEvents.EPOCH_END, LoopEvents.TRAINING_END]),
+)
 
 
 def _check_arguments(
@@ -48,6 +47,11 @@ def iter_dl_known_length(
     max_epochs: Optional[int] = None,
     max_steps: Optional[int] = None,
     max_seconds: Optional[float] = None,
+    prefetch_depth: Optional[int] = None,
+    resume_from: Optional[LoopPosition] = None,
+    clock: Optional[Clock] = None,
+    start_time: Optional[float] = None,
+    new_loop_state: Callable[..., LoopState] = LoopState,
 ) -> Generator[tuple[Batch, LoopState], None, None]:
     """
     Iterate over a dataloader with known length, yielding batches and their state.
@@ -61,11 +65,26 @@ def iter_dl_known_length(
         max_epochs: Maximum number of epochs to iterate
         max_steps: Maximum number of steps to iterate
         max_seconds: Maximum number of seconds to iterate
+        prefetch_depth: If provided, batches are loaded in a background thread, keeping up to
+            this many batches ready
+        resume_from: Position to start iterating from, when resuming an interrupted loop.
+            The elapsed seconds count towards max_seconds
+        clock: Function returning the current time in seconds, read once per step.
+            Defaults to a monotonic clock
+        start_time: Clock reading at which the loop started. Defaults to reading the clock when
+            iteration begins (minus the elapsed seconds of resume_from)
+        new_loop_state: Function called with the position of each step to get its LoopState.
+            Defaults to creating a new one per step (see `low_allocation` of
+            `get_iter_dl_with_events`)
 
     Returns:
         Generator yielding (batch, loop_state) tuples
     """
     _check_arguments(max_epochs=max_epochs, max_steps=max_steps, max_seconds=max_seconds)
+    clock = clock or monotonic_clock
+
+    if prefetch_depth is not None:
+        dl = PrefetchIterable(dl, prefetch_depth)
 
     # Set n_epochs for epoch or step based limits
     if max_epochs is not None:
@@ -77,23 +96,34 @@ def iter_dl_known_length(
         # and rely on the time check to stop iteration
         n_epochs = float("inf")
 
-    # Record start time for time-based iteration
-    start_time = time.time()
+    start = resume_from or LoopPosition()
+
+    # Record start time for time-based iteration, accounting for time spent before resuming
+    if start_time is None:
+        start_time = clock() - start.elapsed_seconds
+
+    global_step = start.global_step
+    if max_steps is not None and global_step >= max_steps:
+        return
 
-    global_step = 0
     last_epoch = False
     for epoch in range(
-        int(n_epochs) if n_epochs != float("inf") else 10**9
+        start.epoch, int(n_epochs) if n_epochs != float("inf") else 10**9
     ):  # Large but not infinite for int range
         if epoch == n_epochs - 1 and n_epochs != float("inf"):
             last_epoch = True
 
-        for epoch_step, batch in enumerate(dl):
+        # when resuming, seek to the first batch that wasn't done
+        first_epoch_step = start.epoch_step if epoch == start.epoch else 0
+        epoch_start_step = global_step
+
+        for epoch_step, batch in enumerate(
+            iter_epoch(dl, epoch, first_epoch_step), start=first_epoch_step
+        ):
             # Check all stopping conditions
             max_steps_reached = max_steps is not None and global_step == max_steps - 1
-            time_limit_reached = (
-                max_seconds is not None and (time.time() - start_time) >= max_seconds
-            )
+            elapsed_seconds = clock() - start_time
+            time_limit_reached = max_seconds is not None and elapsed_seconds >= max_seconds
             epoch_end = epoch_step == dl_len - 1
 
             # Training ends if any limit is reached
@@ -101,12 +131,13 @@ def iter_dl_known_length(
 
             yield (
                 batch,
-                LoopState(
+                new_loop_state(
                     epoch=epoch,
                     global_step=global_step,
                     epoch_step=epoch_step,
                     epoch_end=epoch_end,
                     training_end=training_end,
+                    elapsed_seconds=elapsed_seconds,
                 ),
             )
 
@@ -115,76 +146,108 @@ def iter_dl_known_length(
 
             global_step += 1
 
+        if global_step == epoch_start_step:
+            return  # empty dl, nothing to iterate over
+
 
 def iter_dl_unknown_length_with_pairwise_load(
     dl: Iterable,
     max_epochs: Optional[int] = None,
     max_steps: Optional[int] = None,
     max_seconds: Optional[float] = None,
+    resume_from: Optional[LoopPosition] = None,
+    clock: Optional[Clock] = None,
+    start_time: Optional[float] = None,
+    new_loop_state: Callable[..., LoopState] = LoopState,
 ) -> Generator[tuple[Batch, LoopState], None, None]:
     """
-    Within each epoch, iterates over pairwise(dl) to be able to tell when the
-    epoch is done before yielding the last batch.
+    Within each epoch, loads batches pairwise (the current one and the next one) to be able to
+    tell when the epoch is done before yielding the last batch.
     It's equivalent to efficiently peeking the next batch in the dl.
+    If `resume_from` is provided, iteration starts from that position, and its elapsed seconds
+    count towards max_seconds.
+    The time is read from `clock` (by default a monotonic clock) once per step, and measured
+    from `start_time` (by default, when iteration begins). The LoopState of each step is created
+    by `new_loop_state` (see `iter_dl_known_length`).
     """
     _check_arguments(max_epochs=max_epochs, max_steps=max_steps, max_seconds=max_seconds)
+    clock = clock or monotonic_clock
 
-    # Record start time for time-based iteration
-    start_time = time.time()
+    start = resume_from or LoopPosition()
 
-    global_step = 0
-    epoch = 0
+    # Record start time for time-based iteration, accounting for time spent before resuming
+    if start_time is None:
+        start_time = clock() - start.elapsed_seconds
+
+    global_step = start.global_step
+    epoch = start.epoch
+    if (max_steps is not None and global_step >= max_steps) or (
+        max_epochs is not None and epoch >= max_epochs
+    ):
+        return
 
     # initialize an infinite loop, we'll use stop conditions to exit
     while True:
         last_epoch = (max_epochs is not None) and (epoch == max_epochs - 1)
-        for epoch_step, (batch, next_batch) in enumerate(pairwise(dl)):  # noqa: B007 - next_batch is used outside the loop
-            # we always yield the first batch of the pair.
-            # pairwise handles batch = next_batch, next_batch = next(dl) for us
+
+        # when resuming, seek to the first batch that wasn't done
+        epoch_step = start.epoch_step if epoch == start.epoch else 0
+        batches = iter_epoch(dl, epoch, epoch_step)
+
+        batch = next(batches, _EXHAUSTED)
+        if batch is _EXHAUSTED:
+            return  # empty dl, nothing to iterate over
+
+        for next_batch in batches:
+            # we always yield the first batch of the pair, next_batch tells us the epoch goes on
 
             # Check all stopping conditions
             max_steps_reached = max_steps is not None and global_step == max_steps - 1
-            time_limit_reached = (
-                max_seconds is not None and (time.time() - start_time) >= max_seconds
-            )
+            elapsed_seconds = clock() - start_time
+            time_limit_reached = max_seconds is not None and elapsed_seconds >= max_seconds
 
             # at this point, the epoch hasn't ended, so training ends if steps or time limit reached
             training_end = max_steps_reached or time_limit_reached
 
             yield (
                 batch,
-                LoopState(
+                new_loop_state(
                     epoch=epoch,
                     global_step=global_step,
                     epoch_step=epoch_step,
                     epoch_end=False,
                     training_end=training_end,
+                    elapsed_seconds=elapsed_seconds,
                 ),
             )
 
             if training_end:
                 return
 
+            batch = next_batch
             global_step += 1
+            epoch_step += 1
 
-        # If we exited the previous loop, it means next_batch = next(dl) failed because
-        # the dl was exhausted and therefore next_batch is the last batch of the epoch.
+        # If we exited the previous loop, the dl is exhausted and therefore batch is the
+        # last batch of the epoch.
 
         # Check stopping conditions for the last batch in the epoch
         max_steps_reached = max_steps is not None and global_step == max_steps - 1
-        time_limit_reached = max_seconds is not None and (time.time() - start_time) >= max_seconds
+        elapsed_seconds = clock() - start_time
+        time_limit_reached = max_seconds is not None and elapsed_seconds >= max_seconds
 
         # we're at the end of the epoch, so training ends if any limit is reached
         training_end = max_steps_reached or time_limit_reached or last_epoch
 
         yield (
-            next_batch,  # type: ignore
-            LoopState(
+            batch,
+            new_loop_state(
                 epoch=epoch,
                 global_step=global_step,
-                epoch_step=epoch_step + 1,  # type: ignore
+                epoch_step=epoch_step,
                 epoch_end=True,
                 training_end=training_end,
+                elapsed_seconds=elapsed_seconds,
             ),
         )
 
@@ -195,7 +258,154 @@ def iter_dl_unknown_length_with_pairwise_load(
         epoch += 1
 
 
-NoLenIterationStrategy = Literal["pairwise"]
+def iter_dl_unknown_length_with_prefetch(
+    dl: Iterable,
+    max_epochs: Optional[int] = None,
+    max_steps: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+    prefetch_depth: int = DEFAULT_PREFETCH_DEPTH,
+    resume_from: Optional[LoopPosition] = None,
+    clock: Optional[Clock] = None,
+    start_time: Optional[float] = None,
+    new_loop_state: Callable[..., LoopState] = LoopState,
+) -> Generator[tuple[Batch, LoopState], None, None]:
+    """
+    Like `iter_dl_unknown_length_with_pairwise_load`, but batches are loaded by a background
+    thread that keeps up to `prefetch_depth` batches in a bounded queue, so data loading overlaps
+    with the work done on each batch.
+    The end of the epoch is detected from the sentinel the producer puts in the queue once the
+    dl is exhausted, and exceptions raised by the dl are re-raised here.
+    """
+    yield from iter_dl_unknown_length_with_pairwise_load(
+        PrefetchIterable(dl, prefetch_depth),
+        max_epochs=max_epochs,
+        max_steps=max_steps,
+        max_seconds=max_seconds,
+        resume_from=resume_from,
+        clock=clock,
+        start_time=start_time,
+        new_loop_state=new_loop_state,
+    )
+
+
+def iter_dl_unknown_length_lookahead_free(
+    dl: Iterable,
+    max_epochs: Optional[int] = None,
+    max_steps: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+    resume_from: Optional[LoopPosition] = None,
+    clock: Optional[Clock] = None,
+    start_time: Optional[float] = None,
+    new_loop_state: Callable[..., LoopState] = LoopState,
+) -> Generator[tuple[Batch, LoopState], None, None]:
+    """
+    Like `iter_dl_unknown_length_with_pairwise_load`, but never holds more than one batch, for
+    dataloaders with batches so large that two of them don't fit in memory.
+    Each batch is yielded as soon as it's loaded, with epoch_end and training_end False, and the
+    reference to it is dropped before loading the next one. Once the dl is exhausted, the end of
+    the epoch is reported by a trailing marker: an extra item with `None` as batch, whose
+    LoopState repeats the position of the last batch of the epoch with epoch_end True (and
+    training_end True on the last epoch, or if max_seconds is reached). Training always ends on a
+    marker: when max_steps or max_seconds is reached within an epoch, the marker follows the
+    batch reaching it, and ends the epoch, cut short, along with training.
+    """
+    _check_arguments(max_epochs=max_epochs, max_steps=max_steps, max_seconds=max_seconds)
+    clock = clock or monotonic_clock
+
+    start = resume_from or LoopPosition()
+
+    # Record start time for time-based iteration, accounting for time spent before resuming
+    if start_time is None:
+        start_time = clock() - start.elapsed_seconds
+
+    global_step = start.global_step
+    epoch = start.epoch
+    if (max_steps is not None and global_step >= max_steps) or (
+        max_epochs is not None and epoch >= max_epochs
+    ):
+        return
+
+    while True:
+        last_epoch = (max_epochs is not None) and (epoch == max_epochs - 1)
+
+        # when resuming, seek to the first batch that wasn't done
+        epoch_step = start.epoch_step if epoch == start.epoch else 0
+
+        limit_reached = False
+        for batch in iter_epoch(dl, epoch, epoch_step):
+            elapsed_seconds = clock() - start_time
+
+            yield (
+                batch,
+                new_loop_state(
+                    epoch=epoch,
+                    global_step=global_step,
+                    epoch_step=epoch_step,
+                    epoch_end=False,
+                    training_end=False,
+                    elapsed_seconds=elapsed_seconds,
+                ),
+            )
+            # don't keep the batch alive while the next one is loaded
+            batch = None
+
+            global_step += 1
+            epoch_step += 1
+
+            # training ends on the marker following the batch
+            if (max_steps is not None and global_step >= max_steps) or (
+                max_seconds is not None and elapsed_seconds >= max_seconds
+            ):
+                limit_reached = True
+                break
+
+        if epoch_step == 0:
+            return  # empty dl, nothing to iterate over
+
+        elapsed_seconds = clock() - start_time
+        time_limit_reached = max_seconds is not None and elapsed_seconds >= max_seconds
+        training_end = limit_reached or time_limit_reached or last_epoch
+
+        # the marker has the position of the last batch of the epoch
+        yield (
+            None,
+            new_loop_state(
+                epoch=epoch,
+                global_step=global_step - 1,
+                epoch_step=epoch_step - 1,
+                epoch_end=True,
+                training_end=training_end,
+                elapsed_seconds=elapsed_seconds,
+            ),
+        )
+
+        if training_end:
+            return
+
+        epoch += 1
+
+
+NoLenIterationStrategy = Literal["pairwise", "prefetch", "lookahead_free"]
+
+
+def _reused_loop_state() -> Callable[..., LoopState]:
+    # a `new_loop_state` for the iterators that updates a single LoopState in place
+    loop_state = LoopState(
+        epoch=0, global_step=0, epoch_step=0, epoch_end=False, training_end=False, elapsed_seconds=0
+    )
+
+    def new_loop_state(epoch, global_step, epoch_step, epoch_end, training_end, elapsed_seconds):
+        loop_state.epoch = epoch
+        loop_state.global_step = global_step
+        loop_state.epoch_step = epoch_step
+        loop_state.epoch_end = epoch_end
+        loop_state.training_end = training_end
+        loop_state.elapsed_seconds = elapsed_seconds
+        # set again by the budget planner on the steps it predicts the end of training on
+        loop_state.eta_seconds = None
+        return loop_state
+
+    return new_loop_state
 
 
 def get_iter_dl_with_events(
@@ -206,6 +416,18 @@ def get_iter_dl_with_events(
     max_seconds: Optional[float] = None,
     events: Optional[dict[Any, Event]] = None,
     no_len_iteration_strategy: NoLenIterationStrategy = "pairwise",
+    prefetch_depth: Optional[int] = None,
+    resume_from: Optional[LoopPosition] = None,
+    return_loop_state: bool = False,
+    clock: Optional[Clock] = None,
+    start_time: Optional[float] = None,
+    low_allocation: bool = False,
+    budget_boundaries: Optional[Iterable] = None,
+    batch_size_fn: Optional[Callable[[Any], int]] = None,
+    token_count_fn: Optional[Callable[[Any], int]] = None,
+    max_samples: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    planner: Optional[BudgetPlanner] = None,
 ) -> Generator[tuple[Any, set[LoopEvents]], None, None]:
     """
     Create an iterator that yields batches along with triggered events.
@@ -222,31 +444,268 @@ def get_iter_dl_with_events(
         max_steps: Maximum number of steps to iterate
         max_seconds: Maximum number of seconds to iterate
         events: Dictionary mapping event keys to Event instances
-        no_len_iteration_strategy: Strategy to use for dataloaders with unknown length
+        no_len_iteration_strategy: Strategy to use for dataloaders with unknown length. With
+            "lookahead_free", the end of each epoch is reported by an extra item with `None` as
+            batch and only `LoopEvents.EPOCH_END` (and `LoopEvents.TRAINING_END`) as events (see
+            `iter_dl_unknown_length_lookahead_free`)
+        prefetch_depth: Number of batches loaded ahead in a background thread. Used by the
+            "prefetch" strategy (defaults to 2) and, if provided, for dataloaders of known length
+        resume_from: Position to start iterating from, when resuming an interrupted loop
+        return_loop_state: If True, yield (batch, loop_state, batch_events) tuples instead
+        clock: Function returning the current time in seconds, read once per step and shared by
+            max_seconds and the time-based events. Defaults to a monotonic clock
+        start_time: Clock reading at which the loop started. Defaults to reading the clock when
+            iteration begins (minus the elapsed seconds of resume_from)
+        low_allocation: If True, a single LoopState is updated in place and yielded on every
+            step, so it's only valid until the next step (use `copy.copy` to keep it), and
+            batch_events are frozensets shared by all the steps on which the same events
+            trigger, instead of a new set per step
+        budget_boundaries: Event keys on whose steps training may end before max_seconds, when
+            the next one isn't predicted to complete in time (see `BudgetPlanner`). The predicted
+            seconds until training ends are set as `eta_seconds` of every LoopState
+        batch_size_fn: Function returning the number of samples of a batch, counted into
+            `LoopState.n_samples`
+        token_count_fn: Function returning the number of tokens of a batch, counted into
+            `LoopState.n_tokens`
+        max_samples: Training ends on the step on which n_samples reaches it. Requires
+            batch_size_fn
+        max_tokens: Training ends on the step on which n_tokens reaches it. Requires
+            token_count_fn
+        planner: Planner of the time budget to use instead of creating one for
+            budget_boundaries, e.g. with its bookkeeping restored from a saved state
 
     Returns:
         Generator yielding (batch, batch_events) tuples, where batch_events is a set
         of events that were triggered for this iteration
     """
-    events = events or {}
-    kwargs = {"max_epochs": max_epochs, "max_steps": max_steps, "max_seconds": max_seconds}
+    scheduler = EventScheduler(events)
+    if planner is None and budget_boundaries is not None:
+        if max_seconds is None:
+            raise ValueError("budget_boundaries require max_seconds")
+        start = resume_from.elapsed_seconds if resume_from is not None else 0.0
+        planner = BudgetPlanner(max_seconds, budget_boundaries, start=start)
+
+    iterator, epoch_end_markers = _iter_counted_steps(
+        dl,
+        dl_len=dl_len,
+        max_epochs=max_epochs,
+        max_steps=max_steps,
+        max_seconds=max_seconds,
+        no_len_iteration_strategy=no_len_iteration_strategy,
+        prefetch_depth=prefetch_depth,
+        resume_from=resume_from,
+        clock=clock,
+        start_time=start_time,
+        batch_size_fn=batch_size_fn,
+        token_count_fn=token_count_fn,
+        max_samples=max_samples,
+        max_tokens=max_tokens,
+        new_loop_state=_reused_loop_state() if low_allocation else LoopState,
+    )
+    if planner is None and not epoch_end_markers and not events:
+        # no events to schedule either: only the epoch and training ends
+        for batch, loop_state in iterator:
+            if low_allocation:
+                batch_events = _INTERNED_END_EVENTS[
+                    loop_state.epoch_end + 2 * loop_state.training_end
+                ]
+            else:
+                batch_events = set()
+                if loop_state.epoch_end:
+                    batch_events.add(LoopEvents.EPOCH_END)
+
+                if loop_state.training_end:
+                    batch_events.add(LoopEvents.TRAINING_END)
+
+            if return_loop_state:
+                yield batch, loop_state, batch_events
+            else:
+                yield batch, batch_events
+            # don't keep the batch alive while the next one is loaded
+            batch = None
+        return
+
+    if planner is None and not epoch_end_markers:
+        # nothing to plan or mark: only the events, at the cost of the plain loop
+        for batch, loop_state in iterator:
+            if low_allocation:
+                batch_events = scheduler.triggered_events_interned(loop_state)
+            else:
+                batch_events = scheduler.triggered_events(loop_state)
+                if loop_state.epoch_end:
+                    batch_events.add(LoopEvents.EPOCH_END)
+
+                if loop_state.training_end:
+                    batch_events.add(LoopEvents.TRAINING_END)
+
+            if return_loop_state:
+                yield batch, loop_state, batch_events
+            else:
+                yield batch, batch_events
+            # don't keep the batch alive while the next one is loaded
+            batch = None
+        return
+
+    for batch, loop_state in iterator:
+        if epoch_end_markers and loop_state.epoch_end:
+            batch_events = {LoopEvents.EPOCH_END}
+            if loop_state.training_end:
+                batch_events.add(LoopEvents.TRAINING_END)
+            if low_allocation:
+                batch_events = frozenset(batch_events)
+        elif low_allocation:
+            batch_events = scheduler.triggered_events_interned(loop_state)
+        else:
+            batch_events = scheduler.triggered_events(loop_state)
+            if loop_state.epoch_end:
+                batch_events.add(LoopEvents.EPOCH_END)
+
+            if loop_state.training_end:
+                batch_events.add(LoopEvents.TRAINING_END)
+
+        planned_end = False
+        if planner is not None and planner.update(loop_state, batch_events):
+            planned_end = not loop_state.training_end
+            loop_state.training_end = True
+            batch_events = batch_events | {LoopEvents.TRAINING_END}
+
+        if return_loop_state:
+            yield batch, loop_state, batch_events
+        else:
+            yield batch, batch_events
+        # don't keep the batch alive while the next one is loaded
+        batch = None
+
+        if planned_end:
+            iterator.close()
+            return
+
+
+def _iter_counted_steps(
+    dl: Iterable,
+    dl_len: Optional[int],
+    max_epochs: Optional[int],
+    max_steps: Optional[int],
+    max_seconds: Optional[float],
+    no_len_iteration_strategy: NoLenIterationStrategy,
+    prefetch_depth: Optional[int],
+    resume_from: Optional[LoopPosition],
+    clock: Optional[Clock],
+    start_time: Optional[float],
+    batch_size_fn: Optional[Callable[[Any], int]],
+    token_count_fn: Optional[Callable[[Any], int]],
+    max_samples: Optional[int],
+    max_tokens: Optional[int],
+    new_loop_state: Callable[..., LoopState] = LoopState,
+) -> tuple[Iterator[tuple[Batch, LoopState]], bool]:
+    # the (batch, loop_state) pairs of the strategy for the dataloader, with the sample and token
+    # counts and limits applied, and whether the items ending an epoch are lookahead-free markers
+    max_seconds = _check_count_limits(
+        max_epochs, max_steps, max_seconds, batch_size_fn, token_count_fn, max_samples, max_tokens
+    )
+    n_samples = resume_from.n_samples if resume_from is not None else 0
+    n_tokens = resume_from.n_tokens if resume_from is not None else 0
+
+    kwargs = {
+        "max_epochs": max_epochs,
+        "max_steps": max_steps,
+        "max_seconds": max_seconds,
+        "resume_from": resume_from,
+        "clock": clock,
+        "start_time": start_time,
+        "new_loop_state": new_loop_state,
+    }
     if dl_len is not None:
         kwargs["dl_len"] = dl_len
+        kwargs["prefetch_depth"] = prefetch_depth
         iter_f = iter_dl_known_length
     else:
         if no_len_iteration_strategy == "pairwise":
             iter_f = iter_dl_unknown_length_with_pairwise_load
+        elif no_len_iteration_strategy == "prefetch":
+            kwargs["prefetch_depth"] = prefetch_depth or DEFAULT_PREFETCH_DEPTH
+            iter_f = iter_dl_unknown_length_with_prefetch
+        elif no_len_iteration_strategy == "lookahead_free":
+            iter_f = iter_dl_unknown_length_lookahead_free
+        else:
+            raise ValueError(f"Unknown {no_len_iteration_strategy=}")
+
+    # with the lookahead-free strategy, items ending an epoch are markers rather than steps
+    epoch_end_markers = iter_f is iter_dl_unknown_length_lookahead_free
+
+    iterator = iter_f(dl, **kwargs)  # type: ignore
+    if batch_size_fn is not None or token_count_fn is not None or n_samples or n_tokens:
+        iterator = _iter_counted(
+            iterator,
+            batch_size_fn=batch_size_fn,
+            token_count_fn=token_count_fn,
+            max_samples=max_samples,
+            max_tokens=max_tokens,
+            n_samples=n_samples,
+            n_tokens=n_tokens,
+            epoch_end_markers=epoch_end_markers,
+        )
+    return iterator, epoch_end_markers
+
+
+def _check_count_limits(
+    max_epochs: Optional[int],
+    max_steps: Optional[int],
+    max_seconds: Optional[float],
+    batch_size_fn: Optional[Callable[[Any], int]],
+    token_count_fn: Optional[Callable[[Any], int]],
+    max_samples: Optional[int],
+    max_tokens: Optional[int],
+) -> Optional[float]:
+    # check the sample and token limits, returning the max_seconds to iterate with, which is
+    # infinite when only they limit the iteration
+    if max_samples is not None and batch_size_fn is None:
+        raise ValueError("max_samples requires a batch_size_fn")
+    if max_tokens is not None and token_count_fn is None:
+        raise ValueError("max_tokens requires a token_count_fn")
+
+    count_limited = max_samples is not None or max_tokens is not None
+    if count_limited and max_epochs is None and max_steps is None and max_seconds is None:
+        # only limited by counts: iterate until they are reached
+        return math.inf
+    return max_seconds
+
+
+def _iter_counted(
+    iterator: Iterator[tuple[Batch, LoopState]],
+    batch_size_fn: Optional[Callable[[Any], int]],
+    token_count_fn: Optional[Callable[[Any], int]],
+    max_samples: Optional[int],
+    max_tokens: Optional[int],
+    n_samples: int,
+    n_tokens: int,
+    epoch_end_markers: bool,
+) -> Generator[tuple[Batch, LoopState], None, None]:
+    # set the sample and token counts of every step, ending training on the step reaching a limit
+    for batch, loop_state in iterator:
+        if not (epoch_end_markers and loop_state.epoch_end):
+            if batch_size_fn is not None:
+                n_samples += batch_size_fn(batch)
+            if token_count_fn is not None:
+                n_tokens += token_count_fn(batch)
+        loop_state.n_samples = n_samples
+        loop_state.n_tokens = n_tokens
+
+        if not loop_state.training_end and (
+            (max_samples is not None and n_samples >= max_samples)
+            or (max_tokens is not None and n_tokens >= max_tokens)
+        ):
+            if epoch_end_markers:
+                # like the other limits, training ends on a marker following the batch
+                yield batch, loop_state
+                batch = None
+                loop_state = dataclasses.replace(loop_state, epoch_end=True, training_end=True)
+            else:
+                loop_state.training_end = True
+            yield batch, loop_state
+            iterator.close()
+            return
 
-    for batch, loop_state in iter_f(dl, **kwargs):  # type: ignore
-        batch_events = set()
-        if loop_state.epoch_end:
-            batch_events.add(LoopEvents.EPOCH_END)
-
-        if loop_state.training_end:
-            batch_events.add(LoopEvents.TRAINING_END)
-
-        for event_key, event in events.items():
-            if event.should_trigger(loop_state):
-                batch_events.add(event_key)
-
-        yield batch, batch_events
+        yield batch, loop_state
+        # don't keep the batch alive while the next one is loaded
+        batch = None
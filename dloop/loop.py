@@ -1,9 +1,39 @@
 import collections.abc
-from collections.abc import Iterable
-from typing import Any, Optional
+import contextlib
+import logging
+import time
+from collections import deque
+from collections.abc import AsyncIterable, Iterable, Mapping
+from typing import Any, Callable, Optional, Union
 
-from .events import Event
+from .async_iter_logic import aget_iter_dl_with_events
+from .budget import BudgetPlanner
+from .checkpoint import CheckpointWriter
+from .chunking import get_iter_chunks_with_events, iter_chunks
+from .clock import Clock, PausableClock, monotonic_clock, stopped_clock
+from .distributed import TimeSync, synchronized_clock
+from .events import Event, LoopEvents
+from .handlers import Backpressure, EventDispatcher, Handler, HandlerError, HandlerExecutor
 from .iter_logic import NoLenIterationStrategy, get_iter_dl_with_events
+from .metrics import Metrics
+from .mixing import MixedIterable, MixingStrategy, SourceEpochEnd
+from .pipeline import Pipeline
+from .prefetch import DEFAULT_PREFETCH_DEPTH
+from .profiling import Profiler
+from .recovery import (
+    DataloaderError,
+    ErrorPolicy,
+    RecoveringIterable,
+    check_recoverable,
+    count_recovered,
+    mark_dataloader_errors,
+)
+from .schedule import EventSchedule, compile_schedule
+from .state import event_key_id, load_state, save_state
+from .timing import DEFAULT_TIMING_WINDOW, StepTimer
+from .types import LoopPosition
+
+logger = logging.getLogger(__name__)
 
 
 class Loop:
@@ -11,7 +41,7 @@ class Loop:
 
     def __init__(
         self,
-        dataloader: Iterable,
+        dataloader: Union[Iterable, Mapping[str, Iterable]],
         events: Optional[dict[Any, Event]] = None,
         max_epochs: Optional[int] = None,
         max_steps: Optional[int] = None,
@@ -19,25 +49,934 @@ class Loop:
         state_file: Optional[str] = None,
         dataloader_len: Optional[int] = None,
         no_len_iteration_strategy: NoLenIterationStrategy = "pairwise",
+        prefetch_depth: Optional[int] = None,
+        save_state_on: Optional[Iterable] = None,
+        clock: Optional[Clock] = None,
+        timing_window: Optional[int] = DEFAULT_TIMING_WINDOW,
+        low_allocation: bool = False,
+        mixing: MixingStrategy = "round_robin",
+        mixing_weights: Optional[Mapping[str, float]] = None,
+        mixing_seed: int = 0,
+        time_sync: Optional[TimeSync] = None,
+        time_sync_every_n_steps: int = 1,
+        checkpoint: Optional[CheckpointWriter] = None,
+        checkpoint_on: Optional[Iterable] = None,
+        budget_boundaries: Optional[Iterable] = None,
+        chunk_size: Optional[int] = None,
+        profiler: Optional[Profiler] = None,
+        profile_on: Optional[Iterable] = None,
+        metrics: Optional[Metrics] = None,
+        metrics_flush_on: Optional[Iterable] = None,
+        error_policy: Optional[ErrorPolicy] = None,
+        batch_size_fn: Optional[Callable[[Any], int]] = None,
+        token_count_fn: Optional[Callable[[Any], int]] = None,
+        max_samples: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        pipeline: Optional[Pipeline] = None,
     ):
         """
         Initialize the loop.
 
         Args:
-            dataloader: DataLoader providing batches
+            dataloader: DataLoader providing batches, or a dictionary mapping names to
+                dataloaders (sources) to interleave. Sources are restarted independently when
+                exhausted, batches are yielded as `SourceBatch(source, batch, epoch, epoch_step,
+                epoch_end)` with the position within the source, and `SourceEpochEnd(source)` is
+                added to batch_events when an epoch of a source ends (see `MixedIterable`). An
+                epoch of all the sources is as long as their total length, so if a source's
+                length is unknown, max_epochs alone can't end the loop
             events: Dictionary mapping event keys to Event instances
             max_epochs: Maximum number of epochs
             max_steps: Maximum number of steps
-            max_seconds: Maximum time in seconds
-            state_file: Path to save/load loop state
+            max_seconds: Maximum time in seconds. When resuming from `state_file`, the time spent
+                before resuming counts towards it
+            state_file: Path to save/load loop state. If the file exists, the loop resumes from
+                the saved state. The state is saved when exiting the context manager, when
+                training ends, and after steps where any of the `save_state_on` events triggered
             dataloader_len: length of the dataloader. If not provided, will try to be inferred
                 with len(dataloader)
             no_len_iteration_strategy: Iteration strategy if the length of the dataloader is not
-                provided and cannot be inferred
+                provided and cannot be inferred: "pairwise" (loads the next batch to tell whether
+                the epoch ends), "prefetch" (loads batches in a background thread), or
+                "lookahead_free" (holds a single batch at a time, and reports the end of each
+                epoch, and of training, with an extra iteration whose batch is None. These
+                markers aren't steps: they aren't timed or profiled, and don't save the state)
+            prefetch_depth: Number of batches loaded ahead in a background thread. Used by the
+                "prefetch" strategy (defaults to 2) and, if provided, for dataloaders of known
+                length. With several sources, each one is prefetched in its own thread (defaults
+                to 2)
+            save_state_on: Event keys (custom or LoopEvents) after which the state is saved to
+                `state_file`
+            clock: Function returning the current time in seconds, read once per step and shared
+                by max_seconds and the time-based events. Defaults to a monotonic clock. Pass a
+                `VirtualClock` to simulate time deterministically. The time the loop is paused
+                (see `pause`) doesn't count
+            timing_window: Number of most recent steps over which the time spent waiting for data
+                and in user code is tracked (see `timing`). Pass None to disable timing
+            low_allocation: If True, the same LoopState is updated and yielded (in `loop_state`)
+                on every step, so it's only valid until the next step (use `copy.copy` to keep
+                it), and batch_events are frozensets shared by all the steps on which the same
+                events trigger, instead of a new set per step
+            mixing: How to interleave several sources: "round_robin", "weighted_random", or
+                "proportional" (to `mixing_weights`, by default the lengths of the sources)
+            mixing_weights: Relative weight of each source
+            mixing_seed: Seed of the "weighted_random" mixing
+            time_sync: Collective (e.g. an all-reduce max) through which the ranks of a
+                multi-process job agree on the elapsed time, so that max_seconds and the
+                time-based events trigger on the same step on every rank (see `LocalTimeSync`)
+            time_sync_every_n_steps: Number of steps between time synchronizations. In between,
+                the elapsed time stays at the last agreed value
+            checkpoint: Writer of checkpoints, taken after steps where any of the `checkpoint_on`
+                events triggered and written in the background. Training end and exiting the
+                context manager wait for the pending writes
+            checkpoint_on: Event keys (custom or LoopEvents) after which a checkpoint is taken
+            budget_boundaries: With max_seconds, event keys (e.g. `LoopEvents.EPOCH_END`, or an
+                expensive "Eval" event) after which the loop can end without wasting work. On
+                their steps, training ends if, from the measured durations, none of them is
+                predicted to complete again within max_seconds, instead of cutting an epoch or
+                eval short. `LoopState.eta_seconds` is set to the predicted time left
+            chunk_size: If provided, the loop yields `(chunk, chunk_events)` pairs, where chunk is
+                a `Chunk` of up to this many consecutive batches (cut short at the end of every
+                epoch and of training) with the state and events of each batch, and chunk_events
+                the union of their events. The events are computed once per chunk, on the
+                batch they trigger on, except the events triggered by `report`, which land on
+                its first batch. A chunk counts as a single step for `timing`
+                and `save_state_on`/`checkpoint_on`, and is repeated as a whole when resuming
+            profiler: Profiler of windows of a few steps, opened on steps where any of the
+                `profile_on` events triggered (unless a window is already open). The user code
+                and the loop's own code are profiled separately
+            profile_on: Event keys (custom or LoopEvents) on which a profiling window opens
+            metrics: Accumulator of the metrics logged every step, exposed as `metrics` and meant
+                to be flushed on logging events. Defaults to a `Metrics()` averaging every metric
+            metrics_flush_on: Event keys (custom or LoopEvents) after whose steps `metrics` is
+                flushed, once the loop body is done with the step and before the handlers run.
+                The reduced values are exposed as `flushed_metrics`
+            error_policy: How to recover from exceptions raised by the dataloader (see
+                `ErrorPolicy`). A batch the dataloader fails on still counts as a step, yielded
+                with `LoopEvents.EXCEPTION` and a None batch unless a retry loaded it, and the
+                incident is appended to `dataloader_errors`. Not supported with several sources
+            batch_size_fn: Function returning the number of samples of a batch (e.g.
+                `lambda batch: len(batch["input_ids"])`), counted into `LoopState.n_samples` and
+                used by `max_samples` and `every_n_samples` events. Called once per step, so it
+                should be cheap. With an `error_policy`, a lost batch counts as 0
+            token_count_fn: Function returning the number of tokens of a batch, counted into
+                `LoopState.n_tokens` and used by `max_tokens` and `every_n_tokens` events
+            max_samples: Maximum number of samples. Training ends on the step reaching it
+            max_tokens: Maximum number of tokens. Training ends on the step reaching it
+            pipeline: Preprocessing stages applied to the batches of the dataloader, in worker
+                pools, before the loop yields them (see `Pipeline`). If the pipeline doesn't
+                yield one batch per batch of the dataloader (e.g. it filters), the length of the
+                dataloader becomes unknown and `dataloader_len` is ignored. Not supported with
+                several sources
 
         Raises:
-            ValueError: If no stopping condition (max_epochs, max_steps, or max_seconds) is provided
+            ValueError: If no stopping condition (max_epochs, max_steps, max_seconds,
+                max_samples or max_tokens) is provided, budget_boundaries are provided without
+                max_seconds, an error_policy or a pipeline is provided with several sources, an
+                error_policy restarts or retries with a dataloader that can't seek,
+                several sources of unknown total length are only limited by max_epochs, or
+                samples or tokens are used without batch_size_fn or token_count_fn
         """
+        self.dataloader = dataloader
+        self._mixed = isinstance(dataloader, Mapping)
+
+        self.events = events or {}
+        self.max_epochs = max_epochs
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.state_file = state_file
+        self.save_state_on = frozenset(save_state_on or ())
+        self.checkpoint = checkpoint
+        self.checkpoint_on = frozenset(checkpoint_on or ())
+        self._clock = clock or monotonic_clock
+        # Training time, which stops while the loop is paused. Only created once the loop is
+        # paused, so the steps of a loop that never pauses read `_clock` directly
+        self._pausable_clock: Optional[PausableClock] = None
+        # Seconds the loop was paused before resuming from a saved state
+        self._paused_before = 0.0
+        self.time_sync = time_sync
+        self.time_sync_every_n_steps = time_sync_every_n_steps
+        self.chunk_size = chunk_size
+        self.profiler = profiler
+        self.profile_on = frozenset(profile_on or ())
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.metrics_flush_on = frozenset(metrics_flush_on or ())
+        # Reduced metrics of the last flush on a `metrics_flush_on` step
+        self.flushed_metrics: dict[str, float] = {}
+        self.error_policy = error_policy
+        # Most recent exceptions raised by the dataloader, recovered from following `error_policy`
+        self.dataloader_errors: deque[DataloaderError] = deque(
+            maxlen=error_policy.max_kept_errors if error_policy is not None else 0
+        )
+
+        # Always measured on the wall clock, even if the loop runs on a virtual clock
+        self.timing = StepTimer(timing_window) if timing_window is not None else None
+
+        # Handlers registered with `on`
+        self._dispatcher = EventDispatcher()
+
+        # Events with metric-driven conditions, and the ones triggered by the values reported
+        # with `report` since the last step
+        self._monitored = {key: event for key, event in self.events.items() if event._monitors}
+        self._reported_events: set = set()
+        self._end_requested = False
+
+        # Ensure at least one stopping condition is provided
+        if (
+            self.max_epochs is None
+            and self.max_steps is None
+            and self.max_seconds is None
+            and max_samples is None
+            and max_tokens is None
+        ):
+            raise ValueError(
+                "At least one stopping condition "
+                "(max_epochs, max_steps, max_seconds, max_samples, or max_tokens) must be provided"
+            )
+        if batch_size_fn is None and (
+            max_samples is not None
+            or any("n_samples" in event._count_conditions for event in self.events.values())
+        ):
+            raise ValueError("max_samples and every_n_samples events require a batch_size_fn")
+        if token_count_fn is None and (
+            max_tokens is not None
+            or any("n_tokens" in event._count_conditions for event in self.events.values())
+        ):
+            raise ValueError("max_tokens and every_n_tokens events require a token_count_fn")
+        if budget_boundaries is not None and self.max_seconds is None:
+            raise ValueError("budget_boundaries require max_seconds")
+        if error_policy is not None and self._mixed:
+            raise ValueError("error_policy isn't supported with several sources")
+        if pipeline is not None and self._mixed:
+            raise ValueError("pipeline isn't supported with several sources")
+        if error_policy is not None:
+            # a pipeline seeks in the dataloader
+            check_recoverable(dataloader, error_policy)
+            # batches are counted before the incidents are turned into steps
+            if batch_size_fn is not None:
+                batch_size_fn = count_recovered(batch_size_fn)
+            if token_count_fn is not None:
+                token_count_fn = count_recovered(token_count_fn)
+
+        # built once the arguments are known to be valid
+        if self._mixed:
+            self.dataloader = MixedIterable(
+                dataloader,
+                mixing=mixing,
+                weights=mixing_weights,
+                seed=mixing_seed,
+                prefetch_depth=prefetch_depth or DEFAULT_PREFETCH_DEPTH,
+            )
+            # the sources are already prefetched
+            prefetch_depth = None
+            dataloader_len = dataloader_len or self.dataloader.length
+
+        # try to infer if not provided
+        dl_len = dataloader_len or (
+            len(self.dataloader) if isinstance(self.dataloader, collections.abc.Sized) else None
+        )
+
+        # a mixed epoch only ends once the length of every source is known
+        if (
+            self._mixed
+            and dl_len is None
+            and self.max_steps is None
+            and self.max_seconds is None
+            and max_samples is None
+            and max_tokens is None
+        ):
+            raise ValueError(
+                "With a source of unknown length, the epochs of several sources never end: "
+                "max_steps, max_seconds, max_samples, or max_tokens must be provided"
+            )
+
+        # whether the dataloader is a `PipelineIterable`, whose pools are shut down at the end
+        self._pipelined = False
+        if pipeline is not None:
+            self.dataloader = pipeline.apply(self.dataloader)
+            self._pipelined = True
+            if not pipeline.preserves_length:
+                dl_len = None
+
+        # State of the step currently being processed (the last step of the chunk in chunked
+        # mode), and whether the user code is done with it
+        self._chunk = None
+        self._loop_state = None
+        self._batch_events = None
+        self._step_done = True
+        # Sample and token counts of the last step that is done, None until a step counts them
+        self._done_counts = None
+        # Planner of the time budget, created once iteration begins if there are budget_boundaries
+        self._planner: Optional[BudgetPlanner] = None
+
+        self._saved_state = None
+        self._resume_from = LoopPosition()
+        if state_file is not None:
+            self.load_state_dict(load_state(state_file))
+
+        # Clock reading when the loop started, set once iteration begins
+        self._start_time = None
+        # Whether the steps skip reading the clock, as nothing needs their elapsed time
+        self._clock_stopped = False
+
+        # Arguments for the dataloader iterator, created once iteration begins
+        self._iter_kwargs = {
+            "dl_len": dl_len,
+            "max_epochs": max_epochs,
+            "max_steps": max_steps,
+            "max_seconds": max_seconds,
+            "no_len_iteration_strategy": no_len_iteration_strategy,
+            "prefetch_depth": prefetch_depth,
+            "events": events,
+            "low_allocation": low_allocation,
+            "budget_boundaries": budget_boundaries,
+            "batch_size_fn": batch_size_fn,
+            "token_count_fn": token_count_fn,
+            "max_samples": max_samples,
+            "max_tokens": max_tokens,
+        }
+
+    def on(
+        self,
+        key: Any,
+        fn: Optional[Handler] = None,
+        executor: HandlerExecutor = "inline",
+        max_in_flight: int = 1,
+        backpressure: Backpressure = "block",
+    ):
+        """
+        Register a handler, called with the LoopState of every step on which the event triggers,
+        once the step is done. Can also be used as a decorator (`@loop.on("Logging")`).
+
+        Exceptions raised by handlers don't stop the loop: they are appended to `handler_errors`
+        and `LoopEvents.EXCEPTION` is added to the batch_events of the next step. When there is
+        no next step (e.g. in a `LoopEvents.TRAINING_END` handler), the first of them is raised
+        once the loop ends and its state is saved.
+
+        Args:
+            key: Event key (custom or LoopEvents)
+            fn: The handler. With the "process" executor, it must be picklable
+            executor: Where to run the handler: "inline" (in the loop), or in a "thread" or
+                "process" pool, so slow handlers don't stall the loop
+            max_in_flight: Maximum number of calls of the handler submitted and not finished
+            backpressure: What to do with a call when `max_in_flight` calls are in flight:
+                "block" the loop until one finishes, "drop" the call, or "coalesce" it with the
+                calls waiting for room, keeping only the most recent one
+
+        Returns:
+            The handler, or a decorator registering it if `fn` isn't provided
+        """
+        if fn is None:
+            return lambda fn: self.on(key, fn, executor, max_in_flight, backpressure)
+
+        self._dispatcher.register(key, fn, executor, max_in_flight, backpressure)
+        return fn
+
+    def report(self, **values: Any) -> None:
+        """
+        Report metric values (e.g. a validation loss) to the events watching them with
+        `on_plateau`/`on_divergence`.
+
+        The events a report triggers are added to the batch_events of the next step. If any of
+        them has `end_training=True`, that step is the last one: its `training_end` is set and
+        `LoopEvents.TRAINING_END` is added to its batch_events. Events reported on the last step
+        only call their handlers, once the step is done.
+
+        Args:
+            **values: Values by metric name, converted with float
+
+        Raises:
+            ValueError: If the training has finished
+        """
+        loop_state = self._loop_state
+        if loop_state is not None and loop_state.training_end and self._step_done:
+            raise ValueError("The training has finished, no step is left to report to")
+        for key, event in self._monitored.items():
+            triggered = False
+            for name, value in values.items():
+                if event._report(name, float(value)):
+                    triggered = True
+            if triggered:
+                self._reported_events.add(key)
+                if event._end_training:
+                    self._end_requested = True
+
+    def pause(self) -> None:
+        """
+        Stop counting training time, e.g. during an eval in the loop body, until `resume` is
+        called. The time paused doesn't count towards max_seconds, `every_n_seconds`/`at_time`
+        events and `LoopState.elapsed_seconds`, but does towards `LoopState.wall_seconds`.
+        Checkpoints taken by the loop (see `checkpoint`) are paused automatically.
+        """
+        if self._pausable_clock is None:
+            self._pausable_clock = PausableClock(self._clock)
+        self._pausable_clock.pause()
+
+    def resume(self) -> None:
+        """Count training time again after `pause`."""
+        if self._pausable_clock is not None:
+            self._pausable_clock.resume()
+
+    @contextlib.contextmanager
+    def paused(self):
+        """
+        Context manager pausing the training time (see `pause`) within its block.
+
+        Example:
+            ```python
+            for batch, batch_events in loop:
+                train_step(batch)
+                if "Eval" in batch_events:
+                    with loop.paused():
+                        evaluate(model)
+            ```
+        """
+        if self._pausable_clock is not None and self._pausable_clock.paused:
+            # already paused, it's up to the outer pause to resume
+            yield
+            return
+
+        self.pause()
+        try:
+            yield
+        finally:
+            self.resume()
+
+    def schedule(self) -> EventSchedule:
+        """
+        Compute which step-based events trigger on every step, without touching the dataloader.
+
+        Only events with nothing but step-based triggers are included, since time-based,
+        custom condition and metric-driven events depend on the run. Requires numpy.
+
+        Returns:
+            EventSchedule: Boolean matrix (steps x events), and the epoch, epoch_step,
+            epoch_end and training_end of every step
+
+        Raises:
+            ValueError: If the length of the dataloader is unknown, or the loop is time-limited
+        """
+        dl_len = self._iter_kwargs["dl_len"]
+        if dl_len is None:
+            raise ValueError("The schedule of a loop is only known if the dataloader length is")
+
+        return compile_schedule(
+            self.events, dl_len, max_epochs=self.max_epochs, max_steps=self.max_steps
+        )
+
+    @property
+    def handler_errors(self) -> list[HandlerError]:
+        """Exceptions raised by the handlers registered with `on`."""
+        return self._dispatcher.errors
+
+    def __enter__(self):
+        """
+        Context manager enter method.
+
+        Returns:
+            self: The Loop instance
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit method.
+
+        Args:
+            exc_type: Exception type if an exception was raised
+            exc_val: Exception value if an exception was raised
+            exc_tb: Exception traceback if an exception was raised
+
+        Returns:
+            bool: True to suppress exceptions, False otherwise
+        """
+        if self.state_file is not None:
+            self.save_state()
+        if self.checkpoint is not None:
+            try:
+                self.checkpoint.wait()
+            except Exception:
+                if exc_type is None:
+                    raise
+                # the exception ending the loop is the one to raise
+                logger.exception("A checkpoint write failed while the loop was ending on an error")
+
+        return False
+
+    def save_state(self) -> None:
+        """
+        Atomically save the loop state to `state_file`.
+
+        A step counts as done once the next batch is requested. If the current step isn't done
+        (e.g. an exception was raised while processing it), the loop resumes by repeating it,
+        triggering the same events again.
+
+        Raises:
+            ValueError: If the loop has no state_file
+        """
+        if self.state_file is None:
+            raise ValueError("Can't save the loop state without a state_file")
+
+        if self._loop_state is None:
+            return  # no step was run, the state file (if any) is still up to date
+
+        save_state(self.state_file, self.state_dict())
+
+    def state_dict(self) -> dict:
+        """
+        JSON-serializable state of the loop, from which `load_state_dict` resumes it.
+
+        Returns:
+            dict: The state after the current step if it's done, or before it otherwise
+
+        Raises:
+            ValueError: If the loop hasn't started
+        """
+        loop_state = self._loop_state
+        if loop_state is None:
+            raise ValueError("The loop hasn't started")
+
+        # resume from the step after the last one that is done, with the elapsed time the ranks
+        # agreed on when reading it (`time_sync`), so they resume with the same time
+        elapsed_seconds = loop_state.elapsed_seconds
+        if not self._step_done:
+            first_loop_state = self._chunk.loop_state(0) if self._chunk is not None else loop_state
+            elapsed_seconds = first_loop_state.elapsed_seconds
+            epoch, global_step, epoch_step = (
+                first_loop_state.epoch,
+                first_loop_state.global_step,
+                first_loop_state.epoch_step,
+            )
+        elif loop_state.epoch_end:
+            epoch, global_step, epoch_step = loop_state.epoch + 1, loop_state.global_step + 1, 0
+        else:
+            epoch, global_step, epoch_step = (
+                loop_state.epoch,
+                loop_state.global_step + 1,
+                loop_state.epoch_step + 1,
+            )
+        if self._clock_stopped:
+            # the steps didn't read the clock
+            elapsed_seconds = self._training_clock() - self._start_time
+
+        # time-based events aren't deterministic, and the bookkeeping of count-based events is
+        # already past the step, so the ones triggered by a step that will be repeated are stored
+        # to be triggered again, on the batch of the chunk they triggered on
+        pending_events = []
+        pending_event_steps = []
+        if not self._step_done:
+            if self._chunk is not None:
+                events_by_step = zip(self._chunk.global_step, self._chunk.events)
+            else:
+                events_by_step = [(loop_state.global_step, self._batch_events)]
+            for step, batch_events in events_by_step:
+                for key in batch_events:
+                    event = self.events.get(key)
+                    if event is not None and (event._time_conditions or event._count_conditions):
+                        pending_events.append(event_key_id(key))
+                        pending_event_steps.append(step)
+
+        if self._step_done:
+            n_samples, n_tokens = loop_state.n_samples, loop_state.n_tokens
+        elif self._done_counts is not None:
+            n_samples, n_tokens = self._done_counts
+        else:
+            n_samples, n_tokens = self._resume_from.n_samples, self._resume_from.n_tokens
+
+        state = {
+            "epoch": epoch,
+            "global_step": global_step,
+            "epoch_step": epoch_step,
+            "elapsed_seconds": elapsed_seconds,
+            "paused_seconds": self._paused_seconds(),
+            "n_samples": n_samples,
+            "n_tokens": n_tokens,
+            "finished": self._step_done and loop_state.training_end,
+            "events": {
+                event_key_id(key): event._get_state()
+                for key, event in self.events.items()
+                if event._has_state
+            },
+            "pending_events": pending_events,
+            "pending_event_steps": pending_event_steps,
+        }
+        if self._planner is not None:
+            state["budget"] = self._planner._get_state(steps_done=self._step_done)
+        return state
+
+    def load_state_dict(self, state: Optional[dict]) -> None:
+        """
+        Resume the loop from a state returned by `state_dict` (e.g. stored in a checkpoint) when
+        iteration begins.
+
+        Args:
+            state: The state, or None to start from the beginning
+        """
+        self._saved_state = state
+        self._resume_from = LoopPosition()
+        self._paused_before = 0.0
+        if state is not None:
+            self._paused_before = state.get("paused_seconds", 0.0)
+            self._resume_from = LoopPosition(
+                epoch=state["epoch"],
+                global_step=state["global_step"],
+                epoch_step=state["epoch_step"],
+                elapsed_seconds=state["elapsed_seconds"],
+                n_samples=state.get("n_samples", 0),
+                n_tokens=state.get("n_tokens", 0),
+            )
+
+    def __iter__(self):
+        saved_state = self._saved_state or {}
+        if saved_state.get("finished", False):
+            return
+
+        # a single clock reading, shared with the iterator, marks the start of the loop
+        self._start_time = self._training_clock() - self._resume_from.elapsed_seconds
+        self._done_counts = None
+
+        # restore the time-based event bookkeeping
+        keys_by_id = {event_key_id(key): key for key in self.events}
+        for key_id, event_state in saved_state.get("events", {}).items():
+            if key_id in keys_by_id:
+                self.events[keys_by_id[key_id]]._set_state(event_state)
+        # pending events by the global step they triggered on (unknown in older states)
+        pending_ids = saved_state.get("pending_events", [])
+        pending_steps = saved_state.get("pending_event_steps", [None] * len(pending_ids))
+        pending_events = {
+            keys_by_id[key_id]: step
+            for key_id, step in zip(pending_ids, pending_steps)
+            if key_id in keys_by_id
+        }
+        # and the bookkeeping of the time budget
+        self._planner = None
+        budget_boundaries = self._iter_kwargs["budget_boundaries"]
+        if budget_boundaries is not None:
+            self._planner = BudgetPlanner(
+                self.max_seconds, budget_boundaries, start=self._resume_from.elapsed_seconds
+            )
+            if "budget" in saved_state:
+                self._planner._set_state(saved_state["budget"])
+
+        timer = self.timing
+        perf_counter = time.perf_counter
+        dispatcher = self._dispatcher if self._dispatcher else None
+        n_errors = len(self.handler_errors)
+        chunked = self.chunk_size is not None
+        profiler = self.profiler
+        flush_on = self.metrics_flush_on or None
+        # looked up once, as they don't change while iterating
+        source_epoch_ends = self._mixed and not chunked
+        paused_before = self._paused_before
+        save_state_on = self.save_state_on if self.state_file is not None else None
+        checkpoint = self.checkpoint
+        # with the lookahead-free strategy, the items ending an epoch are markers rather than
+        # steps, so they aren't timed, profiled or followed by saving the state
+        epoch_end_markers = (
+            not chunked
+            and self._iter_kwargs["dl_len"] is None
+            and self._iter_kwargs["no_len_iteration_strategy"] == "lookahead_free"
+        )
+        marker = False
+        # the counts of the last step done are kept apart, as the LoopState may be reused
+        counting = (
+            self._iter_kwargs["batch_size_fn"] is not None
+            or self._iter_kwargs["token_count_fn"] is not None
+        )
+        planner = self._planner
+
+        # without any of the features handled around each step (but timing), the steps are
+        # yielded as they come, and the clock is only read if an event or max_seconds needs the time, since no
+        # user code sees the LoopState
+        plain = not (
+            pending_events
+            or dispatcher is not None
+            or profiler is not None
+            or flush_on is not None
+            or save_state_on is not None
+            or checkpoint is not None
+            or chunked
+            or source_epoch_ends
+            or epoch_end_markers
+            or counting
+            or planner is not None
+            or self._monitored
+        )
+        self._clock_stopped = (
+            plain
+            and self.max_seconds is None
+            and self.time_sync is None
+            and not any(event._reads_clock for event in self.events.values())
+        )
+
+        step_clock = stopped_clock if self._clock_stopped else self._training_clock
+        if self.time_sync is not None:
+            step_clock = synchronized_clock(
+                step_clock, self._start_time, self.time_sync, self.time_sync_every_n_steps
+            )
+
+        iterator = self._iter_steps(step_clock)
+        resumed_at = perf_counter()
+        try:
+            if plain:
+                for batch, loop_state, batch_events in iterator:
+                    if paused_before or self._pausable_clock is not None:
+                        loop_state.paused_seconds = self._paused_seconds()
+                    self._loop_state = loop_state
+                    self._batch_events = batch_events
+                    self._step_done = False
+                    if timer is not None:
+                        yielded_at = perf_counter()
+                        yield batch, batch_events
+                        now = perf_counter()
+                        timer.record(yielded_at - resumed_at, now - yielded_at)
+                        resumed_at = now
+                    else:
+                        yield batch, batch_events
+                    self._step_done = True
+                    # don't keep the batch alive while the next one is loaded
+                    batch = None
+                return
+            for batch, loop_state, batch_events in iterator:
+                if pending_events:
+                    batch_events = batch_events | pending_events.keys()
+                    if chunked:
+                        self._add_pending_events(batch, pending_events)
+                    pending_events = None
+
+                if source_epoch_ends and batch.epoch_end:
+                    batch_events = batch_events | {SourceEpochEnd(batch.source)}
+
+                if self._reported_events:
+                    batch_events = self._add_reported_events(batch, loop_state, batch_events)
+
+                if dispatcher is not None and len(dispatcher.errors) > n_errors:
+                    # handlers failed since the previous step
+                    n_errors = len(dispatcher.errors)
+                    batch_events = batch_events | {LoopEvents.EXCEPTION}
+
+                if paused_before or self._pausable_clock is not None:
+                    paused_seconds = self._paused_seconds()
+                    loop_state.paused_seconds = paused_seconds
+                    if chunked:
+                        batch.paused_seconds = paused_seconds
+                if chunked:
+                    self._chunk = batch
+                self._loop_state = loop_state
+                self._batch_events = batch_events
+                self._step_done = False
+                if epoch_end_markers:
+                    marker = loop_state.epoch_end
+
+                if profiler is not None and not marker:
+                    if profiler.active:
+                        profiler.user_code()
+                    elif not self.profile_on.isdisjoint(batch_events):
+                        profiler.open(loop_state)
+
+                if timer is not None:
+                    yielded_at = perf_counter()
+                yield batch, batch_events
+                if profiler is not None and profiler.active and not marker:
+                    profiler.loop_code()
+                if flush_on is not None and not flush_on.isdisjoint(batch_events):
+                    self.flushed_metrics = self.metrics.flush()
+                if dispatcher is not None:
+                    self._dispatch(dispatcher, batch, loop_state, batch_events)
+                if timer is not None:
+                    # data wait: from requesting the batch until yielding it, compute: the rest
+                    now = perf_counter()
+                    if not marker:
+                        timer.record(yielded_at - resumed_at, now - yielded_at)
+                    resumed_at = now
+
+                self._step_done = True
+                if counting:
+                    self._done_counts = (loop_state.n_samples, loop_state.n_tokens)
+                if planner is not None:
+                    planner._mark_done()
+                if (
+                    save_state_on is not None
+                    and not marker
+                    and not save_state_on.isdisjoint(batch_events)
+                ):
+                    self.save_state()
+                if checkpoint is not None and not self.checkpoint_on.isdisjoint(batch_events):
+                    with self.paused():
+                        checkpoint.save(self.state_dict(), loop_state)
+                if profiler is not None and profiler.active and not marker:
+                    profiler.step_done()
+
+                # don't keep the batch alive while the next one is loaded
+                batch = None
+                if loop_state.training_end:
+                    if self._reported_events:
+                        # reported on the last step, with no next step to add the events to
+                        reported, self._reported_events = self._reported_events, set()
+                        self._end_requested = False
+                        if dispatcher is not None:
+                            dispatcher.dispatch(reported, loop_state)
+                    # ended early, e.g. by a metric event
+                    iterator.close()
+                    break
+        finally:
+            if self._mixed or self._pipelined:
+                # stop loading from the sources in the background, or shut down the worker pools
+                # of the pipeline
+                self.dataloader.close()
+            if dispatcher is not None:
+                # wait for the handlers in flight
+                dispatcher.close()
+            if profiler is not None:
+                # write the results of a window cut short
+                profiler.close()
+
+        if self.state_file is not None:
+            self.save_state()
+        if self.checkpoint is not None:
+            self.checkpoint.wait()
+        if dispatcher is not None and len(dispatcher.errors) > n_errors:
+            # handlers failed after the last step, which no step can report
+            raise dispatcher.errors[n_errors].exception
+
+    def _training_clock(self) -> float:
+        # the clock read by the steps, which only goes through the pausable clock once it exists
+        pausable_clock = self._pausable_clock
+        if pausable_clock is None:
+            return self._clock()
+        return pausable_clock()
+
+    def _paused_seconds(self) -> float:
+        # total seconds paused, including before resuming from a saved state
+        if self._pausable_clock is None:
+            return self._paused_before
+        return self._paused_before + self._pausable_clock.paused_seconds
+
+    def _iter_steps(self, step_clock: Clock) -> Iterable:
+        # (batch, loop_state, batch_events) tuples, or (chunk, loop_state, chunk_events) ones
+        dataloader = self.dataloader
+        if self.error_policy is not None:
+            dataloader = RecoveringIterable(dataloader, self.error_policy)
+        kwargs = {
+            "resume_from": self._resume_from,
+            "clock": step_clock,
+            "start_time": 0.0 if self._clock_stopped else self._start_time,
+            **self._iter_kwargs,
+        }
+        # the planner of the loop, whose bookkeeping is saved with its state
+        del kwargs["budget_boundaries"]
+
+        if self.chunk_size is not None and self._chunks_natively:
+            # the events of the batches of a chunk are always interned
+            del kwargs["low_allocation"]
+            return get_iter_chunks_with_events(
+                dataloader, self.chunk_size, source_epoch_end=self._mixed, **kwargs
+            )
+
+        iterator = get_iter_dl_with_events(
+            dataloader, return_loop_state=True, planner=self._planner, **kwargs
+        )
+        if self.error_policy is not None:
+            iterator = mark_dataloader_errors(iterator, self.dataloader_errors, self.error_policy)
+        if self.chunk_size is not None:
+            # the planner, the error policy and the lookahead-free markers work batch by batch
+            iterator = iter_chunks(iterator, self.chunk_size, source_epoch_end=self._mixed)
+        return iterator
+
+    @property
+    def _chunks_natively(self) -> bool:
+        # whether chunks can be produced directly, rather than grouping steps
+        kwargs = self._iter_kwargs
+        return (
+            self.error_policy is None
+            and kwargs["budget_boundaries"] is None
+            and (
+                kwargs["dl_len"] is not None
+                or kwargs["no_len_iteration_strategy"] != "lookahead_free"
+            )
+        )
+
+    @staticmethod
+    def _add_pending_events(chunk: Any, pending_events: dict) -> None:
+        # add the events to the batches of the chunk they triggered on, or its first one
+        first_step = chunk.global_step[0]
+        for key, step in pending_events.items():
+            i = 0 if step is None else step - first_step
+            if not 0 <= i < len(chunk):
+                i = 0
+            chunk.events[i] = chunk.events[i] | {key}
+
+    def _add_reported_events(self, batch: Any, loop_state: Any, batch_events: Any) -> Any:
+        reported, self._reported_events = self._reported_events, set()
+        chunked = self.chunk_size is not None
+        if chunked:
+            batch.events[0] = batch.events[0] | reported
+        if self._end_requested:
+            self._end_requested = False
+            loop_state.training_end = True
+            reported.add(LoopEvents.TRAINING_END)
+            if chunked:
+                batch.training_end[-1] = True
+                batch.events[-1] = batch.events[-1] | {LoopEvents.TRAINING_END}
+        return batch_events | reported
+
+    def _dispatch(
+        self, dispatcher: EventDispatcher, batch: Any, loop_state: Any, batch_events: Any
+    ) -> None:
+        if self.chunk_size is None:
+            dispatcher.dispatch(batch_events, loop_state)
+            return
+        # handlers are called once per batch of the chunk
+        for i, events in enumerate(batch.events):
+            if events:
+                dispatcher.dispatch(events, batch.loop_state(i))
+
+
+class AsyncLoop:
+    """
+    Loop over an async dataloader, meant to be used with `async for`.
+
+    Yields the same (batch, batch_events) pairs as `Loop`, while fetching batches in a background
+    asyncio task. Event condition functions may be coroutine functions (but not the conditions
+    of `when` triggers).
+    """
+
+    def __init__(
+        self,
+        dataloader: AsyncIterable,
+        events: Optional[dict[Any, Event]] = None,
+        max_epochs: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        state_file: Optional[str] = None,
+        dataloader_len: Optional[int] = None,
+        prefetch_depth: int = DEFAULT_PREFETCH_DEPTH,
+        clock: Optional[Clock] = None,
+    ):
+        """
+        Initialize the loop.
+
+        Args:
+            dataloader: Async iterable providing batches
+            events: Dictionary mapping event keys to Event instances
+            max_epochs: Maximum number of epochs
+            max_steps: Maximum number of steps
+            max_seconds: Maximum time in seconds
+            state_file: Not supported: async loops can't be resumed, so it must be None
+            dataloader_len: length of the dataloader. If not provided, will try to be inferred
+                with len(dataloader)
+            prefetch_depth: Number of batches fetched ahead in a background task
+            clock: Function returning the current time in seconds, read once per step and shared
+                by max_seconds and the time-based events. Defaults to a monotonic clock
+
+        Raises:
+            ValueError: If no stopping condition (max_epochs, max_steps, or max_seconds) is
+                provided, or a state_file is provided
+        """
+        if state_file is not None:
+            # the state would silently never be saved nor resumed from
+            raise ValueError("state_file isn't supported by AsyncLoop")
+
         self.dataloader = dataloader
         self.events = events or {}
         self.max_epochs = max_epochs
@@ -57,30 +996,29 @@ class Loop:
                 "(max_epochs, max_steps, or max_seconds) must be provided"
             )
 
-        # Will hold the dataloader iterator
-        self._iterator = get_iter_dl_with_events(
+        self._iterator = aget_iter_dl_with_events(
             self.dataloader,
             dl_len=dl_len,
             max_epochs=max_epochs,
             max_steps=max_steps,
             max_seconds=max_seconds,
-            no_len_iteration_strategy=no_len_iteration_strategy,
+            prefetch_depth=prefetch_depth,
             events=events,
+            clock=clock,
         )
 
-    def __enter__(self):
+    async def __aenter__(self):
         """
-        Context manager enter method.
+        Async context manager enter method.
 
         Returns:
-            self: The Loop instance
+            self: The AsyncLoop instance
         """
-        # Will later handle state loading
         return self
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
         """
-        Context manager exit method.
+        Async context manager exit method. Stops fetching batches in the background.
 
         Args:
             exc_type: Exception type if an exception was raised
@@ -90,8 +1028,8 @@ class Loop:
         Returns:
             bool: True to suppress exceptions, False otherwise
         """
-        # Will later handle exception catching and state saving
-        return False  # Don't suppress exceptions for now
+        await self._iterator.aclose()
+        return False
 
-    def __iter__(self):
-        yield from self._iterator
+    def __aiter__(self):
+        return self._iterator
@@ -0,0 +1,193 @@
+import math
+from array import array
+from collections.abc import Mapping
+from typing import Any, Literal, Optional
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, the buffers are arrays of doubles otherwise
+    numpy = None
+
+if numpy is not None:
+    _sum, _min, _max = numpy.sum, numpy.min, numpy.max
+else:
+    _sum, _min, _max = math.fsum, min, max
+
+Reduction = Literal["mean", "sum", "min", "max", "last", "ema"]
+
+_REDUCTIONS = ("mean", "sum", "min", "max", "last", "ema")
+
+DEFAULT_METRICS_CAPACITY = 1024
+
+# Marks that no value of a metric is waiting to be converted
+_NOTHING = object()
+
+
+def _materialize(value: Any) -> float:
+    # lazy values are zero-argument functions, framework scalars (tensors, numpy) convert with float
+    if callable(value):
+        value = value()
+    return float(value)
+
+
+def _new_buffer(capacity: int) -> Any:
+    # preallocated buffer of `capacity` floats
+    if numpy is not None:
+        return numpy.empty(capacity)
+    return array("d", bytes(8 * capacity))
+
+
+class _Reducer:
+    __slots__ = ("reduction", "ema_alpha", "buffer", "n_buffered", "latest", "count", "value")
+
+    def __init__(self, reduction: Reduction, ema_alpha: float, capacity: int):
+        self.reduction = reduction
+        self.ema_alpha = ema_alpha
+        # converted values logged since they were last reduced, in a buffer allocated once
+        self.buffer = _new_buffer(capacity)
+        self.n_buffered = 0
+        # the last value logged, converted once the next one is logged (or when flushing)
+        self.latest: Any = _NOTHING
+        # number of values reduced into `value` since the last flush
+        self.count = 0
+        self.value = math.nan
+
+    def push(self, value: Any) -> None:
+        if self.latest is not _NOTHING:
+            self.convert_latest()
+        self.latest = value
+
+    def convert_latest(self) -> None:
+        if self.n_buffered == len(self.buffer):
+            self.reduce_buffered()
+        self.buffer[self.n_buffered] = _materialize(self.latest)
+        self.latest = _NOTHING
+        self.n_buffered += 1
+
+    def reduce_buffered(self) -> None:
+        n = self.n_buffered
+        if not n:
+            return
+        values = self.buffer[:n]
+        reduction = self.reduction
+        value = self.value
+        if reduction == "ema":
+            for x in values:
+                value = x if math.isnan(value) else value + self.ema_alpha * (x - value)
+        elif reduction == "last":
+            value = values[-1]
+        elif reduction == "min":
+            value = _min(values) if not self.count else min(value, _min(values))
+        elif reduction == "max":
+            value = _max(values) if not self.count else max(value, _max(values))
+        else:
+            total = _sum(values)
+            if not self.count:
+                value = total if reduction == "sum" else total / n
+            elif reduction == "sum":
+                value += total
+            else:
+                value += (total - n * value) / (self.count + n)
+        self.value = float(value)
+        self.count += n
+        self.n_buffered = 0
+
+
+class Metrics:
+    """
+    Accumulate metrics every step, and reduce them only when they're needed (e.g. on logging).
+
+    Values may be framework scalars (e.g. a loss tensor on the GPU) or zero-argument functions.
+    Only a reference to the last value of each metric is kept: it's converted to a float when the
+    next one is logged (by then, the step that computed it is usually done) or when the metrics
+    are flushed, so accumulating doesn't force a host-device sync on the step that logs a value.
+    A single unconverted value per metric is kept alive, so logging tensors doesn't keep their
+    memory (or autograd graphs) alive until the next flush. The converted values are stored in a
+    buffer of `capacity` floats per metric allocated once (a NumPy array if NumPy is installed);
+    when it's full, its values are reduced in place.
+
+    Each metric is reduced with its `reductions` entry (or `default`): "mean", "sum", "min",
+    "max", "last" value, or exponential moving average ("ema", which unlike the others carries
+    over flushes).
+
+    Example:
+        ```python
+        for batch, batch_events in loop:
+            loss = train_step(batch)
+            loop.metrics.log(loss=loss)
+            if "Logging" in batch_events:
+                print(loop.metrics.flush())  # {"loss": 0.42}
+        ```
+    """
+
+    def __init__(
+        self,
+        reductions: Optional[Mapping[str, Reduction]] = None,
+        default: Reduction = "mean",
+        ema_alpha: float = 0.1,
+        capacity: int = DEFAULT_METRICS_CAPACITY,
+    ):
+        """
+        Initialize the accumulator.
+
+        Args:
+            reductions: Reduction of each metric, by name
+            default: Reduction of the metrics not in `reductions`
+            ema_alpha: Weight of each new value in the "ema" reduction
+            capacity: Maximum number of converted values per metric kept unreduced between
+                flushes
+
+        Raises:
+            ValueError: If a reduction isn't supported, ema_alpha isn't in (0, 1], or
+                capacity < 1
+        """
+        self.reductions = dict(reductions or {})
+        for reduction in (*self.reductions.values(), default):
+            if reduction not in _REDUCTIONS:
+                raise ValueError(f"Unknown reduction: {reduction!r}")
+        if not 0 < ema_alpha <= 1:
+            raise ValueError(f"ema_alpha must be in (0, 1], got {ema_alpha=}")
+        if capacity < 1:
+            raise ValueError(f"capacity must be >= 1, got {capacity=}")
+
+        self.default = default
+        self.ema_alpha = ema_alpha
+        self.capacity = capacity
+        self._reducers: dict[str, _Reducer] = {}
+
+    def log(self, **values: Any) -> None:
+        """
+        Accumulate a value for each metric, converting the previous one logged.
+
+        Args:
+            **values: Values by metric name. Framework scalars, numbers, or zero-argument
+                functions returning one
+        """
+        reducers = self._reducers
+        for name, value in values.items():
+            reducer = reducers.get(name)
+            if reducer is None:
+                reducer = reducers[name] = _Reducer(
+                    self.reductions.get(name, self.default), self.ema_alpha, self.capacity
+                )
+            reducer.push(value)
+
+    def flush(self) -> dict[str, float]:
+        """
+        Materialize and reduce the values accumulated since the last flush.
+
+        Returns:
+            dict[str, float]: The reduced value of each metric logged since the last flush
+        """
+        flushed = {}
+        for name, reducer in self._reducers.items():
+            if reducer.latest is _NOTHING and not reducer.n_buffered and not reducer.count:
+                continue
+            if reducer.latest is not _NOTHING:
+                reducer.convert_latest()
+            reducer.reduce_buffered()
+            flushed[name] = reducer.value
+            reducer.count = 0
+            if reducer.reduction != "ema":
+                reducer.value = math.nan
+        return flushed
@@ -0,0 +1,289 @@
+import bisect
+import collections.abc
+import itertools
+import random
+from collections.abc import Generator, Iterable, Iterator, Mapping
+from dataclasses import dataclass
+from typing import Any, Callable, Literal, NamedTuple, Optional
+
+from .iter_logic import _EXHAUSTED
+from .prefetch import PrefetchIterable
+from .utils import iter_epoch
+
+MixingStrategy = Literal["round_robin", "weighted_random", "proportional"]
+
+
+@dataclass(frozen=True)
+class SourceEpochEnd:
+    """
+    Event key added to batch_events when the batch is the last one of an epoch of `source`.
+
+    Example:
+        ```python
+        if SourceEpochEnd("wiki") in batch_events:
+            ...
+        ```
+    """
+
+    source: str
+
+
+class SourceBatch(NamedTuple):
+    """A batch yielded by a `MixedIterable`, with its source and position within the source."""
+
+    source: str
+    batch: Any
+    epoch: int
+    epoch_step: int
+    epoch_end: bool
+
+
+def _source_len(dl: Iterable) -> Optional[int]:
+    return len(dl) if isinstance(dl, collections.abc.Sized) else None
+
+
+def _mark_last(batches: Iterator) -> Generator[tuple[Any, bool], None, None]:
+    # pair each batch with whether it's the last one, by loading one batch ahead
+    batch = next(batches, _EXHAUSTED)
+    if batch is _EXHAUSTED:
+        return
+    for next_batch in batches:
+        yield batch, False
+        batch = next_batch
+    yield batch, True
+
+
+class _SourceCursor:
+    """Position within a source, which restarts the source whenever an epoch of it ends."""
+
+    def __init__(
+        self,
+        name: str,
+        dl: Iterable,
+        dl_len: Optional[int],
+        n_consumed: int,
+        prefetch_depth: Optional[int],
+    ):
+        self.name = name
+        self.dl = PrefetchIterable(dl, prefetch_depth) if prefetch_depth is not None else dl
+        self.dl_len = dl_len
+
+        self.epoch, self.epoch_step = divmod(n_consumed, dl_len) if dl_len is not None else (0, 0)
+        # the epoch is started right away, so that (with prefetching) loading overlaps with the
+        # consumption of the other sources
+        self._batches = self._start_epoch()
+
+        if dl_len is None:
+            # the epoch boundaries are unknown, the consumed batches are replayed
+            for _ in range(n_consumed):
+                self.next()
+
+    def _start_epoch(self) -> Iterator:
+        batches = iter_epoch(self.dl, self.epoch, self.epoch_step)
+        return batches if self.dl_len is not None else _mark_last(batches)
+
+    def next(self) -> SourceBatch:
+        item = next(self._batches, _EXHAUSTED)
+        if item is _EXHAUSTED:
+            raise ValueError(f"Source {self.name!r} ran out of batches in epoch {self.epoch}")
+
+        if self.dl_len is not None:
+            batch, epoch_end = item, self.epoch_step == self.dl_len - 1
+        else:
+            batch, epoch_end = item
+
+        source_batch = SourceBatch(self.name, batch, self.epoch, self.epoch_step, epoch_end)
+        if epoch_end:
+            self.close()
+            self.epoch += 1
+            self.epoch_step = 0
+            self._batches = self._start_epoch()
+        else:
+            self.epoch_step += 1
+        return source_batch
+
+    def close(self) -> None:
+        # stops prefetching the current epoch
+        if hasattr(self._batches, "close"):
+            self._batches.close()
+
+
+def _round_robin(names: list[str]) -> Callable[[], str]:
+    return itertools.cycle(names).__next__
+
+
+def _weighted_random(names: list[str], weights: list[float], seed: int) -> Callable[[], str]:
+    rng = random.Random(seed)
+    cumulative = list(itertools.accumulate(weights))
+    total = cumulative[-1]
+
+    def choose() -> str:
+        return names[bisect.bisect_right(cumulative, rng.random() * total)]
+
+    return choose
+
+
+def _proportional(names: list[str], weights: list[float]) -> Callable[[], str]:
+    # stride scheduling: each source advances by the inverse of its weight when chosen, and the
+    # one that is furthest behind goes next, interleaving sources evenly in the given proportion
+    strides = [1 / weight for weight in weights]
+    passes = list(strides)
+
+    def choose() -> str:
+        idx = min(range(len(passes)), key=passes.__getitem__)
+        passes[idx] += strides[idx]
+        return names[idx]
+
+    return choose
+
+
+class MixedIterable:
+    """
+    Iterable interleaving several named dataloaders (sources) into a single stream.
+
+    Yields `SourceBatch(source, batch, epoch, epoch_step, epoch_end)` items, where the epoch fields
+    refer to the source. Each source is restarted independently when one of its epochs ends, so
+    the mixed stream goes on until the consumer stops.
+
+    If the length of every source is known, an epoch of the mixed iterable is as long as all the
+    sources together (e.g. one pass over each source with "proportional" mixing). Otherwise the
+    mixed iterable has a single, endless epoch.
+
+    Mixing strategies:
+    - "round_robin": one batch from each source in turn
+    - "weighted_random": sources are sampled with probability proportional to `weights`
+        (by default, the lengths of the sources if known, otherwise uniform)
+    - "proportional": deterministic interleaving proportional to `weights` (by default, the
+        lengths of the sources, which must then be known)
+
+    The position of every source is a deterministic function of the number of batches consumed,
+    so `set_epoch` and `skip` resume an interrupted loop exactly without loading the skipped
+    batches of sources with known length.
+    """
+
+    def __init__(
+        self,
+        dataloaders: Mapping[str, Iterable],
+        mixing: MixingStrategy = "round_robin",
+        weights: Optional[Mapping[str, float]] = None,
+        seed: int = 0,
+        prefetch_depth: Optional[int] = None,
+    ):
+        """
+        Initialize the mixed iterable.
+
+        Args:
+            dataloaders: Dictionary mapping source names to dataloaders
+            mixing: How to interleave the sources
+            weights: Relative weight of each source, for "weighted_random" and "proportional"
+            seed: Seed of the random number generator of "weighted_random"
+            prefetch_depth: If provided, each source is loaded in its own background thread,
+                keeping up to this many batches ready, so loading from all sources overlaps
+
+        Raises:
+            ValueError: If there are no sources, a weight or length isn't positive, or the mixing
+                strategy is unknown or needs lengths that aren't known
+        """
+        if not dataloaders:
+            raise ValueError("At least one dataloader must be provided")
+        if mixing not in ("round_robin", "weighted_random", "proportional"):
+            raise ValueError(f"Unknown {mixing=}")
+
+        self.dataloaders = dict(dataloaders)
+        self.mixing = mixing
+        self.seed = seed
+        self.prefetch_depth = prefetch_depth
+
+        self.names = list(self.dataloaders)
+        self.source_lens = {name: _source_len(dl) for name, dl in self.dataloaders.items()}
+        if any(dl_len is not None and dl_len < 1 for dl_len in self.source_lens.values()):
+            raise ValueError(f"Sources can't be empty, got lengths {self.source_lens}")
+
+        all_lens_known = all(dl_len is not None for dl_len in self.source_lens.values())
+        self.length = sum(self.source_lens.values()) if all_lens_known else None
+
+        if weights is not None:
+            self.weights = [float(weights[name]) for name in self.names]
+        elif all_lens_known:
+            self.weights = [float(self.source_lens[name]) for name in self.names]
+        elif mixing == "proportional":
+            raise ValueError("proportional mixing needs weights or sources with known length")
+        else:
+            self.weights = [1.0] * len(self.names)
+        if any(weight <= 0 for weight in self.weights):
+            raise ValueError(f"Weights must be positive, got {weights}")
+
+        self._epoch = 0
+        # batches are taken from a single endless stream, restarted only to change position
+        self._stream: Optional[Generator[SourceBatch, None, None]] = None
+        self._position = 0
+
+    def _chooser(self) -> Callable[[], str]:
+        if self.mixing == "round_robin":
+            return _round_robin(self.names)
+        elif self.mixing == "weighted_random":
+            return _weighted_random(self.names, self.weights, self.seed)
+        return _proportional(self.names, self.weights)
+
+    def _iter_stream(self, start: int) -> Generator[SourceBatch, None, None]:
+        choose = self._chooser()
+
+        # replay the choices (but not the batches) to find where each source is
+        n_consumed = dict.fromkeys(self.names, 0)
+        for _ in range(start):
+            n_consumed[choose()] += 1
+
+        cursors = {
+            name: _SourceCursor(
+                name,
+                self.dataloaders[name],
+                self.source_lens[name],
+                n_consumed[name],
+                self.prefetch_depth,
+            )
+            for name in self.names
+        }
+        try:
+            while True:
+                yield cursors[choose()].next()
+        finally:
+            for cursor in cursors.values():
+                cursor.close()
+
+    def _iter_from(self, offset: int) -> Generator[SourceBatch, None, None]:
+        start = offset if self.length is None else self._epoch * self.length + offset
+        if self._stream is None or self._position != start:
+            self.close()
+            self._stream = self._iter_stream(start)
+            self._position = start
+
+        stream = self._stream
+        n_batches = itertools.count() if self.length is None else range(self.length - offset)
+        for _ in n_batches:
+            source_batch = next(stream)
+            self._position += 1
+            yield source_batch
+
+    def __iter__(self) -> Iterator[SourceBatch]:
+        return self._iter_from(0)
+
+    def set_epoch(self, epoch: int) -> None:
+        self._epoch = epoch
+
+    def skip(self, n: int) -> Iterable[SourceBatch]:
+        return _SkippedMixedIterable(self, n)
+
+    def close(self) -> None:
+        """Stop loading from the sources."""
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+class _SkippedMixedIterable:
+    def __init__(self, mixed: MixedIterable, n: int):
+        self.mixed = mixed
+        self.n = n
+
+    def __iter__(self) -> Iterator[SourceBatch]:
+        return self.mixed._iter_from(self.n)
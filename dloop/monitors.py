@@ -0,0 +1,89 @@
+import math
+from typing import Literal, Optional
+
+MonitorMode = Literal["min", "max"]
+
+
+class _Plateau:
+    """
+    Fires when a metric hasn't improved by more than `min_delta` for `patience` reports in a row,
+    then waits for another `patience` reports without improvement to fire again.
+
+    Keeps O(1) state: the best value, the number of reports since it improved, and the
+    exponential moving average of the values if they are smoothed. NaN and infinite values are
+    skipped, so they don't stick in the average (`_Divergence` watches for them).
+    """
+
+    def __init__(
+        self, patience: int, min_delta: float, mode: MonitorMode, ema_alpha: Optional[float]
+    ):
+        if patience < 1:
+            raise ValueError(f"patience must be >= 1, got {patience=}")
+        if min_delta < 0:
+            raise ValueError(f"min_delta must be >= 0, got {min_delta=}")
+        if mode not in ("min", "max"):
+            raise ValueError(f"Unknown mode: {mode!r}")
+        if ema_alpha is not None and not 0 < ema_alpha <= 1:
+            raise ValueError(f"ema_alpha must be in (0, 1], got {ema_alpha=}")
+
+        self.patience = patience
+        self.min_delta = min_delta
+        # values are negated in "max" mode, so lower is always better
+        self._sign = 1.0 if mode == "min" else -1.0
+        self.ema_alpha = ema_alpha
+
+        self.best = math.inf
+        self.n_since_improvement = 0
+        self.ema: Optional[float] = None
+
+    def update(self, value: float) -> bool:
+        if not math.isfinite(value):
+            return False
+        value *= self._sign
+        if self.ema_alpha is not None:
+            self.ema = value if self.ema is None else self.ema + self.ema_alpha * (value - self.ema)
+            value = self.ema
+
+        if value < self.best - self.min_delta:
+            self.best = value
+            self.n_since_improvement = 0
+            return False
+
+        self.n_since_improvement += 1
+        if self.n_since_improvement < self.patience:
+            return False
+        self.n_since_improvement = 0
+        return True
+
+    def _get_state(self) -> dict:
+        return {
+            "best": self.best,
+            "n_since_improvement": self.n_since_improvement,
+            "ema": self.ema,
+        }
+
+    def _set_state(self, state: dict) -> None:
+        self.best = state["best"]
+        self.n_since_improvement = state["n_since_improvement"]
+        self.ema = state["ema"]
+
+
+class _Divergence:
+    """Fires when a metric is NaN or infinite, or worse than `threshold`."""
+
+    def __init__(self, threshold: Optional[float], mode: MonitorMode):
+        if mode not in ("min", "max"):
+            raise ValueError(f"Unknown mode: {mode!r}")
+        self.threshold = threshold
+        self._sign = 1.0 if mode == "min" else -1.0
+
+    def update(self, value: float) -> bool:
+        if not math.isfinite(value):
+            return True
+        return self.threshold is not None and value * self._sign > self.threshold * self._sign
+
+    def _get_state(self) -> None:
+        return None
+
+    def _set_state(self, state: dict) -> None:
+        pass
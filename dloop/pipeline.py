@@ -0,0 +1,375 @@
+import concurrent.futures
+import queue
+import threading
+from collections.abc import Generator, Iterable, Iterator
+from itertools import islice
+from typing import Any, Callable, Literal, Optional
+
+from .utils import seek
+
+PipelineExecutor = Literal["thread", "process"]
+
+# Tags of the messages sent from the producer thread of a parallel stage to the consumer
+_FUTURE = 0
+_ERROR = 1
+_END = 2
+
+# How often (in seconds) a producer waiting for an item to be yielded checks whether it should stop
+_SLOT_POLL_INTERVAL = 0.1
+
+
+def _close(items: Iterator) -> None:
+    if hasattr(items, "close"):
+        items.close()
+
+
+class _Stage:
+    # whether the stage yields exactly one item per input item
+    preserves_length = False
+
+    def new_pool(self) -> Optional[concurrent.futures.Executor]:
+        # the worker pool of the stage, if it has workers
+        return None
+
+    def apply(self, items: Iterator, pool: Optional[concurrent.futures.Executor]) -> Iterator:
+        # the returned iterator closes `items` when it's closed
+        raise NotImplementedError
+
+
+def _inline_map(fn: Callable[[Any], Any], items: Iterator) -> Generator[Any, None, None]:
+    try:
+        yield from map(fn, items)
+    finally:
+        _close(items)
+
+
+def _parallel_map(
+    fn: Callable[[Any], Any],
+    items: Iterator,
+    pool: concurrent.futures.Executor,
+    max_in_flight: int,
+) -> Generator[Any, None, None]:
+    # results are yielded in the order of the inputs, with at most `max_in_flight` inputs
+    # submitted and not yet yielded. The inputs are read and submitted by a producer thread, so
+    # the consumer doesn't wait for the upstream stages
+    q: queue.Queue = queue.Queue()
+    slots = threading.Semaphore(max_in_flight)
+    stop = threading.Event()
+
+    def acquire_slot() -> bool:
+        while not stop.is_set():
+            if slots.acquire(timeout=_SLOT_POLL_INTERVAL):
+                return True
+        return False
+
+    def produce():
+        # the upstream stages are only used by this thread, which closes them once it's done
+        try:
+            for item in items:
+                if not acquire_slot() or stop.is_set():
+                    return
+                q.put((_FUTURE, pool.submit(fn, item)))
+        except BaseException as e:
+            # forwarded to the consumer
+            q.put((_ERROR, e))
+            return
+        finally:
+            _close(items)
+        q.put((_END, None))
+
+    thread = threading.Thread(target=produce, name="dloop-pipeline", daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            tag, value = q.get()
+            if tag == _END:
+                return
+            if tag == _ERROR:
+                raise value
+            result = value.result()
+            slots.release()
+            yield result
+    finally:
+        # the producer isn't joined, since it may be blocked reading from the upstream stages. It
+        # stops (and closes them) once it gets an item or a slot
+        stop.set()
+        while not q.empty():
+            tag, value = q.get()
+            if tag == _FUTURE:
+                value.cancel()
+
+
+class _Map(_Stage):
+    preserves_length = True
+
+    def __init__(
+        self,
+        fn: Callable[[Any], Any],
+        workers: int,
+        executor: PipelineExecutor,
+        max_in_flight: Optional[int],
+    ):
+        if workers < 0:
+            raise ValueError(f"workers must be >= 0, got {workers=}")
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor: {executor!r}")
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be >= 1, got {max_in_flight=}")
+        self.fn = fn
+        self.workers = workers
+        self.executor = executor
+        self.max_in_flight = max_in_flight or 2 * workers
+
+    def new_pool(self) -> Optional[concurrent.futures.Executor]:
+        if self.workers == 0:
+            return None
+        if self.executor == "thread":
+            return concurrent.futures.ThreadPoolExecutor(
+                self.workers, thread_name_prefix="dloop-pipeline"
+            )
+        return concurrent.futures.ProcessPoolExecutor(self.workers)
+
+    def _map(
+        self,
+        fn: Callable[[Any], Any],
+        items: Iterator,
+        pool: Optional[concurrent.futures.Executor],
+    ) -> Iterator:
+        if pool is None:
+            return _inline_map(fn, items)
+        return _parallel_map(fn, items, pool, self.max_in_flight)
+
+    def apply(self, items: Iterator, pool: Optional[concurrent.futures.Executor]) -> Iterator:
+        return self._map(self.fn, items, pool)
+
+
+class _KeepFunction:
+    # a class (instead of a closure), so it can be sent to a process pool
+    def __init__(self, predicate: Callable[[Any], bool]):
+        self.predicate = predicate
+
+    def __call__(self, item: Any) -> tuple[Any, bool]:
+        return item, bool(self.predicate(item))
+
+
+class _Filter(_Map):
+    preserves_length = False
+
+    def apply(self, items: Iterator, pool: Optional[concurrent.futures.Executor]) -> Iterator:
+        # the predicate runs in the workers, the items are filtered in order
+        results = self._map(_KeepFunction(self.fn), items, pool)
+        try:
+            for item, keep in results:
+                if keep:
+                    yield item
+        finally:
+            _close(results)
+
+
+class _Batch(_Stage):
+    def __init__(self, size: int, drop_last: bool, collate: Callable[[list], Any]):
+        if size < 1:
+            raise ValueError(f"size must be >= 1, got {size=}")
+        self.size = size
+        self.drop_last = drop_last
+        self.collate = collate
+
+    def apply(self, items: Iterator, pool: Optional[concurrent.futures.Executor]) -> Iterator:
+        size, collate = self.size, self.collate
+        try:
+            while True:
+                batch = list(islice(items, size))
+                if not batch or (self.drop_last and len(batch) < size):
+                    return
+                yield collate(batch)
+        finally:
+            _close(items)
+
+
+class _Unbatch(_Stage):
+    def apply(self, items: Iterator, pool: Optional[concurrent.futures.Executor]) -> Iterator:
+        try:
+            for batch in items:
+                yield from batch
+        finally:
+            _close(items)
+
+
+class Pipeline:
+    """
+    Chain of preprocessing stages applied to the batches of a dataloader before the loop yields
+    them, so preprocessing doesn't block the loop body.
+
+    `map` and `filter` stages run in a thread or process pool with `workers` workers, with at most
+    `max_in_flight` items submitted at a time (a bounded queue), and keep the order of their
+    inputs. `batch` and `unbatch` regroup items. Every method returns a new pipeline with the
+    stage appended.
+
+    Example:
+        ```python
+        pipeline = (
+            Pipeline()
+            .map(decode, workers=8, executor="process")
+            .filter(lambda sample: len(sample["tokens"]) > 0)
+            .batch(32, collate=collate_fn)
+        )
+        loop = Loop(dataset, pipeline=pipeline, max_steps=100_000)
+        ```
+    """
+
+    def __init__(self, stages: tuple = ()):
+        self.stages: tuple[_Stage, ...] = stages
+
+    def map(
+        self,
+        fn: Callable[[Any], Any],
+        workers: int = 1,
+        executor: PipelineExecutor = "thread",
+        max_in_flight: Optional[int] = None,
+    ) -> "Pipeline":
+        """
+        Append a stage transforming every item.
+
+        Args:
+            fn: Function applied to every item. With the "process" executor, it must be picklable
+            workers: Number of workers. With 0, `fn` runs inline in the loop
+            executor: Whether the workers are threads ("thread") or processes ("process")
+            max_in_flight: Maximum number of items submitted to the workers and not yet yielded.
+                Defaults to twice the number of workers
+
+        Returns:
+            Pipeline: The pipeline with the stage appended
+        """
+        return Pipeline((*self.stages, _Map(fn, workers, executor, max_in_flight)))
+
+    def filter(
+        self,
+        predicate: Callable[[Any], bool],
+        workers: int = 1,
+        executor: PipelineExecutor = "thread",
+        max_in_flight: Optional[int] = None,
+    ) -> "Pipeline":
+        """
+        Append a stage keeping only the items for which `predicate` is true.
+
+        Since the number of items kept isn't known ahead of time, the length of a filtered
+        dataloader is unknown.
+
+        Args:
+            predicate: Function returning whether to keep an item. With the "process" executor,
+                it must be picklable
+            workers: Number of workers. With 0, `predicate` runs inline in the loop
+            executor: Whether the workers are threads ("thread") or processes ("process")
+            max_in_flight: Maximum number of items submitted to the workers and not yet yielded.
+                Defaults to twice the number of workers
+
+        Returns:
+            Pipeline: The pipeline with the stage appended
+        """
+        return Pipeline((*self.stages, _Filter(predicate, workers, executor, max_in_flight)))
+
+    def batch(
+        self, size: int, drop_last: bool = False, collate: Callable[[list], Any] = list
+    ) -> "Pipeline":
+        """
+        Append a stage grouping consecutive items.
+
+        Args:
+            size: Number of items per group
+            drop_last: Whether to drop the last group if it has fewer than `size` items
+            collate: Function turning the list of items of a group into a batch
+
+        Returns:
+            Pipeline: The pipeline with the stage appended
+        """
+        return Pipeline((*self.stages, _Batch(size, drop_last, collate)))
+
+    def unbatch(self) -> "Pipeline":
+        """
+        Append a stage splitting every item (an iterable) into its elements.
+
+        Returns:
+            Pipeline: The pipeline with the stage appended
+        """
+        return Pipeline((*self.stages, _Unbatch()))
+
+    @property
+    def preserves_length(self) -> bool:
+        """Whether the pipeline yields exactly one item per input item (only `map` stages)."""
+        return all(stage.preserves_length for stage in self.stages)
+
+    def apply(self, iterable: Iterable) -> "PipelineIterable":
+        """
+        Apply the pipeline to a dataloader.
+
+        Args:
+            iterable: The dataloader
+
+        Returns:
+            PipelineIterable: Re-iterable over the outputs of the pipeline
+        """
+        return PipelineIterable(iterable, self)
+
+
+class PipelineIterable:
+    """
+    Re-iterable wrapper applying a `Pipeline` to every pass over the wrapped iterable.
+
+    It can be iterated once per epoch like the dataloader it wraps. The worker pools of the
+    stages are started by the first pass and reused by the next ones, until `close` shuts them
+    down.
+    """
+
+    def __init__(self, iterable: Iterable, pipeline: Pipeline):
+        """
+        Initialize the wrapper.
+
+        Args:
+            iterable: Iterable the pipeline is applied to
+            pipeline: The pipeline
+        """
+        self.iterable = iterable
+        self.pipeline = pipeline
+        # worker pools by index of their stage, started on first use
+        self._pools: dict[int, concurrent.futures.Executor] = {}
+
+    def __iter__(self) -> Iterator:
+        return self._iter(self.iterable)
+
+    def _iter(self, iterable: Iterable) -> Generator[Any, None, None]:
+        items = iter(iterable)
+        for i, stage in enumerate(self.pipeline.stages):
+            items = stage.apply(items, self._pool(i))
+        try:
+            yield from items
+        finally:
+            # every stage closes the ones before it, unless they're still used by the producer
+            # thread of a parallel stage, which closes them itself
+            _close(items)
+
+    def _pool(self, i: int) -> Optional[concurrent.futures.Executor]:
+        pool = self._pools.get(i)
+        if pool is None:
+            pool = self.pipeline.stages[i].new_pool()
+            if pool is not None:
+                self._pools[i] = pool
+        return pool
+
+    def close(self) -> None:
+        """Shut down the worker pools. A later pass starts new ones."""
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def set_epoch(self, epoch: int) -> None:
+        if hasattr(self.iterable, "set_epoch"):
+            self.iterable.set_epoch(epoch)
+
+    def skip(self, n: int) -> Iterable:
+        if self.pipeline.preserves_length:
+            # seek in the wrapped iterable, so skipped items aren't loaded or processed. The pass
+            # uses the worker pools of this iterable
+            return self._iter(seek(self.iterable, n))
+        # which inputs the first n outputs come from isn't known without processing them
+        return islice(self, n, None)
@@ -0,0 +1,152 @@
+import asyncio
+import queue
+import threading
+from collections.abc import AsyncGenerator, AsyncIterable, Generator, Iterable
+from typing import Any
+
+from .utils import seek
+
+DEFAULT_PREFETCH_DEPTH = 2
+
+# Tags of the messages sent from the producer thread to the consumer
+_ITEM = 0
+_ERROR = 1
+_END = 2
+
+# How often (in seconds) a producer blocked on a full queue checks whether it should stop
+_PUT_POLL_INTERVAL = 0.1
+
+
+def prefetch(iterable: Iterable, depth: int = DEFAULT_PREFETCH_DEPTH) -> Generator[Any, None, None]:
+    """
+    Iterate over `iterable` in a background thread, keeping up to `depth` items ready.
+
+    The producer thread fills a bounded queue and finishes with a sentinel, so the consumer sees
+    the end of the iterable exactly as with a plain iterator. Exceptions raised while iterating are
+    re-raised in the consumer with their original traceback. Closing the generator (or letting it
+    be garbage collected) tells the producer to stop.
+
+    Args:
+        iterable: Iterable to consume in the background
+        depth: Maximum number of items loaded ahead of the consumer
+
+    Returns:
+        Generator yielding the items of `iterable`, in order
+    """
+    if depth < 1:
+        raise ValueError(f"depth must be >= 1, got {depth=}")
+
+    q: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(message) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(message, timeout=_PUT_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((_ITEM, item)):
+                    return
+        except BaseException as e:
+            # whatever the iterable raises is forwarded to the consumer, to be raised there
+            put((_ERROR, e))
+            return
+        put((_END, None))
+
+    thread = threading.Thread(target=produce, name="dloop-prefetch", daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            tag, value = q.get()
+            if tag == _END:
+                return
+            if tag == _ERROR:
+                raise value
+            yield value
+    finally:
+        stop.set()
+
+
+class PrefetchIterable:
+    """
+    Re-iterable wrapper that prefetches every pass over the wrapped iterable.
+
+    Each call to `iter()` starts a new producer thread, so it can be iterated once per epoch like
+    the dataloader it wraps.
+    """
+
+    def __init__(self, iterable: Iterable, depth: int = DEFAULT_PREFETCH_DEPTH):
+        """
+        Initialize the wrapper.
+
+        Args:
+            iterable: Iterable to prefetch from
+            depth: Maximum number of items loaded ahead of the consumer
+        """
+        if depth < 1:
+            raise ValueError(f"depth must be >= 1, got {depth=}")
+
+        self.iterable = iterable
+        self.depth = depth
+
+    def __iter__(self):
+        return prefetch(self.iterable, self.depth)
+
+    def set_epoch(self, epoch: int) -> None:
+        if hasattr(self.iterable, "set_epoch"):
+            self.iterable.set_epoch(epoch)
+
+    def skip(self, n: int) -> "PrefetchIterable":
+        # seek in the wrapped iterable, so skipped batches aren't loaded in the background
+        return PrefetchIterable(seek(self.iterable, n), self.depth)
+
+
+async def aprefetch(
+    aiterable: AsyncIterable, depth: int = DEFAULT_PREFETCH_DEPTH
+) -> AsyncGenerator[Any, None]:
+    """
+    Async counterpart of `prefetch`: iterate over `aiterable` in a background asyncio task,
+    keeping up to `depth` items ready, so fetching overlaps with the consumer's awaits.
+
+    Args:
+        aiterable: Async iterable to consume in the background
+        depth: Maximum number of items loaded ahead of the consumer
+
+    Returns:
+        Async generator yielding the items of `aiterable`, in order
+    """
+    if depth < 1:
+        raise ValueError(f"depth must be >= 1, got {depth=}")
+
+    q: asyncio.Queue = asyncio.Queue(maxsize=depth)
+
+    async def produce():
+        try:
+            async for item in aiterable:
+                await q.put((_ITEM, item))
+        except Exception as e:
+            # whatever the iterable raises is forwarded to the consumer, to be raised there
+            await q.put((_ERROR, e))
+            return
+        await q.put((_END, None))
+
+    task = asyncio.ensure_future(produce())
+
+    try:
+        while True:
+            tag, value = await q.get()
+            if tag == _END:
+                return
+            if tag == _ERROR:
+                raise value
+            yield value
+    finally:
+        task.cancel()
+        await asyncio.wait([task])
@@ -0,0 +1,191 @@
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from typing import Literal, Optional
+
+from .types import LoopState
+
+ProfilerKind = Literal["cprofile", "tracemalloc"]
+
+_PHASES = ("user", "loop")
+
+
+class Profiler:
+    """
+    Profile a window of a few steps of a loop, opened when an event triggers.
+
+    The loop only checks whether to open a window, so the steady-state cost is a set intersection
+    per step. Within a window, the time spent in user code (from yielding a batch until the next
+    one is requested) and in the loop's own code (fetching batches, evaluating events, handlers,
+    saving state and checkpoints) is accounted for separately.
+
+    When the window closes, the results are written to files named after `path`, with `{epoch}`
+    and `{global_step}` filled with the first step of the window:
+    - "cprofile": the cProfile stats of the user code to `path`, and of the loop's own code to
+      `path` with ".loop" inserted before the extension (e.g. "profile-1000.loop.prof"). Both can
+      be read with `pstats.Stats`
+    - "tracemalloc": a snapshot of the memory allocated (and still alive) when the window closes
+      to `path`, readable with `tracemalloc.Snapshot.load`
+
+    In both cases, a summary with the seconds spent in each part (and for "tracemalloc", the peak
+    memory traced in each one) is written as JSON next to it (e.g. "profile-1000.json").
+
+    Example:
+        ```python
+        events = {"Profile": Event(at_step=1000)}
+        loop = Loop(dataloader, max_steps=100_000, events=events,
+                    profiler=Profiler("profile-{global_step}.prof", n_steps=20),
+                    profile_on=["Profile"])
+        ```
+    """
+
+    def __init__(self, path: str, n_steps: int = 1, kind: ProfilerKind = "cprofile"):
+        """
+        Initialize the profiler.
+
+        Args:
+            path: Path of the profile files. May contain `{epoch}` and `{global_step}`
+                placeholders
+            n_steps: Number of steps profiled by each window
+            kind: What to profile: function calls ("cprofile") or memory allocations
+                ("tracemalloc")
+
+        Raises:
+            ValueError: If n_steps < 1 or kind isn't supported
+        """
+        if n_steps < 1:
+            raise ValueError(f"n_steps must be >= 1, got {n_steps=}")
+        if kind not in ("cprofile", "tracemalloc"):
+            raise ValueError(f"Unknown profiler kind: {kind!r}")
+
+        self.path = path
+        self.n_steps = n_steps
+        self.kind = kind
+
+        # state of the open window, if any
+        self._window_path: Optional[str] = None
+        # epoch and global step of the first step of the window
+        self._start: Optional[tuple[int, int]] = None
+        self._n_done = 0
+        self._phase = "loop"
+        self._switched_at = 0.0
+        self._seconds: dict[str, float] = {}
+        self._peak_bytes: dict[str, int] = {}
+        self._profiles: dict[str, cProfile.Profile] = {}
+        self._started_tracing = False
+
+    @property
+    def active(self) -> bool:
+        """Whether a window is open."""
+        return self._window_path is not None
+
+    def open(self, loop_state: LoopState) -> None:
+        """
+        Open a window, starting with the user code of a step.
+
+        Args:
+            loop_state: State of the first step of the window
+
+        Raises:
+            RuntimeError: If a window is already open
+        """
+        if self.active:
+            raise RuntimeError("A profiling window is already open")
+
+        self._window_path = self.path.format(
+            epoch=loop_state.epoch, global_step=loop_state.global_step
+        )
+        # the position is copied, as the LoopState may be reused for the next steps
+        self._start = (loop_state.epoch, loop_state.global_step)
+        self._n_done = 0
+        self._seconds = dict.fromkeys(_PHASES, 0.0)
+        self._peak_bytes = dict.fromkeys(_PHASES, 0)
+        if self.kind == "cprofile":
+            self._profiles = {phase: cProfile.Profile() for phase in _PHASES}
+        else:
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        self._phase = "user"
+        self._switched_at = time.perf_counter()
+        if self.kind == "cprofile":
+            self._profiles["user"].enable()
+
+    def _switch(self, phase: str) -> None:
+        previous = self._phase
+        if previous == phase:
+            return
+        if self.kind == "cprofile":
+            self._profiles[previous].disable()
+        else:
+            peak = tracemalloc.get_traced_memory()[1]
+            self._peak_bytes[previous] = max(self._peak_bytes[previous], peak)
+            tracemalloc.reset_peak()
+
+        now = time.perf_counter()
+        self._seconds[previous] += now - self._switched_at
+        self._switched_at = now
+        self._phase = phase
+        if self.kind == "cprofile":
+            self._profiles[phase].enable()
+
+    def user_code(self) -> None:
+        """Account for what runs from now on as user code."""
+        self._switch("user")
+
+    def loop_code(self) -> None:
+        """Account for what runs from now on as the loop's own code."""
+        self._switch("loop")
+
+    def step_done(self) -> None:
+        """Count a step as done, closing the window after `n_steps` steps."""
+        self._n_done += 1
+        if self._n_done >= self.n_steps:
+            self.close()
+
+    def close(self) -> None:
+        """
+        Close the open window, if any, and write its results (e.g. when the loop ends before the
+        window is complete).
+        """
+        if not self.active:
+            return
+
+        self._switch("loop")
+        if self.kind == "cprofile":
+            self._profiles["loop"].disable()
+        else:
+            peak = tracemalloc.get_traced_memory()[1]
+            self._peak_bytes["loop"] = max(self._peak_bytes["loop"], peak)
+        self._seconds["loop"] += time.perf_counter() - self._switched_at
+
+        path = self._window_path
+        root, ext = os.path.splitext(path)
+        if self.kind == "cprofile":
+            self._profiles["user"].dump_stats(path)
+            self._profiles["loop"].dump_stats(f"{root}.loop{ext}")
+            self._profiles = {}
+        else:
+            tracemalloc.take_snapshot().dump(path)
+            if self._started_tracing:
+                tracemalloc.stop()
+
+        summary = {
+            "epoch": self._start[0],
+            "global_step": self._start[1],
+            "n_steps": self._n_done,
+            "user_seconds": self._seconds["user"],
+            "loop_seconds": self._seconds["loop"],
+        }
+        if self.kind == "tracemalloc":
+            summary["user_peak_bytes"] = self._peak_bytes["user"]
+            summary["loop_peak_bytes"] = self._peak_bytes["loop"]
+        with open(f"{root}.json", "w") as f:
+            json.dump(summary, f)
+
+        self._window_path = None
+        self._start = None
@@ -0,0 +1,295 @@
+import time
+from collections import deque
+from collections.abc import Generator, Iterable
+from dataclasses import dataclass
+from typing import Any, Callable, Literal, Optional
+
+from .events import LoopEvents
+from .exceptions import DataloaderErrorRateExceeded
+from .types import LoopState
+from .utils import _can_seek, iter_epoch, seek
+
+ErrorAction = Literal["continue", "restart", "retry"]
+
+# Exceptions recovered from by default: failures to read (e.g. a truncated file, a network
+# timeout), not bugs in the code loading the batches
+DEFAULT_RECOVERED_EXCEPTIONS: tuple[type[BaseException], ...] = (OSError, EOFError)
+
+
+@dataclass
+class DataloaderError:
+    """
+    An exception raised by the dataloader while loading a batch, recovered from by the loop.
+
+    Only the type and message of the exception are kept, so that the errors don't keep the
+    frames of their tracebacks (and the batches they reference) alive.
+    """
+
+    epoch: int
+    global_step: int
+    epoch_step: int
+    exception_type: type[BaseException]
+    message: str
+    # number of times loading the batch was retried
+    n_retries: int
+    # whether the batch was lost (the step was yielded with a None batch)
+    lost: bool
+
+
+class _Incident:
+    # stands for a batch that failed to load, in place of which the step is yielded
+    __slots__ = ("batch", "exception", "n_retries")
+
+    def __init__(self, batch: Any, exception: BaseException, n_retries: int):
+        self.batch = batch
+        self.exception = exception
+        self.n_retries = n_retries
+
+
+class ErrorPolicy:
+    """
+    How the loop recovers from exceptions raised by the dataloader while loading a batch.
+
+    Every batch the dataloader fails on still counts as a step, so epochs keep their length and
+    resuming stays exact. **The step is yielded with a None batch** unless a retry loaded it, so
+    the loop body must check for it (or for `LoopEvents.EXCEPTION` in its batch_events). A
+    `DataloaderError` describing the incident is appended to `Loop.dataloader_errors`, which
+    keeps the `max_kept_errors` most recent ones. The actions are:
+    - "continue": yield the step with a None batch and continue with the same iterator, for
+      dataloaders whose iterator survives exceptions (like PyTorch's DataLoader)
+    - "restart": yield the step with a None batch, and recreate the iterator of the epoch past
+      it, for iterators that stop on exceptions (e.g. generators)
+    - "retry": recreate the iterator of the epoch at the batch and load it again, waiting
+      `backoff_seconds` (doubled on every retry) before each attempt, for transient errors. After
+      `max_retries` failed retries, the step is yielded with a None batch like with "restart"
+
+    "restart" and "retry" need a dataloader that can seek (see `seek`), since replaying the epoch
+    up to the batch would cost as many batches as it's in, and see different ones if the
+    dataloader reshuffles. With other dataloaders, "continue" ends the epoch on the batch if the
+    iterator stops on the exception.
+
+    Only `exceptions` are recovered from, by default I/O errors, so that bugs in the code loading
+    the batches (e.g. a TypeError in a collate function) still end the run.
+
+    Recovering stops, raising `DataloaderErrorRateExceeded`, when more than `max_error_rate` of
+    the last `window` steps failed.
+    """
+
+    def __init__(
+        self,
+        action: ErrorAction = "restart",
+        exceptions: tuple[type[BaseException], ...] = DEFAULT_RECOVERED_EXCEPTIONS,
+        max_retries: int = 3,
+        backoff_seconds: float = 1.0,
+        max_error_rate: float = 0.01,
+        window: int = 1000,
+        max_kept_errors: int = 100,
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            action: How to recover: "continue", "restart" or "retry"
+            exceptions: Exception types recovered from, the others are raised. Defaults to
+                OSError and EOFError
+            max_retries: With "retry", maximum number of retries per batch
+            backoff_seconds: With "retry", seconds waited before the first retry
+            max_error_rate: Maximum fraction of the last `window` steps that may fail
+            window: Number of most recent steps over which the error rate is measured
+            max_kept_errors: Number of most recent incidents kept in `Loop.dataloader_errors`
+
+        Raises:
+            ValueError: If the action isn't supported, max_retries < 0, backoff_seconds < 0,
+                max_error_rate isn't in [0, 1], window < 1 or max_kept_errors < 0
+        """
+        if action not in ("continue", "restart", "retry"):
+            raise ValueError(f"Unknown error action: {action!r}")
+        if max_retries < 0:
+            raise ValueError(f"max_retries must be >= 0, got {max_retries=}")
+        if backoff_seconds < 0:
+            raise ValueError(f"backoff_seconds must be >= 0, got {backoff_seconds=}")
+        if not 0 <= max_error_rate <= 1:
+            raise ValueError(f"max_error_rate must be in [0, 1], got {max_error_rate=}")
+        if window < 1:
+            raise ValueError(f"window must be >= 1, got {window=}")
+        if max_kept_errors < 0:
+            raise ValueError(f"max_kept_errors must be >= 0, got {max_kept_errors=}")
+
+        self.action = action
+        self.exceptions = exceptions
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.max_kept_errors = max_kept_errors
+
+
+def check_recoverable(iterable: Iterable, policy: ErrorPolicy) -> None:
+    """
+    Check that the exceptions raised while iterating over `iterable` can be recovered from as
+    `policy` says.
+
+    Args:
+        iterable: The dataloader
+        policy: How to recover
+
+    Raises:
+        ValueError: If the policy restarts or retries and the iterable can't seek
+    """
+    if policy.action != "continue" and not _can_seek(iterable):
+        raise ValueError(
+            f"The {policy.action!r} error action needs a dataloader that can seek (with a "
+            "`skip(n)` method or index-based access), use 'continue' otherwise"
+        )
+
+
+class RecoveringIterable:
+    """
+    Re-iterable wrapper that recovers from the exceptions raised while iterating over the wrapped
+    iterable, following an `ErrorPolicy`. The batches that fail are replaced by incidents, which
+    `mark_dataloader_errors` turns into steps with `LoopEvents.EXCEPTION`.
+    """
+
+    def __init__(self, iterable: Iterable, policy: ErrorPolicy, start: int = 0):
+        """
+        Initialize the wrapper.
+
+        Args:
+            iterable: Iterable to recover from
+            policy: How to recover
+            start: Number of batches of the epoch skipped (see `seek`)
+
+        Raises:
+            ValueError: If the policy restarts or retries and the iterable can't seek
+        """
+        check_recoverable(iterable, policy)
+        self.iterable = iterable
+        self.policy = policy
+        self._start = start
+        self._epoch: Optional[int] = None
+
+    def set_epoch(self, epoch: int) -> None:
+        self._epoch = epoch
+        if hasattr(self.iterable, "set_epoch"):
+            self.iterable.set_epoch(epoch)
+
+    def skip(self, n: int) -> "RecoveringIterable":
+        # seeking is delegated, so the iterator can be recreated at any batch of the epoch
+        recovering = RecoveringIterable(self.iterable, self.policy, self._start + n)
+        recovering._epoch = self._epoch
+        return recovering
+
+    def _iter_from(self, epoch_step: int):
+        if self._epoch is None:
+            return iter(seek(self.iterable, epoch_step))
+        return iter_epoch(self.iterable, self._epoch, epoch_step)
+
+    def __iter__(self):
+        policy = self.policy
+        epoch_step = self._start
+        iterator = self._iter_from(epoch_step)
+        while True:
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            except policy.exceptions as e:
+                incident = _Incident(None, e, 0)
+                if policy.action == "retry":
+                    iterator = self._retry(incident, epoch_step)
+                elif policy.action == "restart":
+                    iterator = self._iter_from(epoch_step + 1)
+                batch = incident
+
+            yield batch
+            epoch_step += 1
+
+    def _retry(self, incident: _Incident, epoch_step: int):
+        # reload the batch, returning the iterator to continue with
+        policy = self.policy
+        while incident.n_retries < policy.max_retries:
+            time.sleep(policy.backoff_seconds * 2**incident.n_retries)
+            incident.n_retries += 1
+            iterator = self._iter_from(epoch_step)
+            try:
+                incident.batch = next(iterator)
+            except StopIteration:
+                break
+            except policy.exceptions as e:
+                incident.exception = e
+            else:
+                return iterator
+        return self._iter_from(epoch_step + 1)
+
+
+def count_recovered(count_fn: Callable[[Any], int]) -> Callable[[Any], int]:
+    """
+    Wrap a `batch_size_fn`/`token_count_fn` to count the batches of a `RecoveringIterable`: the
+    batch of an incident is counted if a retry loaded it, and a lost one counts as 0.
+
+    Args:
+        count_fn: Function returning the number of samples or tokens of a batch
+
+    Returns:
+        Callable[[Any], int]: The function, accepting incidents
+    """
+
+    def count(batch: Any) -> int:
+        if type(batch) is _Incident:
+            batch = batch.batch
+            if batch is None:
+                return 0
+        return count_fn(batch)
+
+    return count
+
+
+def mark_dataloader_errors(
+    iterator: Iterable[tuple[Any, LoopState, Any]], errors: deque, policy: ErrorPolicy
+) -> Generator[tuple[Any, LoopState, Any], None, None]:
+    """
+    Turn the incidents of a `RecoveringIterable` into steps with `LoopEvents.EXCEPTION`.
+
+    Args:
+        iterator: Iterator as returned by `get_iter_dl_with_events(..., return_loop_state=True)`
+            over a `RecoveringIterable`
+        errors: Deque to which a `DataloaderError` is appended for every incident
+        policy: The policy of the `RecoveringIterable`
+
+    Returns:
+        Generator yielding (batch, loop_state, batch_events) tuples, where the batch of a step
+        that failed is the batch loaded by a retry, or None
+
+    Raises:
+        DataloaderErrorRateExceeded: If more than `max_error_rate` of the last `window` steps
+            failed
+    """
+    # global steps of the incidents within the window
+    failed_steps: deque[int] = deque()
+    max_failed = policy.max_error_rate * policy.window
+    for batch, loop_state, batch_events in iterator:
+        if type(batch) is _Incident:
+            incident = batch
+            batch = incident.batch
+            errors.append(
+                DataloaderError(
+                    epoch=loop_state.epoch,
+                    global_step=loop_state.global_step,
+                    epoch_step=loop_state.epoch_step,
+                    exception_type=type(incident.exception),
+                    message=str(incident.exception),
+                    n_retries=incident.n_retries,
+                    lost=batch is None,
+                )
+            )
+            failed_steps.append(loop_state.global_step)
+            while failed_steps[0] <= loop_state.global_step - policy.window:
+                failed_steps.popleft()
+            if len(failed_steps) > max_failed:
+                raise DataloaderErrorRateExceeded(
+                    f"The dataloader failed on {len(failed_steps)} of the last {policy.window} "
+                    f"steps, more than {max_failed:g} (max_error_rate={policy.max_error_rate:g})"
+                ) from incident.exception
+            batch_events = batch_events | {LoopEvents.EXCEPTION}
+
+        yield batch, loop_state, batch_events
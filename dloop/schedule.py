@@ -0,0 +1,163 @@
+import copy
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Optional
+
+from .events import Event
+from .triggers import Trigger
+from .types import LoopState
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError(
+            "Computing event schedules requires numpy (pip install dloop[numpy])"
+        ) from e
+    return numpy
+
+
+@dataclass
+class EventSchedule:
+    """
+    Which events trigger on every step of a loop, computed ahead of time.
+
+    All the arrays have one entry per step, indexed by global step.
+    """
+
+    # keys of the events, one per column of `events`
+    keys: list
+    # boolean matrix (steps x events), True where the event triggers
+    events: "np.ndarray"
+    epoch: "np.ndarray"
+    epoch_step: "np.ndarray"
+    epoch_end: "np.ndarray"
+    training_end: "np.ndarray"
+
+    @property
+    def n_steps(self) -> int:
+        return len(self.epoch)
+
+    def steps(self, key: Any) -> "np.ndarray":
+        """
+        Global steps on which an event triggers.
+
+        Args:
+            key: Event key
+
+        Returns:
+            np.ndarray: The global steps, in increasing order
+        """
+        return _import_numpy().flatnonzero(self.events[:, self.keys.index(key)])
+
+    def count(self, key: Any) -> int:
+        """
+        Number of steps on which an event triggers.
+
+        Args:
+            key: Event key
+
+        Returns:
+            int: The number of steps
+        """
+        return int(self.events[:, self.keys.index(key)].sum())
+
+
+def _fill_trigger_column(column: "np.ndarray", trigger: Trigger, dl_len: int) -> None:
+    # evaluate the trigger only on the candidate steps it reports, epoch by epoch, on a copy so
+    # the state of the trigger (e.g. the count of `limit`) isn't changed
+    trigger = copy.deepcopy(trigger)
+    n_steps = len(column)
+    for epoch_start in range(0, n_steps, dl_len):
+        epoch_stop = min(epoch_start + dl_len, n_steps)
+        step = trigger.next_step(epoch_start, 0)
+        while step is not None and step < epoch_stop:
+            epoch_step = step - epoch_start
+            loop_state = LoopState(
+                epoch=epoch_start // dl_len,
+                global_step=step,
+                epoch_step=epoch_step,
+                epoch_end=epoch_step == dl_len - 1,
+                training_end=step == n_steps - 1,
+            )
+            # like `Event.should_trigger`, the trigger isn't evaluated if a step condition fired
+            if not column[step] and trigger(loop_state):
+                column[step] = True
+            step = trigger.next_step(step + 1, epoch_step + 1)
+
+
+def compile_schedule(
+    events: Optional[dict[Any, Event]],
+    dl_len: int,
+    max_epochs: Optional[int] = None,
+    max_steps: Optional[int] = None,
+) -> EventSchedule:
+    """
+    Compute which step-based events trigger on every step of a loop, without iterating over it.
+
+    Only events with nothing but step-based triggers (`every_n_steps`, `at_step`, or a `trigger`
+    without `when` conditions) are included: the steps on which time-based, custom condition
+    and metric-driven (`on_plateau`/`on_divergence`) events trigger can't be known ahead of time.
+    Triggers are only evaluated on the steps where they may fire.
+
+    Args:
+        events: Dictionary mapping event keys to Event instances
+        dl_len: Length of the dataloader
+        max_epochs: Maximum number of epochs
+        max_steps: Maximum number of steps
+
+    Returns:
+        EventSchedule: The schedule
+
+    Raises:
+        ValueError: If neither max_epochs nor max_steps is provided
+        ImportError: If numpy isn't installed
+    """
+    np = _import_numpy()
+
+    if max_steps is not None:
+        n_steps = max_steps
+        if max_epochs is not None:
+            n_steps = min(n_steps, max_epochs * dl_len)
+    elif max_epochs is not None:
+        n_steps = max_epochs * dl_len
+    else:
+        raise ValueError("The schedule of a loop is only known if max_epochs or max_steps is set")
+
+    global_step = np.arange(n_steps)
+    epoch, epoch_step = np.divmod(global_step, dl_len)
+    epoch_end = epoch_step == dl_len - 1
+    training_end = np.zeros(n_steps, dtype=bool)
+    training_end[-1:] = True
+
+    static = {
+        key: event
+        for key, event in (events or {}).items()
+        if event._is_step_based
+        and not event._time_conditions
+        and not event._count_conditions
+        and not event._custom_condition
+        and not event._monitors
+        and (event._trigger is None or event._trigger._static)
+    }
+    triggered = np.zeros((n_steps, len(static)), dtype=bool)
+    for column, event in enumerate(static.values()):
+        if "every_n_steps" in event._step_conditions:
+            triggered[:, column] = (epoch_step + 1) % event._step_conditions["every_n_steps"] == 0
+        step = event._step_conditions.get("at_step")
+        if step is not None and 0 <= step < n_steps:
+            triggered[step, column] = True
+        if event._trigger is not None:
+            _fill_trigger_column(triggered[:, column], event._trigger, dl_len)
+
+    return EventSchedule(
+        keys=list(static),
+        events=triggered,
+        epoch=epoch,
+        epoch_step=epoch_step,
+        epoch_end=epoch_end,
+        training_end=training_end,
+    )
@@ -0,0 +1,408 @@
+import heapq
+import inspect
+from bisect import bisect_left
+from operator import itemgetter
+from typing import Any, Optional
+
+from .events import Event, LoopEvents
+from .types import LoopState
+
+# Rank of each time-based trigger kind. When several triggers of the same event are due on the
+# same step, the lowest rank is consumed first, mirroring the order of `Event.should_trigger`.
+_EVERY_N_SECONDS = 0
+_AT_TIME = 1
+
+_rank = itemgetter(1)
+
+# Maximum number of distinct event combinations interned by `triggered_events_interned`
+_MAX_INTERNED = 1024
+
+
+class EventScheduler:
+    """
+    Decide which events trigger on each step without polling every Event.
+
+    Step-based triggers (`every_n_steps`, `at_step`, `trigger`) are kept in a heap keyed by the
+    next global step at which they (may) fire, and time-based triggers (`every_n_seconds`,
+    `at_time`) in a heap keyed by their next deadline (in seconds since the loop started). Each
+    step therefore costs O(events firing), using the clock reading shared through
+    `LoopState.elapsed_seconds`. Count-based triggers (`every_n_samples`, `every_n_tokens`) are
+    kept in a heap per count, keyed by the count at which they trigger next. Only events with an
+    opaque `condition_function` are evaluated on every step; `Trigger`s are only evaluated on the
+    steps where they may fire.
+
+    The events fired on a step are tracked as a bitmask of event indices, so steps on which
+    nothing fires don't allocate.
+
+    The scheduler produces the same results as calling `Event.should_trigger` on every event, and
+    keeps the Event's time and count bookkeeping (`_last_triggered_time`, `_at_time_triggered`,
+    `_next_counts`) up to date.
+    """
+
+    def __init__(self, events: Optional[dict[Any, Event]] = None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            events: Dictionary mapping event keys to Event instances
+        """
+        events = events or {}
+        self._keys = list(events.keys())
+        self._events = list(events.values())
+
+        self._polled = [
+            (idx, event._custom_condition)
+            for idx, event in enumerate(self._events)
+            if event._custom_condition is not None
+        ]
+        self._step_indices = [idx for idx, event in enumerate(self._events) if event._is_step_based]
+        # period of the events whose only step-based condition is `every_n_steps`, so the steps
+        # they trigger on within a chunk are a range
+        self._periods = {
+            idx: event._step_conditions["every_n_steps"]
+            for idx, event in enumerate(self._events)
+            if set(event._step_conditions) == {"every_n_steps"} and event._trigger is None
+        }
+        self._bits = [1 << idx for idx in range(len(self._events))]
+
+        # frozensets of event keys (including the epoch and training end LoopEvents), by the
+        # bitmask of fired events shifted left by two, ORed with the epoch and training end flags
+        self._interned: dict[int, frozenset] = {
+            0: frozenset(),
+            1: frozenset([LoopEvents.EPOCH_END]),
+            2: frozenset([LoopEvents.TRAINING_END]),
+            3: frozenset([LoopEvents.EPOCH_END, LoopEvents.TRAINING_END]),
+        }
+
+        # heap of (global_step, event_idx), rebuilt whenever a new epoch starts
+        self._step_heap: list[tuple[int, int]] = []
+        self._epoch: Optional[int] = None
+
+        # heap of (deadline, rank, event_idx)
+        self._time_heap: list[tuple[float, int, int]] = []
+        for idx, event in enumerate(self._events):
+            if "every_n_seconds" in event._time_conditions:
+                deadline = event._last_triggered_time + event._time_conditions["every_n_seconds"]
+                self._time_heap.append((deadline, _EVERY_N_SECONDS, idx))
+            if "at_time" in event._time_conditions and not event._at_time_triggered:
+                deadline = event._time_conditions["at_time"]
+                self._time_heap.append((deadline, _AT_TIME, idx))
+        heapq.heapify(self._time_heap)
+
+        # heaps of (next count, event_idx), by LoopState attribute of the count
+        self._count_heaps: list[tuple[str, list[tuple[int, int]]]] = []
+        for attribute in ("n_samples", "n_tokens"):
+            count_heap = [
+                (event._next_counts[attribute], idx)
+                for idx, event in enumerate(self._events)
+                if attribute in event._count_conditions
+            ]
+            if count_heap:
+                heapq.heapify(count_heap)
+                self._count_heaps.append((attribute, count_heap))
+
+    def _rebuild_step_heap(self, epoch: int, global_step: int, epoch_step: int) -> None:
+        self._epoch = epoch
+        self._step_heap = []
+        for idx in self._step_indices:
+            next_step = self._events[idx]._next_trigger_step(global_step, epoch_step)
+            if next_step is not None:
+                self._step_heap.append((next_step, idx))
+        heapq.heapify(self._step_heap)
+
+    def triggered_events(self, loop_state: LoopState) -> set:
+        """
+        Compute the set of event keys triggered on the current step.
+
+        Must be called once per step, with non-decreasing global steps.
+
+        Args:
+            loop_state: Current LoopState instance
+
+        Returns:
+            set: Keys of the events that triggered
+        """
+        fired = 0
+        bits = self._bits
+        for idx, condition_function in self._polled:
+            if condition_function(loop_state):
+                fired |= bits[idx]
+
+        return self._keys_of(self._add_scheduled_events(loop_state, fired))
+
+    def triggered_events_interned(self, loop_state: LoopState) -> frozenset:
+        """
+        Like `triggered_events`, but also including `LoopEvents.EPOCH_END` and
+        `LoopEvents.TRAINING_END` when the step ends the epoch or the training, and returning the
+        same frozenset object every time the same combination of events triggers.
+
+        Args:
+            loop_state: Current LoopState instance
+
+        Returns:
+            frozenset: Keys of the events that triggered
+        """
+        fired = 0
+        bits = self._bits
+        for idx, condition_function in self._polled:
+            if condition_function(loop_state):
+                fired |= bits[idx]
+        fired = self._add_scheduled_events(loop_state, fired)
+        return self._interned_events(fired, loop_state.epoch_end, loop_state.training_end)
+
+    def _interned_events(self, fired: int, epoch_end: bool, training_end: bool) -> frozenset:
+        key = fired << 2 | epoch_end | training_end << 1
+        batch_events = self._interned.get(key)
+        if batch_events is None:
+            batch_events = frozenset(self._interned[key & 3] | self._keys_of(fired))
+            if len(self._interned) < _MAX_INTERNED:
+                self._interned[key] = batch_events
+        return batch_events
+
+    def triggered_events_chunk(self, chunk: Any) -> list:
+        """
+        Compute the events triggered on each batch of a chunk of consecutive steps of an epoch,
+        including `LoopEvents.EPOCH_END` and `LoopEvents.TRAINING_END`.
+
+        The heaps are consumed once per chunk, so steps on which nothing fires cost nothing, and
+        the steps an `every_n_steps` event triggers on are found without going through the heap
+        for each of them, and time-based events on the first batch whose elapsed time reaches
+        them. Only condition functions and `Trigger`s are evaluated on a `LoopState` of each
+        batch.
+
+        Must be called once per chunk, with non-decreasing global steps.
+
+        Args:
+            chunk: The `Chunk`, with its position arrays filled
+
+        Returns:
+            list: Keys of the events triggered on each batch, as interned frozensets (see
+            `triggered_events_interned`)
+        """
+        n = len(chunk)
+        # bitmask of the events fired on each batch on which any fired, by index in the chunk
+        fired: dict[int, int] = {}
+        if self._events:
+            bits = self._bits
+            if self._polled:
+                for i in range(n):
+                    loop_state = chunk.loop_state(i)
+                    for idx, condition_function in self._polled:
+                        if condition_function(loop_state):
+                            fired[i] = fired.get(i, 0) | bits[idx]
+            self._add_scheduled_chunk_events(chunk, fired)
+
+        interned = self._interned
+        batch_events = [interned[0]] * n
+        for i, fired_i in fired.items():
+            events = interned.get(fired_i << 2)
+            batch_events[i] = events if events is not None else self._interned_events(fired_i, 0, 0)
+
+        # the chunk may end the epoch or training on its last batch
+        last = n - 1
+        batch_events[last] = self._interned_events(
+            fired.get(last, 0), chunk.epoch_end[last], chunk.training_end[last]
+        )
+        return batch_events
+
+    def _add_scheduled_chunk_events(self, chunk: Any, fired: dict[int, int]) -> None:
+        # like `_add_scheduled_events`, for all the steps of the chunk at once
+        bits = self._bits
+        n = len(chunk)
+        global_step = chunk.global_step[0]
+        epoch_step = chunk.epoch_step[0]
+        if self._step_indices:
+            if chunk.epoch[0] != self._epoch:
+                self._rebuild_step_heap(chunk.epoch[0], global_step, epoch_step)
+
+            end = global_step + n
+            step_heap = self._step_heap
+            periods = self._periods
+            while step_heap and step_heap[0][0] < end:
+                step, idx = heapq.heappop(step_heap)
+                event = self._events[idx]
+                if step < global_step:
+                    # steps were skipped since the entry was pushed, search from the chunk's start
+                    next_step = event._next_trigger_step(global_step, epoch_step)
+                elif idx in periods:
+                    period = periods[idx]
+                    bit = bits[idx]
+                    for i in range(step - global_step, n, period):
+                        fired[i] = fired.get(i, 0) | bit
+                    next_step = step + (end - step + period - 1) // period * period
+                else:
+                    i = step - global_step
+                    if event._trigger is None or (
+                        not fired.get(i, 0) & bits[idx]
+                        and event._step_triggers(chunk.loop_state(i))
+                    ):
+                        fired[i] = fired.get(i, 0) | bits[idx]
+                    next_step = event._next_trigger_step(step + 1, epoch_step + i + 1)
+                if next_step is not None:
+                    heapq.heappush(step_heap, (next_step, idx))
+
+        time_heap = self._time_heap
+        if time_heap:
+            elapsed_seconds = chunk.elapsed_seconds
+            # the first batch on which a time condition is due
+            i = bisect_left(elapsed_seconds, time_heap[0][0])
+            while i < n:
+                current_time = elapsed_seconds[i]
+                due = []
+                while time_heap and time_heap[0][0] <= current_time:
+                    due.append(heapq.heappop(time_heap))
+                due.sort(key=_rank)
+
+                fired_i = fired.get(i, 0)
+                for entry in due:
+                    _, rank, idx = entry
+                    if fired_i & bits[idx]:
+                        # Event already triggered this step, the time condition stays pending
+                        heapq.heappush(time_heap, entry)
+                        continue
+
+                    fired_i |= bits[idx]
+                    event = self._events[idx]
+                    if rank == _EVERY_N_SECONDS:
+                        event._last_triggered_time = current_time
+                        deadline = current_time + event._time_conditions["every_n_seconds"]
+                        heapq.heappush(time_heap, (deadline, _EVERY_N_SECONDS, idx))
+                    else:
+                        event._at_time_triggered = True
+                if fired_i:
+                    fired[i] = fired_i
+
+                if not time_heap:
+                    break
+                i = bisect_left(elapsed_seconds, time_heap[0][0], i + 1)
+
+        for attribute, count_heap in self._count_heaps:
+            counts = getattr(chunk, attribute)
+            if count_heap[0][0] <= counts[n - 1]:
+                pending = []
+                while count_heap and count_heap[0][0] <= counts[n - 1]:
+                    entry = heapq.heappop(count_heap)
+                    next_count, idx = entry
+                    # the first step reaching the count on which the event didn't trigger yet
+                    i = bisect_left(counts, next_count)
+                    while i < n and fired.get(i, 0) & bits[idx]:
+                        i += 1
+                    if i == n:
+                        # the count condition stays pending until the next chunk
+                        pending.append(entry)
+                        continue
+
+                    fired[i] = fired.get(i, 0) | bits[idx]
+                    event = self._events[idx]
+                    every = event._count_conditions[attribute]
+                    next_count = (counts[i] // every + 1) * every
+                    event._next_counts[attribute] = next_count
+                    heapq.heappush(count_heap, (next_count, idx))
+                for entry in pending:
+                    heapq.heappush(count_heap, entry)
+
+    async def atriggered_events(self, loop_state: LoopState) -> set:
+        """
+        Like `triggered_events`, but awaits condition functions that return awaitables.
+
+        Args:
+            loop_state: Current LoopState instance
+
+        Returns:
+            set: Keys of the events that triggered
+        """
+        fired = 0
+        bits = self._bits
+        for idx, condition_function in self._polled:
+            result = condition_function(loop_state)
+            if inspect.isawaitable(result):
+                result = await result
+            if result:
+                fired |= bits[idx]
+
+        return self._keys_of(self._add_scheduled_events(loop_state, fired))
+
+    def _keys_of(self, fired: int) -> set:
+        keys = set()
+        while fired:
+            lowest = fired & -fired
+            keys.add(self._keys[lowest.bit_length() - 1])
+            fired ^= lowest
+        return keys
+
+    def _add_scheduled_events(self, loop_state: LoopState, fired: int) -> int:
+        bits = self._bits
+        if self._step_indices:
+            if loop_state.epoch != self._epoch:
+                self._rebuild_step_heap(
+                    loop_state.epoch, loop_state.global_step, loop_state.epoch_step
+                )
+
+            global_step = loop_state.global_step
+            step_heap = self._step_heap
+            while step_heap and step_heap[0][0] <= global_step:
+                step, idx = heapq.heappop(step_heap)
+                if step < global_step:
+                    # steps were skipped since the entry was pushed, search from the current one
+                    next_step = self._events[idx]._next_trigger_step(
+                        global_step, loop_state.epoch_step
+                    )
+                else:
+                    event = self._events[idx]
+                    # with a trigger, the step is only a candidate, unless a custom condition
+                    # already fired (`should_trigger` doesn't evaluate the rest then)
+                    if event._trigger is None or (
+                        not fired & bits[idx] and event._step_triggers(loop_state)
+                    ):
+                        fired |= bits[idx]
+                    next_step = event._next_trigger_step(global_step + 1, loop_state.epoch_step + 1)
+                if next_step is not None:
+                    heapq.heappush(step_heap, (next_step, idx))
+
+        time_heap = self._time_heap
+        if time_heap:
+            current_time = loop_state.elapsed_seconds
+            if time_heap[0][0] <= current_time:
+                due = []
+                while time_heap and time_heap[0][0] <= current_time:
+                    due.append(heapq.heappop(time_heap))
+                due.sort(key=_rank)
+
+                for entry in due:
+                    _, rank, idx = entry
+                    if fired & bits[idx]:
+                        # Event already triggered this step, the time condition stays pending
+                        heapq.heappush(time_heap, entry)
+                        continue
+
+                    fired |= bits[idx]
+                    event = self._events[idx]
+                    if rank == _EVERY_N_SECONDS:
+                        event._last_triggered_time = current_time
+                        deadline = current_time + event._time_conditions["every_n_seconds"]
+                        heapq.heappush(time_heap, (deadline, _EVERY_N_SECONDS, idx))
+                    else:
+                        event._at_time_triggered = True
+
+        for attribute, count_heap in self._count_heaps:
+            count = getattr(loop_state, attribute)
+            if count_heap[0][0] <= count:
+                pending = []
+                while count_heap and count_heap[0][0] <= count:
+                    entry = heapq.heappop(count_heap)
+                    idx = entry[1]
+                    if fired & bits[idx]:
+                        # Event already triggered this step, the count condition stays pending
+                        pending.append(entry)
+                        continue
+
+                    fired |= bits[idx]
+                    event = self._events[idx]
+                    n = event._count_conditions[attribute]
+                    next_count = (count // n + 1) * n
+                    event._next_counts[attribute] = next_count
+                    heapq.heappush(count_heap, (next_count, idx))
+                for entry in pending:
+                    heapq.heappush(count_heap, entry)
+
+        return fired
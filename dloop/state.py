@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+from typing import Any, Optional
+
+# Version of the state file format, bumped on incompatible changes
+STATE_VERSION = 1
+
+
+def event_key_id(event_key: Any) -> str:
+    """
+    Identifier of an event key in a state file.
+
+    Event keys can be strings or members of (custom) Enums, so they are stored as their string
+    representation (e.g. "Logging" or "CustomEvents.VALIDATION").
+    """
+    return event_key if isinstance(event_key, str) else str(event_key)
+
+
+def save_state(path: str, state: dict) -> None:
+    """
+    Atomically write `state` as JSON to `path`.
+
+    The state is written to a temporary file in the same directory, which then replaces `path`,
+    so readers (and a resumed loop) never see a partially written file.
+
+    Args:
+        path: Path of the state file
+        state: JSON-serializable state
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".dloop-state-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": STATE_VERSION, **state}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_state(path: str) -> Optional[dict]:
+    """
+    Read a state written with `save_state`.
+
+    Args:
+        path: Path of the state file
+
+    Returns:
+        Optional[dict]: The state, or None if the file doesn't exist
+
+    Raises:
+        ValueError: If the file was written with an incompatible state version
+    """
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    version = state.pop("version", None)
+    if version != STATE_VERSION:
+        raise ValueError(
+            f"Unsupported state file version in {path}: got {version}, expected {STATE_VERSION}"
+        )
+    return state
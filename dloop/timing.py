@@ -0,0 +1,89 @@
+from dataclasses import dataclass
+from typing import Optional
+
+DEFAULT_TIMING_WINDOW = 1000
+
+
+@dataclass
+class StepTimingStats:
+    """Statistics over the most recent steps of a loop. Times are in seconds."""
+
+    n_steps: int
+    steps_per_second: float
+    data_wait_p50: float
+    data_wait_p99: float
+    compute_p50: float
+    compute_p99: float
+    # fraction of the time spent waiting for data
+    data_starvation_ratio: float
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    # nearest-rank percentile
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class StepTimer:
+    """
+    Rolling record of how long each step spent waiting for data and in user code.
+
+    The data wait of a step is the time from requesting its batch until the batch (and its events)
+    is yielded, which is dominated by the dataloader's `__next__`. The compute time is the time
+    from yielding the batch until the next one is requested.
+
+    Recording costs two list stores per step; statistics are only computed when requested.
+    """
+
+    def __init__(self, window: int = DEFAULT_TIMING_WINDOW):
+        """
+        Initialize the timer.
+
+        Args:
+            window: Number of most recent steps the statistics are computed over
+        """
+        if window < 1:
+            raise ValueError(f"window must be >= 1, got {window=}")
+
+        self.window = window
+        self._data_wait = [0.0] * window
+        self._compute = [0.0] * window
+        self._n_recorded = 0
+
+    def record(self, data_wait: float, compute: float) -> None:
+        """
+        Record the timings of a step.
+
+        Args:
+            data_wait: Seconds spent waiting for the batch
+            compute: Seconds spent processing the batch
+        """
+        i = self._n_recorded % self.window
+        self._data_wait[i] = data_wait
+        self._compute[i] = compute
+        self._n_recorded += 1
+
+    def stats(self) -> Optional[StepTimingStats]:
+        """
+        Compute statistics over the most recent steps.
+
+        Returns:
+            Optional[StepTimingStats]: The statistics, or None if no step was recorded yet
+        """
+        n = min(self._n_recorded, self.window)
+        if n == 0:
+            return None
+
+        data_wait = sorted(self._data_wait[:n])
+        compute = sorted(self._compute[:n])
+        total_data_wait = sum(data_wait)
+        total = total_data_wait + sum(compute)
+
+        return StepTimingStats(
+            n_steps=n,
+            steps_per_second=n / total if total > 0 else float("inf"),
+            data_wait_p50=_percentile(data_wait, 0.5),
+            data_wait_p99=_percentile(data_wait, 0.99),
+            compute_p50=_percentile(compute, 0.5),
+            compute_p99=_percentile(compute, 0.99),
+            data_starvation_ratio=total_data_wait / total if total > 0 else 0.0,
+        )
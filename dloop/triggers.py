@@ -0,0 +1,396 @@
+import inspect
+from typing import Callable, Optional
+
+from .types import ConditionFunction, LoopState
+
+# Maximum number of candidate steps tried when searching for the next step on which a combination
+# of triggers fires. If the search doesn't settle, the step reached is returned as a lower bound,
+# and the trigger is evaluated on it.
+_MAX_SEARCH = 64
+
+
+def _min_step(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+def _search(
+    first: Callable[[int, int], Optional[int]],
+    second: Callable[[int, int], Optional[int]],
+    global_step: int,
+    epoch_step: int,
+) -> Optional[int]:
+    # earliest step on which both `first` and `second` may hold, alternating between them until
+    # they agree
+    step = global_step
+    for _ in range(_MAX_SEARCH):
+        a = first(step, epoch_step + step - global_step)
+        if a is None:
+            return None
+        b = second(a, epoch_step + a - global_step)
+        if b is None or b == a:
+            return b
+        step = b
+    return step
+
+
+class Trigger:
+    """
+    Step-based condition of an Event, composable with `&`, `|` and `~`.
+
+    Triggers are built with `every`, `at`, `after` and `when`, and combined into a single
+    predicate. Unlike a `condition_function`, they can tell ahead of time on which step they may
+    fire next, so the loop only evaluates them on those steps:
+
+    Example:
+        ```python
+        events = {
+            # every 100 steps, once step 5000 is reached
+            "Logging": Event(trigger=every(100) & after(5000)),
+            # every 1000 steps since the start of training, 3 times at most
+            "Eval": Event(trigger=every(1000, per_epoch=False).limit(3)),
+        }
+        ```
+
+    Subclasses implement `_compile`, returning the predicate, and `next_step`/`next_quiet_step`,
+    returning lower bounds of the next step on which the trigger fires or doesn't fire.
+    """
+
+    # whether the trigger only depends on the position of the step (and not on e.g. elapsed time)
+    _static = True
+
+    def __init__(self):
+        self._predicate: Optional[ConditionFunction] = None
+
+    def __call__(self, loop_state: LoopState) -> bool:
+        predicate = self._predicate
+        if predicate is None:
+            predicate = self._predicate = self._compile()
+        return predicate(loop_state)
+
+    def __getstate__(self) -> dict:
+        # the compiled predicate closes over the trigger, copies compile their own
+        return {**self.__dict__, "_predicate": None}
+
+    def _compile(self) -> ConditionFunction:
+        raise NotImplementedError
+
+    def next_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        """
+        Lower bound of the earliest global step >= `global_step` on which the trigger fires.
+
+        The result assumes the current epoch doesn't end before then.
+
+        Args:
+            global_step: Global step to start searching from
+            epoch_step: Epoch step corresponding to `global_step`
+
+        Returns:
+            Optional[int]: The global step, or None if the trigger won't fire again in the epoch
+        """
+        raise NotImplementedError
+
+    def next_quiet_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        """
+        Lower bound of the earliest global step >= `global_step` on which the trigger doesn't
+        fire. Used to find when its negation fires.
+
+        Args:
+            global_step: Global step to start searching from
+            epoch_step: Epoch step corresponding to `global_step`
+
+        Returns:
+            Optional[int]: The global step, or None if the trigger fires on every step of the
+            epoch from now on
+        """
+        raise NotImplementedError
+
+    def __and__(self, other: "Trigger") -> "Trigger":
+        return _And(self, other)
+
+    def __or__(self, other: "Trigger") -> "Trigger":
+        return _Or(self, other)
+
+    def __invert__(self) -> "Trigger":
+        return _Not(self)
+
+    def limit(self, n: int) -> "Trigger":
+        """
+        Fire only the first `n` times the trigger fires.
+
+        The count is part of the loop state, so it's kept when resuming. Since the count applies
+        to the whole trigger, the limited trigger can't be combined any further.
+
+        Args:
+            n: Maximum number of times the trigger fires
+
+        Returns:
+            Trigger: The limited trigger
+        """
+        return _Limit(self, n)
+
+    def _get_state(self) -> Optional[dict]:
+        return None
+
+    def _set_state(self, state: dict) -> None:
+        pass
+
+
+class _Every(Trigger):
+    def __init__(self, n_steps: int, offset: int, per_epoch: bool):
+        if n_steps < 1:
+            raise ValueError(f"n_steps must be >= 1, got {n_steps=}")
+        if offset < 0:
+            raise ValueError(f"offset must be >= 0, got {offset=}")
+        super().__init__()
+        self.n_steps = n_steps
+        self.offset = offset
+        self.per_epoch = per_epoch
+
+    def _compile(self) -> ConditionFunction:
+        n_steps, offset = self.n_steps, self.offset
+        if self.per_epoch:
+            return lambda s: s.epoch_step >= offset and (s.epoch_step - offset + 1) % n_steps == 0
+        return lambda s: s.global_step >= offset and (s.global_step - offset + 1) % n_steps == 0
+
+    def _fires_on(self, step: int) -> bool:
+        return step >= self.offset and (step - self.offset + 1) % self.n_steps == 0
+
+    def next_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        step = epoch_step if self.per_epoch else global_step
+        first = max(step, self.offset)
+        first += (-(first - self.offset + 1)) % self.n_steps
+        return global_step + first - step
+
+    def next_quiet_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        step = epoch_step if self.per_epoch else global_step
+        if not self._fires_on(step):
+            return global_step
+        if self.n_steps == 1:
+            return None  # fires on every step from the offset on
+        return global_step + 1
+
+
+class _At(Trigger):
+    def __init__(self, step: int):
+        super().__init__()
+        self.step = step
+
+    def _compile(self) -> ConditionFunction:
+        step = self.step
+        return lambda s: s.global_step == step
+
+    def next_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        return self.step if self.step >= global_step else None
+
+    def next_quiet_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        return global_step + 1 if global_step == self.step else global_step
+
+
+class _After(Trigger):
+    def __init__(self, step: int):
+        super().__init__()
+        self.step = step
+
+    def _compile(self) -> ConditionFunction:
+        step = self.step
+        return lambda s: s.global_step >= step
+
+    def next_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        return max(global_step, self.step)
+
+    def next_quiet_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        return global_step if global_step < self.step else None
+
+
+class _When(Trigger):
+    _static = False
+
+    def __init__(self, condition_function: ConditionFunction):
+        super().__init__()
+        self.condition_function = condition_function
+
+    def _compile(self) -> ConditionFunction:
+        return self.condition_function
+
+    # opaque: it may fire (or not) on any step
+    def next_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        return global_step
+
+    def next_quiet_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        return global_step
+
+
+class _Combinator(Trigger):
+    def __init__(self, *triggers: Trigger):
+        for trigger in triggers:
+            if not isinstance(trigger, Trigger):
+                raise TypeError(f"Can only combine Triggers, got {trigger!r}")
+            if isinstance(trigger, _Limit):
+                raise TypeError("A limited trigger can't be combined, apply `limit` last")
+        super().__init__()
+        self.triggers = triggers
+        self._static = all(trigger._static for trigger in triggers)
+
+
+class _And(_Combinator):
+    def _compile(self) -> ConditionFunction:
+        a, b = self.triggers
+        return lambda s: a(s) and b(s)
+
+    def next_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        a, b = self.triggers
+        return _search(a.next_step, b.next_step, global_step, epoch_step)
+
+    def next_quiet_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        a, b = self.triggers
+        return _min_step(
+            a.next_quiet_step(global_step, epoch_step), b.next_quiet_step(global_step, epoch_step)
+        )
+
+
+class _Or(_Combinator):
+    def _compile(self) -> ConditionFunction:
+        a, b = self.triggers
+        return lambda s: a(s) or b(s)
+
+    def next_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        a, b = self.triggers
+        return _min_step(a.next_step(global_step, epoch_step), b.next_step(global_step, epoch_step))
+
+    def next_quiet_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        a, b = self.triggers
+        return _search(a.next_quiet_step, b.next_quiet_step, global_step, epoch_step)
+
+
+class _Not(_Combinator):
+    def _compile(self) -> ConditionFunction:
+        (a,) = self.triggers
+        return lambda s: not a(s)
+
+    def next_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        return self.triggers[0].next_quiet_step(global_step, epoch_step)
+
+    def next_quiet_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        return self.triggers[0].next_step(global_step, epoch_step)
+
+
+class _Limit(Trigger):
+    def __init__(self, trigger: Trigger, n: int):
+        if n < 0:
+            raise ValueError(f"n must be >= 0, got {n=}")
+        if isinstance(trigger, _Limit):
+            trigger, n = trigger.trigger, min(n, trigger.n)
+        super().__init__()
+        self.trigger = trigger
+        self.n = n
+        self._static = trigger._static
+
+        self._count = 0
+        # global step of the last time the trigger fired. When a step is repeated (e.g. after
+        # resuming), it fires again without being counted twice
+        self._last_fired_step: Optional[int] = None
+
+    def _compile(self) -> ConditionFunction:
+        trigger = self.trigger
+
+        def predicate(loop_state: LoopState) -> bool:
+            if loop_state.global_step == self._last_fired_step:
+                return True
+            if self._count >= self.n or not trigger(loop_state):
+                return False
+            self._count += 1
+            self._last_fired_step = loop_state.global_step
+            return True
+
+        return predicate
+
+    def next_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        if self._last_fired_step is not None and self._last_fired_step >= global_step:
+            return self._last_fired_step
+        if self._count >= self.n:
+            return None
+        return self.trigger.next_step(global_step, epoch_step)
+
+    def next_quiet_step(self, global_step: int, epoch_step: int) -> Optional[int]:
+        return global_step
+
+    def _get_state(self) -> Optional[dict]:
+        return {"count": self._count, "last_fired_step": self._last_fired_step}
+
+    def _set_state(self, state: dict) -> None:
+        self._count = state["count"]
+        self._last_fired_step = state["last_fired_step"]
+
+
+def every(n_steps: int, offset: int = 0, per_epoch: bool = True) -> Trigger:
+    """
+    Trigger every `n_steps` steps, on steps `offset + n_steps - 1`, `offset + 2 * n_steps - 1`...
+
+    Args:
+        n_steps: Period in steps
+        offset: Number of steps before the first period starts
+        per_epoch: If True, steps are counted from the start of each epoch (like
+            `Event(every_n_steps=...)`), otherwise from the start of training
+
+    Returns:
+        Trigger: The trigger
+    """
+    return _Every(n_steps, offset, per_epoch)
+
+
+def at(step: int) -> Trigger:
+    """
+    Trigger once, at a global step.
+
+    Args:
+        step: The global step
+
+    Returns:
+        Trigger: The trigger
+    """
+    return _At(step)
+
+
+def after(step: int) -> Trigger:
+    """
+    Trigger on every step from a global step on. Meant to be combined, e.g.
+    `every(100) & after(5000)`.
+
+    Args:
+        step: First global step on which the trigger fires
+
+    Returns:
+        Trigger: The trigger
+    """
+    return _After(step)
+
+
+def when(condition_function: ConditionFunction) -> Trigger:
+    """
+    Trigger on the steps where an arbitrary condition holds. The condition is opaque, so it's
+    evaluated on every step where the rest of the combination may fire.
+
+    The condition must be synchronous, since combinations compile into a single predicate. With
+    an `AsyncLoop`, pass coroutine functions as the `condition_function` of the Event instead.
+
+    Args:
+        condition_function: Function taking the LoopState and returning whether to fire
+
+    Returns:
+        Trigger: The trigger
+
+    Raises:
+        TypeError: If the condition is a coroutine function
+    """
+    if inspect.iscoroutinefunction(condition_function) or inspect.iscoroutinefunction(
+        getattr(condition_function, "__call__", None)
+    ):
+        raise TypeError(
+            "when() needs a synchronous condition, pass coroutine functions as the "
+            "condition_function of the Event"
+        )
+    return _When(condition_function)
@@ -1,8 +1,8 @@
 from dataclasses import dataclass
-from typing import Callable
+from typing import Callable, Optional
 
 
-# Type definition for the loop state
+# Type definition for the loop state, created once per step
 @dataclass
 class LoopState:
     epoch: int
@@ -10,8 +10,35 @@ class LoopState:
     epoch_step: int
     epoch_end: bool
     training_end: bool
+    # seconds of training since the loop started, read once per step. Excludes the time the loop
+    # was paused
+    elapsed_seconds: float = 0.0
+    # predicted seconds until training ends, only set when the loop plans its time budget
+    eta_seconds: Optional[float] = None
+    # samples and tokens seen since the loop started, including this step's batch. Only counted
+    # if the loop has a `batch_size_fn`/`token_count_fn`
+    n_samples: int = 0
+    n_tokens: int = 0
+    # seconds the loop was paused before this step. Only set once the loop has been paused
+    paused_seconds: float = 0.0
+
+    @property
+    def wall_seconds(self) -> float:
+        """Seconds since the loop started, including the time the loop was paused."""
+        return self.elapsed_seconds + self.paused_seconds
 
 
 # Type definition for condition functions
 # A function that takes a LoopState and returns a boolean
 ConditionFunction = Callable[[LoopState], bool]
+
+
+# Position from which a loop starts iterating, used to resume an interrupted loop
+@dataclass
+class LoopPosition:
+    epoch: int = 0
+    global_step: int = 0
+    epoch_step: int = 0
+    elapsed_seconds: float = 0.0
+    n_samples: int = 0
+    n_tokens: int = 0
@@ -0,0 +1,74 @@
+import collections.abc
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from typing import Any
+
+
+def _iter_from_index(dl: Any, start: int) -> Iterator:
+    index = start
+    while True:
+        try:
+            item = dl[index]
+        except IndexError:
+            return
+        yield item
+        index += 1
+
+
+def _can_seek(dl: Any) -> bool:
+    # whether `seek` skips batches of `dl` without loading them
+    return (
+        hasattr(dl, "skip")
+        or isinstance(dl, collections.abc.Sequence)
+        or (hasattr(dl, "__getitem__") and not hasattr(dl, "__iter__"))
+    )
+
+
+def seek(dl: Iterable, n: int) -> Iterable:
+    """
+    Iterable over the batches of `dl` from the n-th on, loading as few skipped batches as possible.
+
+    The dataloader is checked, in order, for:
+    - a `skip(n)` method returning an iterable that starts n batches in (e.g. HF datasets)
+    - index-based access, for sequences and for objects that are iterated through `__getitem__`
+    and otherwise the first n batches are loaded and discarded.
+
+    Args:
+        dl: The dataloader
+        n: Number of batches to skip
+
+    Returns:
+        Iterable yielding the remaining batches
+    """
+    if n == 0:
+        return dl
+
+    if hasattr(dl, "skip"):
+        return dl.skip(n)
+
+    if _can_seek(dl):
+        # iterating these is equivalent to indexing from 0
+        return _iter_from_index(dl, n)
+
+    return islice(dl, n, None)
+
+
+def iter_epoch(dl: Iterable, epoch: int, epoch_step: int = 0) -> Iterator:
+    """
+    Start iterating over an epoch of `dl`, from `epoch_step` on.
+
+    If the dataloader has a `set_epoch(epoch)` method (as samplers that shuffle differently on
+    each epoch do), it's called first, so that a resumed epoch sees the same batches.
+
+    Args:
+        dl: The dataloader
+        epoch: The epoch about to start
+        epoch_step: Number of batches of the epoch to skip (see `seek`)
+
+    Returns:
+        Iterator over the batches of the epoch
+    """
+    if hasattr(dl, "set_epoch"):
+        dl.set_epoch(epoch)
+
+    return iter(seek(dl, epoch_step))
@@ -0,0 +1,184 @@
+import asyncio
+from dataclasses import asdict
+from enum import Enum, auto, unique
+
+import pytest
+
+from dloop import AsyncLoop, Event, Loop, LoopEvents, every, when
+from dloop.async_iter_logic import aiter_dl_known_length, aiter_dl_unknown_length
+from dloop.iter_logic import iter_dl_known_length, iter_dl_unknown_length_with_pairwise_load
+from dloop.types import LoopPosition
+
+
+def state_dict(loop_state):
+    """LoopState as a dict, without the elapsed time which depends on the run"""
+    d = asdict(loop_state)
+    d.pop("elapsed_seconds")
+    return d
+
+
+class AsyncMockDataLoader:
+    def __init__(self, data, sleep_time: float = 0.0) -> None:
+        self.data = data
+        self.sleep_time = sleep_time
+
+    async def __aiter__(self):
+        for item in self.data:
+            await asyncio.sleep(self.sleep_time)
+            yield item
+
+
+async def collect(aiterable):
+    return [item async for item in aiterable]
+
+
+STOP_KWARGS = [{"max_epochs": 2}, {"max_steps": 6}, {"max_steps": 8}, {"max_steps": 3}]
+
+
+@pytest.mark.parametrize("kwargs", STOP_KWARGS)
+def test_aiter_dl_matches_sync(kwargs):
+    data = list(range(4))
+    dl = AsyncMockDataLoader(data)
+
+    expected = [(b, state_dict(s)) for b, s in iter_dl_known_length(data, dl_len=4, **kwargs)]
+    got = asyncio.run(collect(aiter_dl_known_length(dl, dl_len=4, **kwargs)))
+    assert [(b, state_dict(s)) for b, s in got] == expected
+
+    expected = [
+        (b, state_dict(s)) for b, s in iter_dl_unknown_length_with_pairwise_load(data, **kwargs)
+    ]
+    got = asyncio.run(collect(aiter_dl_unknown_length(dl, **kwargs)))
+    assert [(b, state_dict(s)) for b, s in got] == expected
+
+
+@pytest.mark.parametrize("resume_from", [LoopPosition(0, 2, 2), LoopPosition(1, 5, 1)])
+def test_aiter_dl_resume_matches_sync(resume_from):
+    data = list(range(4))
+    dl = AsyncMockDataLoader(data)
+    kwargs = {"max_epochs": 3, "resume_from": resume_from}
+
+    expected = [(b, state_dict(s)) for b, s in iter_dl_known_length(data, dl_len=4, **kwargs)]
+    got = asyncio.run(collect(aiter_dl_known_length(dl, dl_len=4, **kwargs)))
+    assert [(b, state_dict(s)) for b, s in got] == expected
+
+    expected = [
+        (b, state_dict(s)) for b, s in iter_dl_unknown_length_with_pairwise_load(data, **kwargs)
+    ]
+    got = asyncio.run(collect(aiter_dl_unknown_length(dl, **kwargs)))
+    assert [(b, state_dict(s)) for b, s in got] == expected
+
+
+@pytest.mark.parametrize("dl_len", [4, None])
+def test_async_loop_empty_dataloader(dl_len):
+    # stops on the empty epoch rather than waiting for max_seconds
+    loop = AsyncLoop(AsyncMockDataLoader([]), max_seconds=60, dataloader_len=dl_len)
+    assert asyncio.run(asyncio.wait_for(collect(loop), timeout=5)) == []
+
+
+@pytest.mark.parametrize("dl_len", [4, None])
+def test_async_loop_custom_events(dl_len):
+    @unique
+    class CustomEvents(Enum):
+        Every2 = auto()
+        CustomAt3 = auto()
+        AsyncAt5 = auto()
+
+    async def at_5(loop_state):
+        await asyncio.sleep(0)
+        return loop_state.global_step == 5
+
+    def make_events():
+        return {
+            CustomEvents.Every2: Event(every_n_steps=2),
+            CustomEvents.CustomAt3: Event(lambda loop_state: loop_state.global_step == 3),
+            CustomEvents.AsyncAt5: Event(at_5),
+        }
+
+    loop = AsyncLoop(
+        AsyncMockDataLoader(range(4)), max_epochs=2, dataloader_len=dl_len, events=make_events()
+    )
+
+    assert asyncio.run(collect(loop)) == [
+        (0, set()),
+        (1, {CustomEvents.Every2}),
+        (2, set()),
+        (3, {LoopEvents.EPOCH_END, CustomEvents.Every2, CustomEvents.CustomAt3}),
+        (0, set()),
+        (1, {CustomEvents.Every2, CustomEvents.AsyncAt5}),
+        (2, set()),
+        (3, {LoopEvents.EPOCH_END, LoopEvents.TRAINING_END, CustomEvents.Every2}),
+    ]
+
+
+def test_async_loop_when_trigger():
+    async def at_2(loop_state):
+        return loop_state.global_step == 2
+
+    # a combined predicate can't await the condition
+    with pytest.raises(TypeError, match="synchronous"):
+        when(at_2)
+
+    events = {"Every2AfterStep2": Event(trigger=every(2) & when(lambda s: s.global_step >= 2))}
+    loop = AsyncLoop(AsyncMockDataLoader(range(6)), max_epochs=1, events=events)
+    results = asyncio.run(collect(loop))
+    assert [batch for batch, events in results if "Every2AfterStep2" in events] == [3, 5]
+
+
+def test_async_loop_overlaps_fetching():
+    """Fetching the next batch happens while the current one is being processed."""
+
+    async def run():
+        loop = AsyncLoop(AsyncMockDataLoader(range(5), sleep_time=0.05), max_epochs=1)
+        start = asyncio.get_running_loop().time()
+        async with loop:
+            async for _batch, _events in loop:
+                await asyncio.sleep(0.05)  # "compute"
+        return asyncio.get_running_loop().time() - start
+
+    # sequential fetching + compute would take at least 0.5s
+    assert asyncio.run(run()) < 0.45
+
+
+def test_async_loop_exception():
+    class FailingDataLoader:
+        async def __aiter__(self):
+            yield 0
+            raise OSError("transient read error")
+
+    async def run():
+        seen = []
+        async with AsyncLoop(FailingDataLoader(), max_epochs=1) as loop:
+            async for batch, _events in loop:
+                seen.append(batch)
+        return seen
+
+    with pytest.raises(OSError, match="transient read error"):
+        asyncio.run(run())
+
+
+def test_async_loop_break():
+    """Breaking out of the loop inside the context manager stops the background fetching."""
+
+    async def run():
+        async with AsyncLoop(AsyncMockDataLoader(range(100)), max_epochs=1) as loop:
+            async for batch, _events in loop:
+                if batch == 3:
+                    break
+        # nothing left running but the current task
+        return len(asyncio.all_tasks())
+
+    assert asyncio.run(run()) == 1
+
+
+def test_async_loop_no_stopping_condition():
+    with pytest.raises(ValueError, match="stopping condition"):
+        AsyncLoop(AsyncMockDataLoader([1, 2, 3]))
+
+    # sanity check that the sync Loop agrees
+    with pytest.raises(ValueError, match="stopping condition"):
+        Loop([1, 2, 3])
+
+
+def test_async_loop_state_file(tmp_path):
+    with pytest.raises(ValueError, match="state_file"):
+        AsyncLoop(AsyncMockDataLoader([1, 2, 3]), max_epochs=1, state_file=str(tmp_path / "s"))
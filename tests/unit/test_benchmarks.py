@@ -0,0 +1,131 @@
+import json
+
+from benchmarks.__main__ import main
+from benchmarks.cases import Case, all_cases, make_dataloader, make_events
+from benchmarks.runner import blocks_per_step, compare
+
+
+def test_all_cases():
+    cases = all_cases()
+    names = [case.name for case in cases]
+    assert len(names) == len(set(names))
+    # 3 dataloaders x 2 length paths x (no events + 3 event kinds x 3 counts, and chunked: no
+    # events + 3 event kinds)
+    assert len(cases) == 3 * 2 * (10 + 4)
+
+
+def test_make_dataloader():
+    for kind in ["list", "generator", "slow"]:
+        assert list(make_dataloader(kind, 5)) == [0, 1, 2, 3, 4]
+
+
+def test_make_events():
+    for kind in ["step", "time", "condition"]:
+        assert len(make_events(kind, 10)) == 10
+
+
+def test_compare():
+    baseline = {"results": {"a": {"loop_ns_per_step": 100}, "b": {"loop_ns_per_step": 100}}}
+    results = {
+        "results": {
+            "a": {"loop_ns_per_step": 120},
+            "b": {"loop_ns_per_step": 130},
+            "c": {"loop_ns_per_step": 1000},
+        }
+    }
+    assert compare(results, baseline, tolerance=0.25) == ["b"]
+
+
+def test_compare_noise():
+    baseline = {"results": {"a": {"loop_ns_per_step": 1000, "loop_noise": 0.02}}}
+    results = {"results": {"a": {"loop_ns_per_step": 1200, "loop_noise": 0.1}}}
+    # the noise measured for the case raises its tolerance to 30%
+    assert compare(results, baseline, tolerance=0.1) == []
+    results["results"]["a"]["loop_ns_per_step"] = 1400
+    assert compare(results, baseline, tolerance=0.1) == ["a"]
+
+
+def test_compare_relative_loop():
+    # the machine got slower, but so did the reference loop
+    baseline = {"results": {"a": {"loop_ns_per_step": 1000, "relative_loop": 10}}}
+    results = {"results": {"a": {"loop_ns_per_step": 1600, "relative_loop": 11}}}
+    assert compare(results, baseline) == []
+    results["results"]["a"]["relative_loop"] = 13
+    assert compare(results, baseline) == ["a"]
+
+
+def test_compare_min_regression():
+    # a few ns/step on a fast case are noise, whatever the relative slowdown
+    baseline = {"results": {"a": {"loop_ns_per_step": 40}}}
+    results = {"results": {"a": {"loop_ns_per_step": 60}}}
+    assert compare(results, baseline) == []
+    results["results"]["a"]["loop_ns_per_step"] = 80
+    assert compare(results, baseline) == ["a"]
+
+
+def test_compare_blocks_per_step():
+    baseline = {"results": {"a": {"loop_ns_per_step": 100, "blocks_per_step": 3.4}}}
+    results = {"results": {"a": {"loop_ns_per_step": 100, "blocks_per_step": 4.4}}}
+    assert compare(results, baseline) == ["a"]
+
+    results["results"]["a"]["blocks_per_step"] = 3.5
+    assert compare(results, baseline) == []
+
+
+def test_main(tmp_path, capsys):
+    output = tmp_path / "results.json"
+    baseline = tmp_path / "baseline.json"
+    args = ["--steps", "10", "--repeat", "1", "--filter", "list/known_length/"]
+    args += ["--output", str(output), "--baseline", str(baseline)]
+
+    assert main([*args, "--update-baseline"]) == 0
+    results = json.loads(output.read_text())
+    assert json.loads(baseline.read_text()) == results
+
+    case = Case("list", True, "step", 10)
+    assert case.name in results["results"]
+    assert set(results["results"][case.name]) == {
+        "raw_ns_per_step",
+        "loop_ns_per_step",
+        "overhead_ns_per_step",
+        "relative_loop",
+        "loop_noise",
+        "blocks_per_step",
+        "low_allocation_blocks_per_step",
+    }
+
+    # a large tolerance makes the comparison robust to noise
+    assert main([*args, "--tolerance", "100"]) == 0
+    assert case.name in capsys.readouterr().out
+
+
+def test_main_measures_regressions_again(tmp_path, capsys):
+    baseline = tmp_path / "baseline.json"
+    args = ["--steps", "10", "--repeat", "1", "--filter", "list/known_length/10_step_events"]
+    args += ["--output", str(tmp_path / "results.json"), "--baseline", str(baseline)]
+    assert main([*args, "--update-baseline"]) == 0
+
+    # an impossibly fast baseline: the cases are slower in both measurements
+    recorded = json.loads(baseline.read_text())
+    for result in recorded["results"].values():
+        result["relative_loop"] = 0
+    baseline.write_text(json.dumps(recorded))
+    assert main(args) == 1
+    captured = capsys.readouterr()
+    assert "again" in captured.out
+    assert "REGRESSION: list/known_length/10_step_events" in captured.err
+
+
+def test_chunked_blocks_per_step():
+    # chunks allocate per chunk rather than per step
+    case = Case("list", True, "step", 10)
+    chunked = Case("list", True, "step", 10, chunk_size=16)
+    assert chunked.name == "list/known_length/10_step_events/chunk_16"
+    assert blocks_per_step(chunked, low_allocation=False) < blocks_per_step(
+        case, low_allocation=False
+    )
+
+
+def test_low_allocation_blocks_per_step():
+    case = Case("list", True, "step", 10)
+    assert blocks_per_step(case, low_allocation=True) < blocks_per_step(case, low_allocation=False)
@@ -0,0 +1,171 @@
+import copy
+import json
+
+import pytest
+
+from dloop.budget import BudgetPlanner
+from dloop.clock import VirtualClock
+from dloop.events import Event, LoopEvents
+from dloop.loop import Loop
+from dloop.types import LoopState
+
+
+class MockDataLoader:
+    def __init__(self, n):
+        self.n = n
+
+    def __iter__(self):
+        return iter(range(self.n))
+
+
+def test_budget_planner_eval_cost():
+    """The time spent on the boundary step itself (e.g. an eval) counts towards the prediction."""
+    planner = BudgetPlanner(max_seconds=100, boundaries=["Eval"])
+
+    # a step every second, an eval every 15 steps taking 5 extra seconds
+    now, ended_at = 0.0, None
+    for step in range(200):
+        events = {"Eval"} if step % 15 == 14 else set()
+        loop_state = LoopState(
+            epoch=0,
+            global_step=step,
+            epoch_step=step,
+            epoch_end=False,
+            training_end=False,
+            elapsed_seconds=now,
+        )
+        if planner.update(loop_state, events):
+            ended_at = now
+            break
+        now += 6 if events else 1
+
+    # evals start at 14, 34, 54, 74 and 94 seconds: the one at 114 wouldn't end before 100
+    assert ended_at == 94
+    assert loop_state.eta_seconds == 0.0
+
+
+def test_budget_planner_eta():
+    planner = BudgetPlanner(max_seconds=35, boundaries=[LoopEvents.EPOCH_END])
+    etas = []
+    for step in range(20):
+        loop_state = LoopState(
+            epoch=step // 10,
+            global_step=step,
+            epoch_step=step % 10,
+            epoch_end=step % 10 == 9,
+            training_end=False,
+            elapsed_seconds=step + 1.0,
+        )
+        planner.update(loop_state, {LoopEvents.EPOCH_END} if loop_state.epoch_end else set())
+        etas.append(loop_state.eta_seconds)
+
+    # until an epoch ends, the budget is all there is to go by
+    assert etas[0] == 34
+    # then the end of the third epoch, 30 seconds in, is the last boundary that fits
+    assert etas[9] == 20
+    # including the time the step ending the epoch takes
+    assert etas[15] == pytest.approx(15)
+
+
+def test_budget_planner_state():
+    def update(planner, step):
+        loop_state = LoopState(
+            epoch=0,
+            global_step=step,
+            epoch_step=step,
+            epoch_end=False,
+            training_end=False,
+            elapsed_seconds=step + 1.0,
+        )
+        planner.update(loop_state, {"Eval"} if step % 5 == 4 else set())
+        planner._mark_done()
+        return loop_state.eta_seconds
+
+    planner = BudgetPlanner(max_seconds=100, boundaries=["Eval"])
+    for step in range(12):
+        update(planner, step)
+
+    # a step in progress isn't part of the state, as it's repeated when resuming
+    state = json.loads(json.dumps(planner._get_state()))
+    reference = copy.deepcopy(planner)
+    planner.update(LoopState(0, 12, 12, False, False, elapsed_seconds=13.0), set())
+    planner.update(LoopState(0, 13, 13, False, False, elapsed_seconds=14.0), {"Eval"})
+    assert planner._get_state(steps_done=False) == state
+    assert planner._get_state() != state
+
+    restored = BudgetPlanner(max_seconds=100, boundaries=["Eval"], start=12.0)
+    restored._set_state(state)
+    assert [update(restored, step) for step in range(12, 30)] == [
+        update(reference, step) for step in range(12, 30)
+    ]
+
+
+@pytest.mark.parametrize("dl_len", [10, None])
+def test_loop_budget_boundaries(dl_len):
+    def run(**kwargs):
+        loop = Loop(
+            MockDataLoader(10),
+            dataloader_len=dl_len,
+            max_seconds=25,
+            clock=VirtualClock(tick=1),
+            **kwargs,
+        )
+        return list(loop)
+
+    # without planning, the loop stops 25 seconds in, in the middle of the third epoch
+    assert len(run()) == 25
+
+    # the third epoch wouldn't end in time, so the loop ends with the second one
+    results = run(budget_boundaries=[LoopEvents.EPOCH_END])
+    assert len(results) == 20
+    assert LoopEvents.TRAINING_END in results[-1][1]
+    assert LoopEvents.EPOCH_END in results[-1][1]
+
+
+def test_loop_budget_boundaries_eta():
+    states = []
+    loop = Loop(
+        list(range(10)),
+        max_seconds=25,
+        clock=VirtualClock(tick=1),
+        events={"Eval": Event(every_n_steps=5)},
+        budget_boundaries=["Eval"],
+    )
+    for _ in loop:
+        states.append((loop._loop_state.eta_seconds, loop._loop_state.training_end))
+
+    # evals on steps 5, 10, 15, 20 seconds in: the next one would only end 26 seconds in
+    assert len(states) == 20
+    assert states[-1] == (0.0, True)
+    assert states[0] == (24.0, False)
+
+
+def test_loop_budget_boundaries_require_max_seconds():
+    with pytest.raises(ValueError):
+        Loop(list(range(4)), max_epochs=1, budget_boundaries=[LoopEvents.EPOCH_END])
+
+
+@pytest.mark.parametrize("stop_step", [9, 17])
+def test_loop_budget_boundaries_resume(tmp_path, stop_step):
+    state_file = str(tmp_path / "state.json")
+
+    def make_loop():
+        return Loop(
+            MockDataLoader(10),
+            max_seconds=25,
+            clock=VirtualClock(tick=1),
+            budget_boundaries=[LoopEvents.EPOCH_END],
+            state_file=state_file,
+        )
+
+    with make_loop() as loop:
+        for step, _ in enumerate(loop):
+            if step == stop_step:
+                break
+
+    # the step cut short is repeated, and accounted for once. Knowing how long an epoch takes,
+    # the loop still ends with the second epoch, rather than measuring the one it resumes in as
+    # a short one
+    results = list(make_loop())
+    assert len(results) == 20 - stop_step
+    assert {LoopEvents.EPOCH_END, LoopEvents.TRAINING_END} <= results[-1][1]
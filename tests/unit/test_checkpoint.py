@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+
+import pytest
+
+from dloop.checkpoint import CheckpointWriter, load_checkpoint
+from dloop.events import Event, LoopEvents
+from dloop.loop import Loop
+from dloop.types import LoopState
+
+
+def _state(global_step: int) -> LoopState:
+    return LoopState(
+        epoch=0,
+        global_step=global_step,
+        epoch_step=global_step,
+        epoch_end=False,
+        training_end=False,
+    )
+
+
+def test_checkpoint_writer(tmp_path):
+    state = {"weights": [0]}
+    writer = CheckpointWriter(
+        str(tmp_path / "ckpt-{global_step}.pkl"), snapshot=lambda: dict(state)
+    )
+
+    path = writer.save({"global_step": 4}, _state(3))
+    state["weights"] = [1]  # changes after the snapshot aren't written
+    writer.wait()
+
+    assert path == str(tmp_path / "ckpt-3.pkl")
+    assert load_checkpoint(path) == {"loop": {"global_step": 4}, "state": {"weights": [0]}}
+    # only the checkpoint is left, no temporary files
+    assert os.listdir(tmp_path) == ["ckpt-3.pkl"]
+
+
+def test_checkpoint_writer_max_in_flight(tmp_path):
+    release = threading.Event()
+
+    def write(checkpoint, f):
+        release.wait()
+        f.write(b"x")
+
+    writer = CheckpointWriter(
+        str(tmp_path / "ckpt-{global_step}"), snapshot=dict, write=write, max_in_flight=2
+    )
+    writer.save({}, _state(0))
+    writer.save({}, _state(1))
+    assert writer.n_pending == 2
+
+    # a third checkpoint waits for the first write
+    threading.Timer(0.05, release.set).start()
+    writer.save({}, _state(2))
+    assert release.is_set()
+    writer.wait()
+    assert writer.n_pending == 0
+    assert sorted(os.listdir(tmp_path)) == ["ckpt-0", "ckpt-1", "ckpt-2"]
+
+
+def test_checkpoint_writer_error(tmp_path):
+    def write(checkpoint, f):
+        raise OSError("disk full")
+
+    writer = CheckpointWriter(str(tmp_path / "ckpt"), snapshot=dict, write=write)
+    writer.save({}, _state(0))
+    with pytest.raises(OSError, match="disk full"):
+        writer.wait()
+    # the partially written file is removed
+    assert os.listdir(tmp_path) == []
+
+
+def test_checkpoint_writer_rate_limit(tmp_path):
+    writer = CheckpointWriter(
+        str(tmp_path / "ckpt"),
+        snapshot=lambda: b"x" * 1000,
+        write=lambda checkpoint, f: f.write(checkpoint["state"]),
+        max_bytes_per_second=10_000,
+    )
+    start = time.perf_counter()
+    writer.save({}, _state(0))
+    writer.wait()
+    assert time.perf_counter() - start >= 0.1
+
+
+def test_checkpoint_writer_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        CheckpointWriter(str(tmp_path / "ckpt"), snapshot=dict, max_in_flight=0)
+    with pytest.raises(ValueError):
+        CheckpointWriter(str(tmp_path / "ckpt"), snapshot=dict, max_bytes_per_second=0)
+
+
+def test_loop_checkpoint_resume(tmp_path):
+    """A loop resumed from a checkpoint continues after the step the checkpoint was taken on."""
+    seen = []
+    writer = CheckpointWriter(str(tmp_path / "ckpt-{global_step}.pkl"), snapshot=lambda: len(seen))
+
+    def make_loop():
+        return Loop(
+            list(range(4)),
+            max_epochs=2,
+            events={"Checkpoint": Event(every_n_steps=3)},
+            checkpoint=writer,
+            checkpoint_on=["Checkpoint", LoopEvents.TRAINING_END],
+        )
+
+    with make_loop() as loop:
+        for batch, _ in loop:
+            seen.append(batch)
+            if len(seen) == 5:
+                break
+
+    # exiting the context manager waits for the checkpoint of step 2
+    assert os.listdir(tmp_path) == ["ckpt-2.pkl"]
+    checkpoint = load_checkpoint(str(tmp_path / "ckpt-2.pkl"))
+    assert checkpoint["state"] == 3
+
+    resumed = make_loop()
+    resumed.load_state_dict(checkpoint["loop"])
+    assert [batch for batch, _ in resumed] == [3, 0, 1, 2, 3]
+    assert sorted(os.listdir(tmp_path)) == ["ckpt-2.pkl", "ckpt-6.pkl", "ckpt-7.pkl"]
+
+
+def test_loop_checkpoint_error_on_exit(tmp_path, caplog):
+    def write(checkpoint, f):
+        raise OSError("disk full")
+
+    def make_loop():
+        writer = CheckpointWriter(str(tmp_path / "ckpt"), snapshot=dict, write=write)
+        return Loop(list(range(4)), max_epochs=1, checkpoint=writer)
+
+    # the error ending the loop isn't replaced by the failed write, which is logged
+    with pytest.raises(ValueError, match="training failed"):
+        with make_loop() as loop:
+            for _ in loop:
+                loop.checkpoint.save({}, loop._loop_state)
+                raise ValueError("training failed")
+    assert "disk full" in caplog.text
+
+    # without an error, the failed write is raised
+    with pytest.raises(OSError, match="disk full"):
+        with make_loop() as loop:
+            for _ in loop:
+                loop.checkpoint.save({}, loop._loop_state)
+                break
@@ -0,0 +1,243 @@
+import pytest
+
+from dloop.chunking import Chunk, get_iter_chunks_with_events, iter_chunks
+from dloop.clock import VirtualClock
+from dloop.events import Event, LoopEvents
+from dloop.iter_logic import get_iter_dl_with_events
+from dloop.loop import Loop
+from dloop.mixing import SourceEpochEnd
+from dloop.triggers import after, every
+
+
+class MockDataLoader:
+    def __init__(self, data):
+        self.data = data
+
+    def __iter__(self):
+        return iter(self.data)
+
+
+def make_loop(dl_len, stop, **kwargs):
+    return Loop(
+        MockDataLoader(list(range(10))),
+        dataloader_len=dl_len,
+        events={
+            "Every3": Event(every_n_steps=3),
+            "At12": Event(at_step=12),
+            "Every5s": Event(every_n_seconds=5),
+        },
+        clock=VirtualClock(tick=1),
+        **stop,
+        **kwargs,
+    )
+
+
+def position(loop_state):
+    return (
+        loop_state.elapsed_seconds,
+        loop_state.epoch,
+        loop_state.global_step,
+        loop_state.epoch_step,
+        loop_state.epoch_end,
+        loop_state.training_end,
+        loop_state.n_samples,
+    )
+
+
+@pytest.mark.parametrize("dl_len", [10, None])
+@pytest.mark.parametrize("stop", [{"max_epochs": 3}, {"max_steps": 25}])
+@pytest.mark.parametrize("chunk_size", [1, 4, 32])
+def test_loop_chunks_match_batches(dl_len, stop, chunk_size):
+    """Chunks hold the same batches, positions and events as iterating batch by batch."""
+    expected = []
+    loop = make_loop(dl_len, stop)
+    for batch, batch_events in loop:
+        expected.append((batch, position(loop._loop_state), batch_events))
+
+    results = []
+    for chunk, chunk_events in make_loop(dl_len, stop, chunk_size=chunk_size):
+        assert 1 <= len(chunk) <= chunk_size
+        assert chunk_events == set().union(*chunk.events)
+        # chunks never span the end of an epoch or of training
+        assert not any(chunk.epoch_end[:-1]) and not any(chunk.training_end[:-1])
+        for i, batch in enumerate(chunk.batches):
+            results.append((batch, position(chunk.loop_state(i)), chunk.events[i]))
+
+    assert results == expected
+
+
+def test_chunk_arrays():
+    chunks = [chunk for chunk, _ in make_loop(10, {"max_steps": 12}, chunk_size=4)]
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2, 2]
+    assert list(chunks[2].epoch_step) == [8, 9]
+    assert list(chunks[2].epoch_end) == [0, 1]
+    assert list(chunks[3].global_step) == [10, 11]
+    assert list(chunks[3].epoch) == [1, 1]
+    assert chunks[3].loop_state(-1).training_end is True
+    assert chunks[0].loop_state(0).eta_seconds is None
+
+
+def test_loop_chunks_resume(tmp_path):
+    state_file = str(tmp_path / "state.json")
+
+    def run(n_chunks=None):
+        loop = Loop(
+            MockDataLoader(list(range(10))), max_epochs=2, chunk_size=4, state_file=state_file
+        )
+        batches = []
+        with loop:
+            for i, (chunk, _) in enumerate(loop):
+                batches.append(chunk.batches)
+                if i == n_chunks:
+                    break
+        return batches
+
+    # interrupted while processing the third chunk, which is repeated when resuming
+    first_run = run(n_chunks=2)
+    assert first_run == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert run() == [[8, 9], [0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+
+def test_loop_chunks_handlers():
+    loop = Loop(
+        MockDataLoader(list(range(10))),
+        max_epochs=1,
+        events={"Every3": Event(every_n_steps=3)},
+        chunk_size=5,
+    )
+    handled = []
+    loop.on("Every3", lambda loop_state: handled.append(loop_state.global_step))
+    for _ in loop:
+        pass
+
+    assert handled == [2, 5, 8]
+
+
+def test_loop_chunks_mixed_sources():
+    loop = Loop({"a": [0, 1], "b": [10, 11, 12]}, max_steps=6, chunk_size=3)
+    events = [e for chunk, _ in loop for e in chunk.events]
+
+    assert [SourceEpochEnd("a") in e for e in events] == [False, False, True, False, False, False]
+    assert LoopEvents.TRAINING_END in events[-1]
+
+
+def test_iter_chunks_invalid_size():
+    with pytest.raises(ValueError):
+        next(iter_chunks(iter([]), 0))
+    assert len(Chunk()) == 0
+
+
+def grouped_chunks(dl, chunk_size, **kwargs):
+    # the per-batch iteration grouped into chunks, which the native chunks must match
+    iterator = get_iter_dl_with_events(dl, return_loop_state=True, **kwargs)
+    return iter_chunks(iterator, chunk_size)
+
+
+@pytest.mark.parametrize("dl_len", [7, None])
+@pytest.mark.parametrize("chunk_size", [1, 3, 5, 16])
+def test_chunks_match_grouped_steps(dl_len, chunk_size):
+    def make_events():
+        return {
+            "Every2": Event(every_n_steps=2),
+            "At4": Event(at_step=4),
+            "Trigger": Event(trigger=every(5) & after(3)),
+            "Condition": Event(condition_function=lambda loop_state: loop_state.epoch_step == 1),
+            "Samples": Event(every_n_samples=6),
+            "Tokens": Event(every_n_tokens=10),
+            "Both": Event(every_n_steps=3, every_n_samples=4),
+            "Every4s": Event(every_n_seconds=4),
+            "At9s": Event(at_time=9),
+        }
+
+    kwargs = {
+        "dl_len": dl_len,
+        "max_steps": 17,
+        "batch_size_fn": lambda batch: batch % 3 + 1,
+        "token_count_fn": lambda batch: 4,
+    }
+    dl = list(range(7))
+    expected = [
+        (chunk.batches, [position(chunk.loop_state(i)) for i in range(len(chunk))], chunk.events)
+        for chunk, _, _ in grouped_chunks(
+            dl, chunk_size, events=make_events(), clock=VirtualClock(tick=1), **kwargs
+        )
+    ]
+    results = [
+        (chunk.batches, [position(chunk.loop_state(i)) for i in range(len(chunk))], chunk.events)
+        for chunk, _, _ in get_iter_chunks_with_events(
+            dl, chunk_size, events=make_events(), clock=VirtualClock(tick=1), **kwargs
+        )
+    ]
+    assert results == expected
+
+
+def test_chunks_time_events_within_chunk():
+    # every batch reads the clock, one second after the previous reading
+    clock = VirtualClock(tick=1)
+    events = {"Every3s": Event(every_n_seconds=3)}
+    chunks = list(
+        get_iter_chunks_with_events(list(range(12)), 4, max_epochs=1, events=events, clock=clock)
+    )
+
+    assert [list(chunk.elapsed_seconds) for chunk, _, _ in chunks] == [
+        [1, 2, 3, 4],
+        [5, 6, 7, 8],
+        [9, 10, 11, 12],
+    ]
+    # time events trigger on the batch reaching them, not on the first batch of the chunk
+    triggered = [i for chunk, _, _ in chunks for i, e in enumerate(chunk.events) if "Every3s" in e]
+    assert triggered == [2, 1, 0, 3]
+
+
+def test_chunks_max_seconds_within_chunk():
+    clock = VirtualClock(tick=1)
+    chunks = list(get_iter_chunks_with_events(list(range(10)), 4, max_seconds=6.5, clock=clock))
+
+    # the time is up on the third batch of the second chunk, which ends the chunk and training
+    assert [chunk.batches for chunk, _, _ in chunks] == [[0, 1, 2, 3], [4, 5, 6]]
+    chunk, loop_state, chunk_events = chunks[-1]
+    assert list(chunk.training_end) == [0, 0, 1]
+    assert (loop_state.elapsed_seconds, loop_state.training_end) == (7, True)
+    assert LoopEvents.TRAINING_END in chunk_events
+
+
+def test_chunks_max_samples_cut():
+    chunks = list(
+        get_iter_chunks_with_events(list(range(10)), 4, max_samples=6, batch_size_fn=lambda b: 1)
+    )
+    assert [chunk.batches for chunk, _, _ in chunks] == [[0, 1, 2, 3], [4, 5]]
+    chunk, loop_state, chunk_events = chunks[-1]
+    assert (loop_state.n_samples, loop_state.training_end) == (6, True)
+    assert chunk.events[-1] == {LoopEvents.TRAINING_END}
+
+
+def test_loop_chunks_resume_pending_events(tmp_path):
+    """Events triggered on a chunk that is repeated trigger again on the same batch."""
+    state_file = str(tmp_path / "state.json")
+
+    def run(interrupt=False):
+        loop = Loop(
+            MockDataLoader(list(range(12))),
+            max_epochs=1,
+            chunk_size=4,
+            state_file=state_file,
+            events={"Every3Samples": Event(every_n_samples=3)},
+            batch_size_fn=lambda batch: 1,
+        )
+        events = []
+        with loop:
+            for chunk, _ in loop:
+                events.append(chunk.events)
+                if interrupt and chunk.global_step[0] == 4:
+                    break
+        return events
+
+    interrupted = run(interrupt=True)
+    assert interrupted[-1] == [set(), {"Every3Samples"}, set(), set()]
+    # the count events of the repeated chunk are restored on their batch
+    end = {"Every3Samples", LoopEvents.EPOCH_END, LoopEvents.TRAINING_END}
+    assert run() == [
+        [set(), {"Every3Samples"}, set(), set()],
+        [{"Every3Samples"}, set(), set(), end],
+    ]
@@ -0,0 +1,44 @@
+from dloop.clock import PausableClock, VirtualClock, monotonic_clock
+
+
+def test_virtual_clock():
+    clock = VirtualClock(start=10)
+    assert clock() == 10
+    assert clock() == 10
+
+    clock.advance(2.5)
+    assert clock() == 12.5
+
+
+def test_virtual_clock_tick():
+    clock = VirtualClock(tick=0.5)
+    assert [clock() for _ in range(4)] == [0, 0.5, 1.0, 1.5]
+    assert clock.time == 2.0
+
+
+def test_monotonic_clock():
+    assert monotonic_clock() <= monotonic_clock()
+
+
+def test_pausable_clock():
+    inner = VirtualClock(start=10)
+    clock = PausableClock(inner)
+    assert clock() == 10
+
+    inner.advance(1)
+    clock.pause()
+    assert clock.paused
+    inner.advance(5)
+    # stopped while paused, pausing again does nothing
+    clock.pause()
+    assert clock() == 11
+    clock.resume()
+    assert not clock.paused
+    assert clock() == 11
+    assert clock.paused_seconds == 5
+
+    inner.advance(2)
+    assert clock() == 13
+    # resuming a running clock does nothing
+    clock.resume()
+    assert clock() == 13
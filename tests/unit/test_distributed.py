@@ -0,0 +1,104 @@
+import multiprocessing
+
+import pytest
+
+from dloop.clock import VirtualClock
+from dloop.distributed import LocalTimeSync, synchronized_clock
+from dloop.events import Event, LoopEvents
+from dloop.loop import Loop
+
+WORLD_SIZE = 3
+
+
+def test_synchronized_clock():
+    clock = VirtualClock(start=100, tick=1)
+    # other ranks are 0.5 seconds ahead
+    synced = synchronized_clock(clock, start_time=100, time_sync=lambda value: value + 0.5)
+
+    assert [synced() for _ in range(3)] == [100.5, 101.5, 102.5]
+
+
+def test_synchronized_clock_every_n_steps():
+    clock = VirtualClock()
+    synced = synchronized_clock(clock, start_time=0, time_sync=lambda value: value, every_n_steps=3)
+
+    # the time only moves at synchronization points
+    readings = []
+    for _ in range(7):
+        readings.append(synced())
+        clock.advance(1)
+    assert readings == [0, 0, 0, 3, 3, 3, 6]
+
+    with pytest.raises(ValueError):
+        synchronized_clock(clock, start_time=0, time_sync=lambda value: value, every_n_steps=0)
+
+
+def run_rank(rank, time_sync, every_n_steps, results):
+    # every rank sees time pass at a different pace
+    clock = VirtualClock(tick=0.05 * (rank + 1))
+    events = {"Every1s": Event(every_n_seconds=1), "At2s": Event(at_time=2)}
+    loop = Loop(
+        range(1000),
+        events=events,
+        max_seconds=3,
+        clock=clock,
+        time_sync=time_sync,
+        time_sync_every_n_steps=every_n_steps,
+    )
+    results.put((rank, [sorted(map(str, batch_events)) for _, batch_events in loop]))
+
+
+def run_ranks(every_n_steps, synchronize=True):
+    context = multiprocessing.get_context("spawn")
+    sync = LocalTimeSync(WORLD_SIZE, context=context)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=run_rank,
+            args=(rank, sync.for_rank(rank) if synchronize else None, every_n_steps, results),
+        )
+        for rank in range(WORLD_SIZE)
+    ]
+    for process in processes:
+        process.start()
+    events_by_rank = dict(results.get(timeout=60) for _ in processes)
+    for process in processes:
+        process.join(timeout=10)
+        assert process.exitcode == 0
+    return [events_by_rank[rank] for rank in range(WORLD_SIZE)]
+
+
+@pytest.mark.parametrize("every_n_steps", [1, 4])
+def test_ranks_agree_on_time_events(every_n_steps):
+    events_by_rank = run_ranks(every_n_steps)
+
+    assert events_by_rank[0] == events_by_rank[1] == events_by_rank[2]
+    events = events_by_rank[0]
+    assert events[-1] == ["Every1s", str(LoopEvents.TRAINING_END)]
+    assert sum("Every1s" in step_events for step_events in events) == 3
+    assert sum("At2s" in step_events for step_events in events) == 1
+
+
+def test_ranks_disagree_without_time_sync():
+    events_by_rank = run_ranks(every_n_steps=1, synchronize=False)
+    assert len({len(events) for events in events_by_rank}) == WORLD_SIZE
+
+
+def test_local_time_sync_invalid_rank():
+    with pytest.raises(ValueError):
+        LocalTimeSync(2).for_rank(2)
+
+
+def test_state_dict_saves_agreed_time():
+    clock = VirtualClock(tick=1)
+    # the other ranks are 10 seconds ahead
+    loop = Loop(range(10), max_steps=10, clock=clock, time_sync=lambda value: value + 10)
+    elapsed = []
+    for _ in loop:
+        elapsed.append(loop._loop_state.elapsed_seconds)
+        clock.advance(5)
+        if len(elapsed) == 3:
+            # the interrupted step is repeated, from the time agreed on when reading it
+            assert loop.state_dict()["elapsed_seconds"] == elapsed[-1]
+            break
+    assert elapsed[-1] >= 10
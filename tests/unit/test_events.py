@@ -1,14 +1,19 @@
+import time
 from enum import Enum, auto
 from typing import Union
-from unittest import mock
 
 from dloop.events import Event, LoopEvents
 from dloop.types import LoopState
 
 
-def get_simple_state(steps: int):
+def get_simple_state(steps: int, elapsed_seconds: float = 0.0):
     return LoopState(
-        epoch=0, global_step=steps, epoch_step=steps, epoch_end=False, training_end=False
+        epoch=0,
+        global_step=steps,
+        epoch_step=steps,
+        epoch_end=False,
+        training_end=False,
+        elapsed_seconds=elapsed_seconds,
     )
 
 
@@ -156,104 +161,90 @@ def test_loop_events_as_dict_keys():
 
 def test_every_n_seconds():
     """Test that every_n_seconds triggers at the right intervals."""
-    # Create a state to pass (value doesn't matter for time-based events)
-    state = get_simple_state(steps=0)
 
-    # Mock time.time() to control the clock
-    with mock.patch("time.time") as mock_time:
-        # Start at time 100
-        mock_time.return_value = 100
+    def state(elapsed_seconds):
+        # step value doesn't matter for time-based events
+        return get_simple_state(steps=0, elapsed_seconds=elapsed_seconds)
 
-        # Create event that triggers every 5 seconds
-        event = Event(every_n_seconds=5)
+    # Create event that triggers every 5 seconds
+    event = Event(every_n_seconds=5)
 
-        # At time=100, shouldn't trigger yet (just initialized)
-        assert event.should_trigger(state) is False
+    # At the start of the loop, shouldn't trigger yet
+    assert event.should_trigger(state(0)) is False
 
-        # Move clock forward 3 seconds (not enough time)
-        mock_time.return_value = 103
-        assert event.should_trigger(state) is False
+    # 3 seconds into the loop (not enough time)
+    assert event.should_trigger(state(3)) is False
 
-        # Move clock forward 3 more seconds (total 6s since start, enough time)
-        mock_time.return_value = 106
-        assert event.should_trigger(state) is True
+    # 6 seconds into the loop, enough time
+    assert event.should_trigger(state(6)) is True
 
-        # Clock at 106, but we just triggered, so should be false again
-        assert event.should_trigger(state) is False
+    # Still at 6s, but we just triggered, so should be false again
+    assert event.should_trigger(state(6)) is False
 
-        # Move clock forward another 5 seconds
-        mock_time.return_value = 111
-        assert event.should_trigger(state) is True
+    # Move forward another 5 seconds
+    assert event.should_trigger(state(11)) is True
 
-        # Clock at 111, just triggered again
-        assert event.should_trigger(state) is False
+    # Still at 11s, just triggered again
+    assert event.should_trigger(state(11)) is False
 
-        # Move clock forward 4 seconds (not enough)
-        mock_time.return_value = 115
-        assert event.should_trigger(state) is False
+    # Move forward 4 seconds (not enough)
+    assert event.should_trigger(state(15)) is False
 
-        # Move clock forward 1 more second (exactly 5s)
-        mock_time.return_value = 116
-        assert event.should_trigger(state) is True
+    # Move forward 1 more second (exactly 5s)
+    assert event.should_trigger(state(16)) is True
 
 
 def test_at_time():
     """Test that at_time triggers once at the specified time."""
-    # Create a state to pass (value doesn't matter for time-based events)
-    state = get_simple_state(steps=0)
 
-    # Mock time.time() to control the clock
-    with mock.patch("time.time") as mock_time:
-        # Start at time 100
-        mock_time.return_value = 100
+    def state(elapsed_seconds):
+        return get_simple_state(steps=0, elapsed_seconds=elapsed_seconds)
 
-        # Create event that triggers 10 seconds after start
-        event = Event(at_time=10)
+    # Create event that triggers 10 seconds after the loop starts
+    event = Event(at_time=10)
 
-        # At time=100, shouldn't trigger yet
-        assert event.should_trigger(state) is False
+    # At the start, shouldn't trigger yet
+    assert event.should_trigger(state(0)) is False
 
-        # At time=109, still not enough time
-        mock_time.return_value = 109
-        assert event.should_trigger(state) is False
+    # At 9s, still not enough time
+    assert event.should_trigger(state(9)) is False
 
-        # At time=110 (10s after start), should trigger
-        mock_time.return_value = 110
-        assert event.should_trigger(state) is True
+    # At 10s, should trigger
+    assert event.should_trigger(state(10)) is True
 
-        # Already triggered, should only trigger once
-        mock_time.return_value = 120
-        assert event.should_trigger(state) is False
+    # Already triggered, should only trigger once
+    assert event.should_trigger(state(20)) is False
 
-        # Even much later, should still not trigger again
-        mock_time.return_value = 200
-        assert event.should_trigger(state) is False
+    # Even much later, should still not trigger again
+    assert event.should_trigger(state(100)) is False
+
+
+def test_at_time_measured_from_loop_start():
+    """at_time counts from the start of the loop, not from when the Event was created."""
+    event = Event(at_time=10)
+    time.sleep(0.01)
+
+    assert event.should_trigger(get_simple_state(steps=0, elapsed_seconds=9.99)) is False
+    assert event.should_trigger(get_simple_state(steps=1, elapsed_seconds=10)) is True
 
 
 def test_mixed_time_and_step_conditions():
     """Test events with both time and step conditions."""
 
-    # Mock time.time() to control the clock
-    with mock.patch("time.time") as mock_time:
-        # Start at time 100
-        mock_time.return_value = 100
+    # Event with both step and time conditions
+    event = Event(every_n_steps=4, every_n_seconds=10)
 
-        # Event with both step and time conditions
-        event = Event(every_n_steps=4, every_n_seconds=10)
-
-        # Should trigger due to steps, even though time condition isn't met
-        assert event.should_trigger(get_simple_state(steps=3)) is True
+    # Should trigger due to steps, even though time condition isn't met
+    assert event.should_trigger(get_simple_state(steps=3)) is True
 
-        # Should not trigger due to steps
-        assert event.should_trigger(get_simple_state(steps=1)) is False
+    # Should not trigger due to steps
+    assert event.should_trigger(get_simple_state(steps=1)) is False
 
-        # Move time forward to trigger time condition
-        mock_time.return_value = 111
-        assert event.should_trigger(get_simple_state(steps=1)) is True
+    # Move time forward to trigger time condition
+    assert event.should_trigger(get_simple_state(steps=1, elapsed_seconds=11)) is True
 
-        # Time condition triggered, shouldn't trigger again until 10 more seconds
-        mock_time.return_value = 115
-        assert event.should_trigger(get_simple_state(steps=1)) is False
+    # Time condition triggered, shouldn't trigger again until 10 more seconds
+    assert event.should_trigger(get_simple_state(steps=1, elapsed_seconds=15)) is False
 
-        # Step condition should still work independently
-        assert event.should_trigger(get_simple_state(steps=3)) is True
+    # Step condition should still work independently
+    assert event.should_trigger(get_simple_state(steps=3, elapsed_seconds=15)) is True
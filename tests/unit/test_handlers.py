@@ -0,0 +1,186 @@
+import threading
+
+import pytest
+
+from dloop.events import Event, LoopEvents
+from dloop.handlers import EventDispatcher
+from dloop.loop import Loop
+from dloop.types import LoopState
+
+
+def _state(global_step: int) -> LoopState:
+    return LoopState(
+        epoch=0,
+        global_step=global_step,
+        epoch_step=global_step,
+        epoch_end=False,
+        training_end=False,
+    )
+
+
+def _record_step(loop_state):
+    return loop_state.global_step
+
+
+def test_dispatcher_inline():
+    dispatcher = EventDispatcher()
+    calls = []
+    dispatcher.register("a", lambda s: calls.append(("a", s.global_step)))
+    dispatcher.register("b", lambda s: calls.append(("b", s.global_step)))
+
+    dispatcher.dispatch({"a"}, _state(0))
+    dispatcher.dispatch({"a", "b"}, _state(1))
+    dispatcher.dispatch(set(), _state(2))
+    dispatcher.close()
+
+    assert sorted(calls) == [("a", 0), ("a", 1), ("b", 1)]
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_dispatcher_pool(executor):
+    dispatcher = EventDispatcher()
+    dispatcher.register("a", _record_step, executor=executor, max_in_flight=4)
+    for step in range(10):
+        dispatcher.dispatch({"a"}, _state(step))
+    dispatcher.close()
+
+    assert dispatcher.errors == []
+    assert dispatcher.n_dropped == {"a": 0}
+
+
+@pytest.mark.parametrize("backpressure", ["block", "drop", "coalesce"])
+def test_dispatcher_backpressure(backpressure):
+    release = threading.Event()
+    calls = []
+
+    def handler(loop_state):
+        release.wait()
+        calls.append(loop_state.global_step)
+
+    dispatcher = EventDispatcher()
+    dispatcher.register("a", handler, executor="thread", backpressure=backpressure)
+
+    if backpressure == "block":
+        # the second call waits for the first one to finish
+        threading.Timer(0.05, release.set).start()
+        for step in range(3):
+            dispatcher.dispatch({"a"}, _state(step))
+        dispatcher.close()
+        assert calls == [0, 1, 2]
+        return
+
+    for step in range(4):
+        dispatcher.dispatch({"a"}, _state(step))
+    release.set()
+    dispatcher.close()
+
+    if backpressure == "drop":
+        assert calls == [0]
+    else:
+        # only the most recent of the calls waiting for room is handled
+        assert calls == [0, 3]
+    assert dispatcher.n_dropped == {"a": 2 if backpressure == "coalesce" else 3}
+
+
+def test_dispatcher_errors():
+    def failing(loop_state):
+        raise RuntimeError(f"failed at {loop_state.global_step}")
+
+    dispatcher = EventDispatcher()
+    dispatcher.register("inline", failing)
+    dispatcher.register("thread", failing, executor="thread")
+    dispatcher.dispatch({"inline", "thread"}, _state(3))
+    dispatcher.close()
+
+    assert sorted(error.key for error in dispatcher.errors) == ["inline", "thread"]
+    assert all(error.global_step == 3 for error in dispatcher.errors)
+    assert all(isinstance(error.exception, RuntimeError) for error in dispatcher.errors)
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{"executor": "fiber"}, {"backpressure": "queue"}, {"max_in_flight": 0}]
+)
+def test_dispatcher_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        EventDispatcher().register("a", _record_step, **kwargs)
+
+
+def test_loop_handlers():
+    loop = Loop(list(range(6)), events={"Logging": Event(every_n_steps=2)}, max_steps=6)
+    logged = []
+    ended = []
+
+    @loop.on("Logging", executor="thread", max_in_flight=2)
+    def log(loop_state):
+        logged.append(loop_state.global_step)
+
+    loop.on(LoopEvents.TRAINING_END, lambda loop_state: ended.append(loop_state.global_step))
+
+    for _ in loop:
+        pass
+
+    assert sorted(logged) == [1, 3, 5]
+    assert ended == [5]
+    assert loop.handler_errors == []
+
+
+def test_loop_handlers_low_allocation():
+    # the handlers running after the loop moved on get a copy of the reused LoopState
+    loop = Loop(
+        list(range(6)), events={"Every": Event(every_n_steps=1)}, max_steps=6, low_allocation=True
+    )
+    release = threading.Event()
+    logged = []
+
+    @loop.on("Every", executor="thread", max_in_flight=6)
+    def log(loop_state):
+        release.wait()
+        logged.append(loop_state.global_step)
+
+    for step, _ in enumerate(loop):
+        if step == 5:
+            release.set()
+
+    assert sorted(logged) == list(range(6))
+
+
+def test_loop_handler_exception():
+    loop = Loop(list(range(4)), events={"Fail": Event(at_step=1)}, max_steps=4)
+
+    def fail(loop_state):
+        raise RuntimeError
+
+    loop.on("Fail", fail)
+
+    all_events = [batch_events for _, batch_events in loop]
+
+    # the failure is reported on the following step
+    assert [LoopEvents.EXCEPTION in batch_events for batch_events in all_events] == [
+        False,
+        False,
+        True,
+        False,
+    ]
+    assert len(loop.handler_errors) == 1
+    assert loop.handler_errors[0].key == "Fail"
+    assert loop.handler_errors[0].global_step == 1
+
+
+@pytest.mark.parametrize("executor", ["inline", "thread"])
+def test_loop_handler_exception_on_last_step(executor, tmp_path):
+    state_file = str(tmp_path / "state.json")
+    loop = Loop(list(range(4)), max_steps=4, state_file=state_file)
+
+    def fail(loop_state):
+        raise RuntimeError("training end failed")
+
+    loop.on(LoopEvents.TRAINING_END, fail, executor=executor)
+
+    # no step is left to report the failure, so it's raised once the state is saved
+    with pytest.raises(RuntimeError, match="training end failed"):
+        for _ in loop:
+            pass
+    assert len(loop.handler_errors) == 1
+    assert loop.handler_errors[0].global_step == 3
+    # the training finished, resuming yields nothing
+    assert list(Loop(list(range(4)), max_steps=4, state_file=state_file)) == []
@@ -4,7 +4,7 @@ def test_import():
     # Check that main classes are imported
     # These imports are intentionally used only to verify they exist
     # fmt: off
-    from dloop import Event, LoopEvents, Loop, LoopState  # noqa: F401, I001
+    from dloop import AsyncLoop, CheckpointWriter, Event, LocalTimeSync, LoopEvents, Loop, LoopState, MixedIterable, SourceBatch, SourceEpochEnd, VirtualClock  # noqa: F401, I001
 
 
 def test_version():
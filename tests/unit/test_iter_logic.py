@@ -2,19 +2,37 @@ import time
 from dataclasses import asdict
 from enum import Enum, auto, unique
 
+import pytest
+
+from dloop.clock import VirtualClock
 from dloop.events import Event, LoopEvents
 from dloop.iter_logic import (
     get_iter_dl_with_events,
     iter_dl_known_length,
+    iter_dl_unknown_length_lookahead_free,
     iter_dl_unknown_length_with_pairwise_load,
+    iter_dl_unknown_length_with_prefetch,
 )
+from dloop.types import LoopPosition
+
+
+def state_dict(loop_state):
+    """LoopState as a dict, without the elapsed and wall time (and ETA) which depend on the run,
+    and the sample and token counts"""
+    d = asdict(loop_state)
+    d.pop("elapsed_seconds")
+    d.pop("eta_seconds")
+    d.pop("n_samples")
+    d.pop("n_tokens")
+    d.pop("paused_seconds")
+    return d
 
 
 def test_iter_dl_known_length_max_epochs():
     dl = list(range(4))
     it = iter_dl_known_length(dl, dl_len=len(dl), max_epochs=2)
 
-    assert [(b, asdict(s)) for b, s in it] == [
+    assert [(b, state_dict(s)) for b, s in it] == [
         (
             0,
             {
@@ -102,7 +120,7 @@ def test_iter_dl_known_length_max_steps():
     dl = list(range(4))
     it = iter_dl_known_length(dl, dl_len=len(dl), max_steps=6)
 
-    assert [(b, asdict(s)) for b, s in it] == [
+    assert [(b, state_dict(s)) for b, s in it] == [
         (
             0,
             {
@@ -173,7 +191,7 @@ def test_iter_dl_known_length_max_steps_epoch_end():
     dl = list(range(4))
     it = iter_dl_known_length(dl, dl_len=len(dl), max_steps=8)
 
-    assert [(b, asdict(s)) for b, s in it] == [
+    assert [(b, state_dict(s)) for b, s in it] == [
         (
             0,
             {
@@ -261,7 +279,7 @@ def test_iter_dl_unknown_length_with_pairwise_load_max_epochs():
     dl = list(range(4))
     it = iter_dl_unknown_length_with_pairwise_load(dl, max_epochs=2)
 
-    assert [(b, asdict(s)) for b, s in it] == [
+    assert [(b, state_dict(s)) for b, s in it] == [
         (
             0,
             {
@@ -349,7 +367,7 @@ def test_iter_dl_unknown_length_with_pairwise_load_max_steps():
     dl = list(range(4))
     it = iter_dl_unknown_length_with_pairwise_load(dl, max_steps=6)
 
-    assert [(b, asdict(s)) for b, s in it] == [
+    assert [(b, state_dict(s)) for b, s in it] == [
         (
             0,
             {
@@ -420,7 +438,7 @@ def test_iter_dl_unknown_length_with_pairwise_load_max_steps_epoch_end():
     dl = list(range(4))
     it = iter_dl_unknown_length_with_pairwise_load(dl, max_steps=8)
 
-    assert [(b, asdict(s)) for b, s in it] == [
+    assert [(b, state_dict(s)) for b, s in it] == [
         (
             0,
             {
@@ -675,7 +693,7 @@ def test_iter_dl_known_length_max_seconds():
     # Collect results
     results = []
     for batch, state in it:
-        results.append((batch, asdict(state)))
+        results.append((batch, state_dict(state)))
 
     # We should have stopped due to time limit, not because we ran out of items
     assert len(results) < 20
@@ -711,7 +729,7 @@ def test_iter_dl_unknown_length_max_seconds():
     # Collect results
     results = []
     for batch, state in it:
-        results.append((batch, asdict(state)))
+        results.append((batch, state_dict(state)))
 
     # We should have stopped due to time limit, not because we ran out of items
     assert len(results) < 20
@@ -769,3 +787,348 @@ def test_get_iter_dl_with_events_max_seconds():
     for i, (_batch, events) in enumerate(results[:-1]):
         if i % 2 == 1:  # 0-indexed, so steps 1, 3, 5, etc.
             assert CustomEvents.Every2 in events
+
+
+def test_iter_dl_unknown_length_with_prefetch():
+    """Prefetching doesn't change the batches nor their state."""
+    dl = list(range(4))
+    for kwargs in [{"max_epochs": 2}, {"max_steps": 6}, {"max_steps": 8}, {"max_steps": 3}]:
+        expected = [
+            (b, state_dict(s)) for b, s in iter_dl_unknown_length_with_pairwise_load(dl, **kwargs)
+        ]
+        for prefetch_depth in [1, 2, 8]:
+            it = iter_dl_unknown_length_with_prefetch(dl, prefetch_depth=prefetch_depth, **kwargs)
+            assert [(b, state_dict(s)) for b, s in it] == expected
+
+
+def test_iter_dl_known_length_with_prefetch():
+    dl = list(range(4))
+    for kwargs in [{"max_epochs": 2}, {"max_steps": 6}, {"max_steps": 8}]:
+        expected = [(b, state_dict(s)) for b, s in iter_dl_known_length(dl, dl_len=4, **kwargs)]
+        it = iter_dl_known_length(dl, dl_len=4, prefetch_depth=2, **kwargs)
+        assert [(b, state_dict(s)) for b, s in it] == expected
+
+
+def test_get_iter_dl_with_events_prefetch_exception():
+    """Exceptions in the dataloader reach the consumer when prefetching."""
+
+    class FailingDataLoader:
+        def __iter__(self):
+            yield 0
+            yield 1
+            raise OSError("transient read error")
+
+    it = get_iter_dl_with_events(
+        FailingDataLoader(), max_epochs=1, no_len_iteration_strategy="prefetch"
+    )
+    assert next(it) == (0, set())
+    with pytest.raises(OSError, match="transient read error"):
+        next(it)
+
+
+def test_get_iter_dl_with_events_prefetch_overlaps_loading():
+    """With prefetching, loading the next batch happens while the current one is processed."""
+
+    class SlowDataLoader:
+        def __iter__(self):
+            for item in range(5):
+                time.sleep(0.05)
+                yield item
+
+    start = time.time()
+    it = get_iter_dl_with_events(
+        SlowDataLoader(), max_epochs=1, no_len_iteration_strategy="prefetch"
+    )
+    for _ in it:
+        time.sleep(0.05)  # "compute"
+    # sequential loading + compute would take at least 0.5s
+    assert time.time() - start < 0.45
+
+
+def test_get_iter_dl_with_events_unknown_strategy():
+    it = get_iter_dl_with_events([1, 2], max_epochs=1, no_len_iteration_strategy="unknown")  # type: ignore
+    with pytest.raises(ValueError, match="no_len_iteration_strategy"):
+        next(it)
+
+
+def test_iter_dl_resume_from():
+    """Resuming from any position yields the tail of an uninterrupted iteration."""
+    dl = list(range(4))
+    for kwargs in [{"max_epochs": 3}, {"max_steps": 6}, {"max_steps": 8}]:
+        for iter_f, extra_kwargs in [
+            (iter_dl_known_length, {"dl_len": 4}),
+            (iter_dl_unknown_length_with_pairwise_load, {}),
+        ]:
+            expected = [(b, state_dict(s)) for b, s in iter_f(dl, **extra_kwargs, **kwargs)]
+            for i, (_, state) in enumerate(expected):
+                resume_from = LoopPosition(
+                    epoch=state["epoch"],
+                    global_step=state["global_step"],
+                    epoch_step=state["epoch_step"],
+                )
+                it = iter_f(dl, resume_from=resume_from, **extra_kwargs, **kwargs)
+                assert [(b, state_dict(s)) for b, s in it] == expected[i:]
+
+
+def test_iter_dl_unknown_length_single_batch():
+    it = iter_dl_unknown_length_with_pairwise_load([0], max_epochs=2)
+    assert [(b, s.epoch, s.epoch_end, s.training_end) for b, s in it] == [
+        (0, 0, True, False),
+        (0, 1, True, True),
+    ]
+
+    assert list(iter_dl_unknown_length_with_pairwise_load([], max_epochs=2)) == []
+
+
+def test_iter_dl_known_length_empty():
+    # stops on the empty epoch rather than iterating over empty epochs until max_seconds
+    assert list(iter_dl_known_length([], dl_len=4, max_seconds=60)) == []
+
+
+@pytest.mark.parametrize("dl_len", [4, None])
+def test_get_iter_dl_with_events_low_allocation(dl_len):
+    dl = list(range(4))
+    events = {"Every2": Event(every_n_steps=2)}
+
+    expected = list(get_iter_dl_with_events(dl, dl_len=dl_len, max_steps=10, events=events))
+
+    events = {"Every2": Event(every_n_steps=2)}
+    results = list(
+        get_iter_dl_with_events(dl, dl_len=dl_len, max_steps=10, events=events, low_allocation=True)
+    )
+
+    assert results == expected
+    # steps on which the same events trigger share the same frozenset
+    assert results[0][1] is results[2][1] is results[4][1]
+    assert results[1][1] is results[5][1]
+    assert results[3][1] is results[7][1] == {"Every2", LoopEvents.EPOCH_END}
+
+
+@pytest.mark.parametrize("dl_len", [4, None])
+def test_get_iter_dl_with_events_low_allocation_loop_state(dl_len):
+    expected = [
+        state_dict(s)
+        for _, s, _ in get_iter_dl_with_events(
+            list(range(4)), dl_len=dl_len, max_steps=6, return_loop_state=True
+        )
+    ]
+
+    loop_states = []
+    states = []
+    for _, s, _ in get_iter_dl_with_events(
+        list(range(4)), dl_len=dl_len, max_steps=6, return_loop_state=True, low_allocation=True
+    ):
+        loop_states.append(s)
+        # only valid until the next step
+        states.append(state_dict(s))
+
+    assert states == expected
+    assert all(s is loop_states[0] for s in loop_states)
+
+
+def test_iter_dl_unknown_length_lookahead_free():
+    """
+    Same steps as the pairwise strategy, with the end of each epoch and of training reported by
+    a marker.
+    """
+    dl = list(range(3))
+    for kwargs in [{"max_epochs": 2}, {"max_steps": 4}, {"max_steps": 3}]:
+        expected = []
+        for b, s in iter_dl_unknown_length_with_pairwise_load(dl, **kwargs):
+            # the batches only learn the epoch or training ends from the marker
+            expected.append((b, {**state_dict(s), "epoch_end": False, "training_end": False}))
+            if s.epoch_end or s.training_end:
+                expected.append((None, {**state_dict(s), "epoch_end": True}))
+
+        it = iter_dl_unknown_length_lookahead_free(dl, **kwargs)
+        results = [(b, state_dict(s)) for b, s in it]
+        assert results == expected
+
+    assert list(iter_dl_unknown_length_lookahead_free([], max_epochs=2)) == []
+
+
+def test_get_iter_dl_with_events_lookahead_free():
+    events = {"Every2": Event(every_n_steps=2)}
+    it = get_iter_dl_with_events(
+        [0, 1, 2], max_epochs=2, events=events, no_len_iteration_strategy="lookahead_free"
+    )
+    assert list(it) == [
+        (0, set()),
+        (1, {"Every2"}),
+        (2, set()),
+        (None, {LoopEvents.EPOCH_END}),
+        (0, set()),
+        (1, {"Every2"}),
+        (2, set()),
+        (None, {LoopEvents.EPOCH_END, LoopEvents.TRAINING_END}),
+    ]
+
+
+def test_iter_dl_lookahead_free_max_seconds():
+    """max_seconds reached within an epoch ends the epoch and training on the next marker."""
+    # every step reads the clock once, one second after the previous reading
+    clock = VirtualClock(tick=1.0)
+    it = iter_dl_unknown_length_lookahead_free(list(range(5)), max_seconds=2.5, clock=clock)
+    assert [(b, s.global_step, s.epoch_end, s.training_end) for b, s in it] == [
+        (0, 0, False, False),
+        (1, 1, False, False),
+        (2, 2, False, False),
+        (None, 2, True, True),
+    ]
+
+
+def test_iter_dl_lookahead_free_resume_from():
+    """Resuming after the last batch of an epoch still reports the end of the epoch."""
+    it = iter_dl_unknown_length_lookahead_free(
+        list(range(3)), max_epochs=2, resume_from=LoopPosition(epoch=0, global_step=3, epoch_step=3)
+    )
+    assert [(b, s.global_step, s.epoch_end) for b, s in it] == [
+        (None, 2, True),
+        (0, 3, False),
+        (1, 4, False),
+        (2, 5, False),
+        (None, 5, True),
+    ]
+
+
+@pytest.mark.parametrize("strategy", ["pairwise", "prefetch", "lookahead_free"])
+def test_get_iter_dl_with_events_peak_batches(strategy):
+    """Number of batches alive at once, when the user code drops each batch once it's done."""
+    alive = 0
+    peak = 0
+
+    class Batch:
+        def __init__(self):
+            nonlocal alive, peak
+            alive += 1
+            peak = max(peak, alive)
+
+        def __del__(self):
+            nonlocal alive
+            alive -= 1
+
+    class DataLoader:
+        def __iter__(self):
+            for _ in range(5):
+                yield Batch()
+
+    it = get_iter_dl_with_events(
+        DataLoader(), max_epochs=2, no_len_iteration_strategy=strategy, prefetch_depth=1
+    )
+    for batch, _ in it:
+        del batch
+
+    if strategy == "lookahead_free":
+        assert peak == 1
+    else:
+        # strategies that load ahead hold the next batch(es) too
+        assert peak > 1
+
+
+def test_loop_state_accepts_attributes():
+    (_, loop_state), *_ = iter_dl_known_length([0], dl_len=1, max_epochs=1)
+    # user code may attach its own attributes to the state
+    loop_state.tag = "warmup"
+    assert loop_state.tag == "warmup"
+    assert state_dict(loop_state) == {
+        "epoch": 0,
+        "global_step": 0,
+        "epoch_step": 0,
+        "epoch_end": True,
+        "training_end": True,
+    }
+
+
+def test_get_iter_dl_with_events_counts():
+    dl = [[0] * n for n in (1, 2, 3, 4, 5)]
+    iterator = get_iter_dl_with_events(
+        dl,
+        dl_len=5,
+        max_epochs=2,
+        return_loop_state=True,
+        batch_size_fn=len,
+        token_count_fn=lambda batch: 10 * len(batch),
+    )
+    states = [loop_state for _, loop_state, _ in iterator]
+    assert [s.n_samples for s in states] == [1, 3, 6, 10, 15, 16, 18, 21, 25, 30]
+    assert [s.n_tokens for s in states] == [10 * s.n_samples for s in states]
+
+
+@pytest.mark.parametrize("dl_len", [5, None])
+def test_get_iter_dl_with_events_max_samples(dl_len):
+    dl = [[0] * n for n in (1, 2, 3, 4, 5)]
+    iterator = get_iter_dl_with_events(
+        dl, dl_len=dl_len, max_samples=20, return_loop_state=True, batch_size_fn=len
+    )
+    items = list(iterator)
+    # training ends on the step reaching 20 samples, in the second epoch
+    assert [loop_state.n_samples for _, loop_state, _ in items] == [
+        1,
+        3,
+        6,
+        10,
+        15,
+        16,
+        18,
+        21,
+    ]
+    _, loop_state, batch_events = items[-1]
+    assert loop_state.training_end
+    assert LoopEvents.TRAINING_END in batch_events
+    assert not any(loop_state.training_end for _, loop_state, _ in items[:-1])
+
+
+def test_get_iter_dl_with_events_max_tokens_with_max_epochs():
+    dl = [[0] * n for n in (1, 2, 3)]
+    # max_epochs is reached first
+    iterator = get_iter_dl_with_events(
+        dl, dl_len=3, max_epochs=1, max_tokens=100, token_count_fn=len, return_loop_state=True
+    )
+    assert [loop_state.n_tokens for _, loop_state, _ in iterator] == [1, 3, 6]
+
+    with pytest.raises(ValueError, match="token_count_fn"):
+        list(get_iter_dl_with_events(dl, dl_len=3, max_tokens=100))
+
+
+def test_get_iter_dl_with_events_counts_resume_from():
+    dl = [[0] * n for n in (1, 2, 3)]
+    iterator = get_iter_dl_with_events(
+        dl,
+        dl_len=3,
+        max_samples=10,
+        batch_size_fn=len,
+        resume_from=LoopPosition(epoch=1, global_step=4, epoch_step=1, n_samples=7),
+        return_loop_state=True,
+    )
+    assert [(s.global_step, s.n_samples) for _, s, _ in iterator] == [(4, 9), (5, 12)]
+
+
+def test_get_iter_dl_with_events_counts_resume_from_without_count_fns():
+    # the counts of the interrupted run are kept, even though nothing is counted anymore
+    iterator = get_iter_dl_with_events(
+        range(3),
+        dl_len=3,
+        max_epochs=2,
+        resume_from=LoopPosition(epoch=1, global_step=4, epoch_step=1, n_samples=7, n_tokens=70),
+        return_loop_state=True,
+    )
+    assert [(s.global_step, s.n_samples, s.n_tokens) for _, s, _ in iterator] == [
+        (4, 7, 70),
+        (5, 7, 70),
+    ]
+
+
+def test_get_iter_dl_with_events_lookahead_free_max_samples():
+    """Training ends on a marker following the batch reaching the count limit."""
+    it = get_iter_dl_with_events(
+        [1, 2, 3, 4],
+        max_samples=3,
+        batch_size_fn=lambda batch: batch,
+        no_len_iteration_strategy="lookahead_free",
+        return_loop_state=True,
+    )
+    assert [(b, s.n_samples, s.training_end, events) for b, s, events in it] == [
+        (1, 1, False, set()),
+        (2, 3, False, set()),
+        (None, 3, True, {LoopEvents.EPOCH_END, LoopEvents.TRAINING_END}),
+    ]
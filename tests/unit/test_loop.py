@@ -1,11 +1,15 @@
+import json
+import os
 import time
 from collections.abc import Iterable
 from enum import Enum, auto, unique
 
 import pytest
 
+from dloop.clock import VirtualClock
 from dloop.events import Event, LoopEvents
 from dloop.loop import Loop
+from dloop.mixing import SourceEpochEnd
 
 
 class MockDataLoader:
@@ -27,12 +31,14 @@ def test_mock_dl():
         len(dl)  # type: ignore
 
 
-@pytest.mark.parametrize("dl_len", [4, None])
-def test_loop_basics(dl_len):
+@pytest.mark.parametrize(
+    "dl_len, strategy", [(4, "pairwise"), (None, "pairwise"), (None, "prefetch")]
+)
+def test_loop_basics(dl_len, strategy):
     dl = MockDataLoader(list(range(4)))
 
     # max epochs
-    loop = Loop(dl, max_epochs=2, dataloader_len=dl_len)
+    loop = Loop(dl, max_epochs=2, dataloader_len=dl_len, no_len_iteration_strategy=strategy)
 
     assert list(loop) == [
         (0, set()),
@@ -46,7 +52,7 @@ def test_loop_basics(dl_len):
     ]
 
     # max steps
-    loop = Loop(dl, max_steps=6, dataloader_len=dl_len)
+    loop = Loop(dl, max_steps=6, dataloader_len=dl_len, no_len_iteration_strategy=strategy)
 
     assert list(loop) == [
         (0, set()),
@@ -58,7 +64,7 @@ def test_loop_basics(dl_len):
     ]
 
     # max steps matches epoch end
-    loop = Loop(dl, max_steps=8, dataloader_len=dl_len)
+    loop = Loop(dl, max_steps=8, dataloader_len=dl_len, no_len_iteration_strategy=strategy)
 
     assert list(loop) == [
         (0, set()),
@@ -242,3 +248,416 @@ def test_loop_max_seconds(dl_len):
     # Verify that previous batches don't have the TRAINING_END event
     for _batch, events in results[:-1]:
         assert LoopEvents.TRAINING_END not in events
+
+
+class StepFailure(Exception):
+    pass
+
+
+def run_until_failure(loop, fail_at_step):
+    """Iterate the loop in a context manager, raising while processing step `fail_at_step`."""
+    results = []
+    try:
+        with loop:
+            for i, (batch, events) in enumerate(loop):
+                results.append((batch, events))
+                if i == fail_at_step:
+                    raise StepFailure()
+    except StepFailure:
+        pass
+    return results
+
+
+@pytest.mark.parametrize("dl_len", [4, None])
+@pytest.mark.parametrize("fail_at_step", [0, 2, 3, 5, 7])
+def test_loop_resume_after_exception(tmp_path, dl_len, fail_at_step):
+    """A resumed loop repeats the interrupted step and continues exactly where it left off."""
+    state_file = str(tmp_path / "state.json")
+    dl = MockDataLoader(list(range(4)))
+
+    def make_loop():
+        events = {"Every3": Event(every_n_steps=3), "At6": Event(at_step=6)}
+        return Loop(dl, max_epochs=3, dataloader_len=dl_len, events=events, state_file=state_file)
+
+    expected = list(make_loop().__iter__())
+    os.remove(state_file)
+
+    first_run = run_until_failure(make_loop(), fail_at_step)
+    assert len(first_run) == fail_at_step + 1
+
+    resumed = list(make_loop())
+
+    # the failed step is repeated, with the same events
+    assert first_run[:-1] + resumed == expected
+
+    # training finished, resuming again yields nothing
+    assert list(make_loop()) == []
+
+
+@pytest.mark.parametrize("dl_len", [4, None])
+def test_loop_save_state_on_events(tmp_path, dl_len):
+    state_file = str(tmp_path / "state.json")
+    dl = MockDataLoader(list(range(4)))
+
+    loop = Loop(
+        dl,
+        max_steps=10,
+        dataloader_len=dl_len,
+        state_file=state_file,
+        save_state_on=[LoopEvents.EPOCH_END],
+    )
+    for i, _ in enumerate(loop):
+        if i == 6:
+            break  # simulates being killed without a chance to save the state
+
+    # the last state saved is after the end of the first epoch
+    with open(state_file) as f:
+        state = json.load(f)
+    assert (state["epoch"], state["global_step"], state["epoch_step"]) == (1, 4, 0)
+
+    resumed = Loop(dl, max_steps=10, dataloader_len=dl_len, state_file=state_file)
+    assert [b for b, _ in resumed] == [0, 1, 2, 3, 0, 1]
+
+
+def test_loop_resume_time_events(tmp_path):
+    """Time-based bookkeeping is restored, and max_seconds is a budget across restarts."""
+    state_file = str(tmp_path / "state.json")
+    dl = MockDataLoader(list(range(4)))
+
+    def make_loop(clock):
+        events = {"Every10s": Event(every_n_seconds=10), "At25s": Event(at_time=25)}
+        return Loop(dl, max_seconds=60, events=events, state_file=state_file, clock=clock)
+
+    def custom_events(results):
+        return [(t, sorted(e - set(LoopEvents))) for t, e in results if e - set(LoopEvents)]
+
+    # each step takes 4 seconds
+    clock = VirtualClock(start=1000)
+    first_run = []
+    try:
+        with make_loop(clock) as loop:
+            for _batch, events in loop:
+                first_run.append((clock.time - 1000, events))
+                if "At25s" in events:
+                    raise StepFailure()
+                clock.advance(4)
+    except StepFailure:
+        pass
+
+    assert custom_events(first_run) == [(12, ["Every10s"]), (24, ["Every10s"]), (28, ["At25s"])]
+
+    # restart much later, 28 seconds were spent before the failure
+    clock = VirtualClock(start=5000)
+    second_run = []
+    for _batch, events in make_loop(clock):
+        second_run.append((clock.time - 5000 + 28, events))
+        clock.advance(4)
+
+    # the failed step is repeated with its events, and Every10s keeps its cadence
+    assert custom_events(second_run) == [
+        (28, ["At25s"]),
+        (36, ["Every10s"]),
+        (48, ["Every10s"]),
+        (60, ["Every10s"]),
+    ]
+
+    # only steps until the 60s budget are run
+    assert [t for t, _ in second_run] == list(range(28, 61, 4))
+    assert LoopEvents.TRAINING_END in second_run[-1][1]
+
+
+def test_loop_virtual_clock():
+    """Time-based events and max_seconds share the clock, read once per step."""
+    clock = VirtualClock(tick=0.5)
+    events = {"Every2s": Event(every_n_seconds=2), "At3s": Event(at_time=3)}
+    loop = Loop(MockDataLoader(range(100)), max_seconds=5, events=events, clock=clock)
+
+    results = [events - {LoopEvents.EPOCH_END} for _, events in loop]
+
+    # one reading to start the loop, then steps at 0.5, 1, ..., 5 seconds
+    assert len(results) == 10
+    assert [i for i, e in enumerate(results) if "Every2s" in e] == [3, 7]
+    assert [i for i, e in enumerate(results) if "At3s" in e] == [5]
+    assert results[-1] == {LoopEvents.TRAINING_END}
+    assert clock.time == 11 * 0.5
+
+
+def test_loop_plain_steps_skip_clock():
+    """Without anything needing the time, the steps don't read the clock."""
+    clock = VirtualClock(tick=0.5)
+    events = {"Every3": Event(every_n_steps=3)}
+    loop = Loop(range(10), max_steps=8, events=events, clock=clock)
+
+    results = [events for _, events in loop]
+    assert [i for i, e in enumerate(results) if "Every3" in e] == [2, 5]
+    # the step timings are measured on the wall clock
+    assert loop.timing.stats().n_steps == 8
+    assert LoopEvents.TRAINING_END in results[-1]
+    # only the reading starting the loop
+    assert clock.time == 0.5
+    # the elapsed time is still measured when saving the state
+    assert loop.state_dict()["elapsed_seconds"] == 0.5
+
+    # a condition function may read the elapsed time
+    clock = VirtualClock(tick=0.5)
+    events = {"After2s": Event(condition_function=lambda state: state.elapsed_seconds >= 2)}
+    loop = Loop(range(10), max_steps=8, events=events, clock=clock, timing_window=None)
+    results = [events for _, events in loop]
+    assert [i for i, e in enumerate(results) if "After2s" in e] == [3, 4, 5, 6, 7]
+    assert clock.time == 9 * 0.5
+
+
+def test_loop_timing():
+    """Time spent in the dataloader counts as data wait, the rest of the step as compute."""
+
+    def slow_dataloader():
+        for i in range(5):
+            time.sleep(0.02)
+            yield i
+
+    loop = Loop(slow_dataloader(), max_steps=5)
+    assert loop.timing.stats() is None
+
+    for _ in loop:
+        time.sleep(0.01)
+
+    stats = loop.timing.stats()
+    assert stats.n_steps == 5
+    assert stats.data_wait_p50 >= 0.02
+    assert stats.compute_p50 >= 0.01
+    assert stats.data_starvation_ratio > 0.5
+    assert stats.steps_per_second < 1 / 0.03
+
+
+def test_loop_timing_disabled():
+    loop = Loop(range(5), max_epochs=1, timing_window=None)
+    assert len(list(loop)) == 5
+    assert loop.timing is None
+
+
+def test_loop_mixed_sources():
+    loop = Loop({"a": [0, 1], "b": [10, 11, 12, 13]}, mixing="proportional", max_epochs=2)
+
+    results = [(batch.source, batch.batch, events) for batch, events in loop]
+    assert [(source, batch) for source, batch, _ in results] == 2 * [
+        ("b", 10), ("a", 0), ("b", 11), ("b", 12), ("a", 1), ("b", 13),
+    ]  # fmt: skip
+    assert [events for _, _, events in results] == [
+        set(),
+        set(),
+        set(),
+        set(),
+        {SourceEpochEnd("a")},
+        {SourceEpochEnd("b"), LoopEvents.EPOCH_END},
+        set(),
+        set(),
+        set(),
+        set(),
+        {SourceEpochEnd("a")},
+        {SourceEpochEnd("b"), LoopEvents.EPOCH_END, LoopEvents.TRAINING_END},
+    ]
+
+
+def test_loop_mixed_sources_unknown_length():
+    dataloaders = {"a": MockDataLoader([0, 1]), "b": MockDataLoader([10, 11, 12])}
+    loop = Loop(dataloaders, max_steps=7)
+
+    results = [(batch.source, batch.batch, events) for batch, events in loop]
+    assert results == [
+        ("a", 0, set()),
+        ("b", 10, set()),
+        ("a", 1, {SourceEpochEnd("a")}),
+        ("b", 11, set()),
+        ("a", 0, set()),
+        ("b", 12, {SourceEpochEnd("b")}),
+        ("a", 1, {SourceEpochEnd("a"), LoopEvents.TRAINING_END}),
+    ]
+
+
+def test_loop_mixed_sources_unknown_length_needs_limit():
+    dataloaders = {"a": MockDataLoader([0, 1, 2]), "b": list(range(4))}
+    # the mixed epoch would never end
+    with pytest.raises(ValueError, match="unknown length"):
+        Loop(dataloaders, max_epochs=1)
+    # unless the total length is provided
+    loop = Loop(dataloaders, max_epochs=1, dataloader_len=7)
+    assert len(list(loop)) == 7
+
+
+@pytest.mark.parametrize("mixing", ["round_robin", "weighted_random", "proportional"])
+def test_loop_mixed_sources_resume(tmp_path, mixing):
+    """A mixed loop resumes from the same position of every source."""
+
+    def make_loop():
+        return Loop(
+            {"a": [0, 1, 2], "b": [10, 11, 12, 13, 14]},
+            mixing=mixing,
+            max_epochs=3,
+            state_file=str(tmp_path / f"{mixing}.json"),
+        )
+
+    def as_tuples(results):
+        return [(batch.source, batch.batch, events) for batch, events in results]
+
+    expected = as_tuples(make_loop())
+    os.remove(tmp_path / f"{mixing}.json")
+
+    first = as_tuples(run_until_failure(make_loop(), fail_at_step=10))
+    second = as_tuples(make_loop())
+
+    # the failed step is repeated
+    assert first[:-1] + second == expected
+
+
+def test_loop_lookahead_free_single_batch_alive():
+    """With the lookahead-free strategy, a single batch is alive at a time."""
+    alive = 0
+    peak = 0
+
+    class Batch:
+        def __init__(self, i):
+            nonlocal alive, peak
+            self.i = i
+            alive += 1
+            peak = max(peak, alive)
+
+        def __del__(self):
+            nonlocal alive
+            alive -= 1
+
+    class DataLoader:
+        def __iter__(self):
+            return (Batch(i) for i in range(3))
+
+    loop = Loop(DataLoader(), max_epochs=2, no_len_iteration_strategy="lookahead_free")
+    results = []
+    for batch, batch_events in loop:
+        results.append((batch and batch.i, LoopEvents.EPOCH_END in batch_events))
+        del batch
+
+    assert results == [(0, False), (1, False), (2, False), (None, True)] * 2
+    assert peak == 1
+
+
+def test_loop_lookahead_free_markers(tmp_path):
+    """Training ends on a marker, and markers aren't timed and don't save the state."""
+    state_file = str(tmp_path / "state.json")
+
+    class DataLoader:
+        def __iter__(self):
+            return iter(range(3))
+
+    loop = Loop(
+        DataLoader(),
+        max_steps=4,
+        no_len_iteration_strategy="lookahead_free",
+        state_file=state_file,
+        save_state_on=[LoopEvents.EPOCH_END],
+    )
+    results = [
+        (batch, LoopEvents.TRAINING_END in batch_events, os.path.exists(state_file))
+        for batch, batch_events in loop
+    ]
+
+    # the state isn't saved after the marker ending the first epoch
+    assert results == [
+        (0, False, False),
+        (1, False, False),
+        (2, False, False),
+        (None, False, False),
+        (0, False, False),
+        (None, True, False),
+    ]
+    assert loop.timing._n_recorded == 4
+
+
+def test_loop_sample_and_token_counts(tmp_path):
+    dl = [[0] * n for n in (1, 2, 3, 4, 5)]
+    events = {"Every8Samples": Event(every_n_samples=8), "Every50Tokens": Event(every_n_tokens=50)}
+
+    def make_loop():
+        return Loop(
+            dl,
+            events=events,
+            max_samples=30,
+            batch_size_fn=len,
+            token_count_fn=lambda batch: 10 * len(batch),
+            state_file=str(tmp_path / "state.json"),
+        )
+
+    steps = []
+    with make_loop() as loop:
+        for _, batch_events in loop:
+            steps.append((loop._loop_state.n_samples, batch_events))
+            if len(steps) == 6:
+                break
+
+    # the interrupted step is repeated, with the same counts and events
+    with make_loop() as loop:
+        for _, batch_events in loop:
+            steps.append((loop._loop_state.n_samples, batch_events))
+
+    assert [n_samples for n_samples, _ in steps] == [1, 3, 6, 10, 15, 16, 16, 18, 21, 25, 30]
+    assert [i for i, (_, e) in enumerate(steps) if "Every8Samples" in e] == [3, 5, 6, 9]
+    assert [i for i, (_, e) in enumerate(steps) if "Every50Tokens" in e] == [2, 3, 4, 8, 9, 10]
+    assert LoopEvents.TRAINING_END in steps[-1][1]
+
+
+def test_loop_counts_require_functions():
+    with pytest.raises(ValueError, match="batch_size_fn"):
+        Loop(range(10), max_samples=100)
+    with pytest.raises(ValueError, match="batch_size_fn"):
+        Loop(range(10), max_steps=10, events={"E": Event(every_n_samples=5)})
+    with pytest.raises(ValueError, match="token_count_fn"):
+        Loop(range(10), max_tokens=100)
+
+
+def test_loop_paused():
+    clock = VirtualClock()
+    events = {"Every10s": Event(every_n_seconds=10)}
+    loop = Loop(range(100), events=events, max_seconds=30, clock=clock)
+    steps = []
+    for _, batch_events in loop:
+        loop_state = loop._loop_state
+        steps.append((loop_state.elapsed_seconds, loop_state.wall_seconds, batch_events))
+        # every step trains for 2 seconds, and every 5th step evaluates for 20 more
+        clock.advance(2)
+        if loop_state.global_step % 5 == 4:
+            with loop.paused():
+                clock.advance(20)
+
+    # the evals don't count towards max_seconds nor the time-based events
+    assert len(steps) == 16
+    assert [elapsed for elapsed, _, _ in steps] == [2.0 * i for i in range(16)]
+    assert [wall for _, wall, _ in steps][4:7] == [8.0, 30.0, 32.0]
+    assert steps[-1][1] == 90.0
+    assert [i for i, (_, _, e) in enumerate(steps) if "Every10s" in e] == [5, 10, 15]
+    assert LoopEvents.TRAINING_END in steps[-1][2]
+
+
+def test_loop_pause_resume_nested(tmp_path):
+    clock = VirtualClock()
+    loop = Loop(range(10), max_steps=10, clock=clock, state_file=str(tmp_path / "state.json"))
+    for batch, _ in loop:
+        loop.pause()
+        with loop.paused():
+            clock.advance(3)
+        # the inner block doesn't resume the outer pause
+        clock.advance(2)
+        loop.resume()
+        clock.advance(1)
+        if batch == 4:
+            break
+    loop.save_state()
+
+    with open(tmp_path / "state.json") as f:
+        state = json.load(f)
+    # the interrupted step is repeated, so its time isn't saved
+    assert state["elapsed_seconds"] == 4.0
+    assert state["paused_seconds"] == 25.0
+
+    # wall time includes the time paused before resuming
+    loop = Loop(range(10), max_steps=10, clock=clock, state_file=str(tmp_path / "state.json"))
+    for _ in loop:
+        assert loop._loop_state.wall_seconds == loop._loop_state.elapsed_seconds + 25
+        break
@@ -0,0 +1,129 @@
+import math
+import weakref
+
+import pytest
+
+from dloop.events import Event
+from dloop.loop import Loop
+from dloop.metrics import Metrics
+
+
+class _LazyScalar:
+    """Scalar that records when it's converted, like a tensor synced to the host."""
+
+    n_converted = 0
+
+    def __init__(self, value: float):
+        self.value = value
+
+    def __float__(self) -> float:
+        _LazyScalar.n_converted += 1
+        return float(self.value)
+
+
+def test_metrics_invalid_args():
+    with pytest.raises(ValueError, match="reduction"):
+        Metrics(default="median")
+    with pytest.raises(ValueError, match="reduction"):
+        Metrics(reductions={"loss": "median"})
+    with pytest.raises(ValueError, match="ema_alpha"):
+        Metrics(ema_alpha=0)
+    with pytest.raises(ValueError, match="capacity"):
+        Metrics(capacity=0)
+
+
+@pytest.mark.parametrize(
+    "reduction,expected",
+    [("mean", 2.5), ("sum", 10.0), ("min", 1.0), ("max", 4.0), ("last", 3.0)],
+)
+def test_metrics_reductions(reduction, expected):
+    metrics = Metrics(default=reduction)
+    for value in (2, 1, 4, 3):
+        metrics.log(x=value)
+    assert metrics.flush() == {"x": expected}
+    # values are reset by flushing
+    assert metrics.flush() == {}
+    metrics.log(x=7)
+    assert metrics.flush() == {"x": 7.0}
+
+
+def test_metrics_ema_carries_over_flushes():
+    metrics = Metrics(reductions={"loss": "ema"}, ema_alpha=0.5)
+    metrics.log(loss=4)
+    metrics.log(loss=2)
+    assert metrics.flush() == {"loss": 3.0}
+    metrics.log(loss=1)
+    assert metrics.flush() == {"loss": 2.0}
+
+
+def test_metrics_lazy_values():
+    _LazyScalar.n_converted = 0
+    metrics = Metrics(reductions={"lr": "last"})
+    for i in range(10):
+        metrics.log(loss=_LazyScalar(i), lr=lambda i=i: 0.1 * i)
+    # each value is converted once the next one is logged
+    assert _LazyScalar.n_converted == 9
+
+    flushed = metrics.flush()
+    assert _LazyScalar.n_converted == 10
+    assert flushed["loss"] == 4.5
+    assert math.isclose(flushed["lr"], 0.9)
+
+
+def test_metrics_capacity():
+    _LazyScalar.n_converted = 0
+    metrics = Metrics(capacity=4)
+    for i in range(10):
+        metrics.log(loss=_LazyScalar(i))
+    # full buffers are reduced in place
+    assert _LazyScalar.n_converted == 9
+    assert metrics.flush() == {"loss": 4.5}
+
+
+def test_metrics_keep_one_value():
+    class Tensor:
+        def __float__(self):
+            return 1.0
+
+    metrics = Metrics()
+    tensors = [Tensor() for _ in range(3)]
+    refs = [weakref.ref(tensor) for tensor in tensors]
+    for tensor in tensors:
+        metrics.log(loss=tensor)
+    del tensor, tensors
+    # only the last value logged is kept
+    assert [ref() is None for ref in refs] == [True, True, False]
+    assert metrics.flush() == {"loss": 1.0}
+    assert refs[-1]() is None
+
+
+def test_loop_metrics():
+    loop = Loop(range(10), events={"Logging": Event(every_n_steps=5)}, max_steps=10)
+    assert isinstance(loop.metrics, Metrics)
+
+    flushed = []
+    for batch, batch_events in loop:
+        loop.metrics.log(batch=batch)
+        if "Logging" in batch_events:
+            flushed.append(loop.metrics.flush())
+    assert flushed == [{"batch": 2.0}, {"batch": 7.0}]
+
+    metrics = Metrics(default="sum")
+    assert Loop(range(10), max_steps=10, metrics=metrics).metrics is metrics
+
+
+def test_loop_metrics_flush_on():
+    events = {"Logging": Event(every_n_steps=5)}
+    loop = Loop(range(10), events=events, max_steps=10, metrics_flush_on=["Logging"])
+    seen = []
+    loop.on("Logging", lambda loop_state: seen.append(dict(loop.flushed_metrics)))
+
+    flushed = []
+    for batch, _ in loop:
+        loop.metrics.log(batch=batch)
+        flushed.append(loop.flushed_metrics)
+    # flushed once the body is done with the step, so the reduced values show on the next step
+    assert flushed[4] == {} and flushed[5] == {"batch": 2.0}
+    assert loop.flushed_metrics == {"batch": 7.0}
+    # handlers of the event see the values it flushed
+    assert seen == [{"batch": 2.0}, {"batch": 7.0}]
@@ -0,0 +1,163 @@
+import itertools
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from dloop.mixing import MixedIterable, SourceBatch
+
+
+class UnsizedDataLoader:
+    def __init__(self, data):
+        self.data = data
+
+    def __iter__(self):
+        return iter(self.data)
+
+
+def batches(mixed, n=None):
+    items = mixed if n is None else itertools.islice(iter(mixed), n)
+    return [(item.source, item.batch) for item in items]
+
+
+def test_round_robin():
+    mixed = MixedIterable({"a": [0, 1, 2], "b": [10, 11, 12, 13, 14]})
+    assert mixed.length == 8
+
+    # the sources restart independently, and the stream goes on in the next epoch
+    assert batches(mixed) == [
+        ("a", 0), ("b", 10), ("a", 1), ("b", 11), ("a", 2), ("b", 12), ("a", 0), ("b", 13),
+    ]  # fmt: skip
+    mixed.set_epoch(1)
+    assert batches(mixed, 3) == [("a", 1), ("b", 14), ("a", 2)]
+
+
+def test_source_epochs():
+    mixed = MixedIterable({"a": [0, 1], "b": UnsizedDataLoader([10, 11, 12])})
+    assert mixed.length is None
+
+    items = list(itertools.islice(iter(mixed), 8))
+    assert [item for item in items if item.source == "a"] == [
+        SourceBatch("a", 0, epoch=0, epoch_step=0, epoch_end=False),
+        SourceBatch("a", 1, epoch=0, epoch_step=1, epoch_end=True),
+        SourceBatch("a", 0, epoch=1, epoch_step=0, epoch_end=False),
+        SourceBatch("a", 1, epoch=1, epoch_step=1, epoch_end=True),
+    ]
+    # the end of the epoch of sources without length is detected by loading one batch ahead
+    assert [item for item in items if item.source == "b"] == [
+        SourceBatch("b", 10, epoch=0, epoch_step=0, epoch_end=False),
+        SourceBatch("b", 11, epoch=0, epoch_step=1, epoch_end=False),
+        SourceBatch("b", 12, epoch=0, epoch_step=2, epoch_end=True),
+        SourceBatch("b", 10, epoch=1, epoch_step=0, epoch_end=False),
+    ]
+
+
+def test_proportional():
+    mixed = MixedIterable({"a": [0, 1], "b": [10, 11, 12, 13]}, mixing="proportional")
+
+    # one pass over each source per epoch, evenly interleaved
+    for _ in range(2):
+        assert batches(mixed) == [("b", 10), ("a", 0), ("b", 11), ("b", 12), ("a", 1), ("b", 13)]
+
+
+def test_proportional_needs_weights():
+    with pytest.raises(ValueError):
+        MixedIterable({"a": UnsizedDataLoader([0])}, mixing="proportional")
+
+    mixed = MixedIterable(
+        {"a": UnsizedDataLoader([0]), "b": UnsizedDataLoader([1])},
+        mixing="proportional",
+        weights={"a": 1, "b": 3},
+    )
+    assert batches(mixed, 4) == [("b", 1), ("b", 1), ("a", 0), ("b", 1)]
+
+
+def test_weighted_random():
+    dataloaders = {"a": UnsizedDataLoader(range(10)), "b": UnsizedDataLoader(range(10))}
+    weights = {"a": 1, "b": 4}
+
+    mixed = MixedIterable(dataloaders, mixing="weighted_random", weights=weights, seed=3)
+    counts = Counter(source for source, _ in batches(mixed, 5000))
+    assert counts["b"] / counts["a"] == pytest.approx(4, rel=0.1)
+
+    # deterministic given the seed
+    same = MixedIterable(dataloaders, mixing="weighted_random", weights=weights, seed=3)
+    assert batches(same, 100) == batches(
+        MixedIterable(dataloaders, mixing="weighted_random", weights=weights, seed=3), 100
+    )
+
+
+@pytest.mark.parametrize("mixing", ["round_robin", "weighted_random", "proportional"])
+@pytest.mark.parametrize("unsized", [False, True])
+def test_skip(mixing, unsized):
+    """Skipping resumes at the same position as iterating."""
+    dataloaders = {"a": list(range(3)), "b": list(range(10, 15))}
+    weights = {"a": 1, "b": 2}
+    if unsized:
+        dataloaders = {name: UnsizedDataLoader(dl) for name, dl in dataloaders.items()}
+
+    mixed = MixedIterable(dataloaders, mixing=mixing, weights=weights)
+    if unsized:
+        expected = batches(mixed, 20)
+    else:
+        expected = []
+        for epoch in range(3):
+            mixed.set_epoch(epoch)
+            expected += batches(mixed)
+
+    resumed = MixedIterable(dataloaders, mixing=mixing, weights=weights)
+    if unsized:
+        assert batches(resumed.skip(7), 13) == expected[7:]
+    else:
+        # 8 batches per epoch
+        resumed.set_epoch(1)
+        assert batches(resumed.skip(3)) == expected[11:16]
+
+
+def test_empty_source():
+    with pytest.raises(ValueError):
+        MixedIterable({"a": []})
+
+    mixed = MixedIterable({"a": UnsizedDataLoader([])})
+    with pytest.raises(ValueError, match="'a'"):
+        batches(mixed, 1)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        MixedIterable({})
+    with pytest.raises(ValueError):
+        MixedIterable({"a": [0]}, mixing="unknown")
+    with pytest.raises(ValueError):
+        MixedIterable({"a": [0]}, weights={"a": 0})
+
+
+class SlowDataLoader:
+    def __init__(self, n, delay):
+        self.n = n
+        self.delay = delay
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        for i in range(self.n):
+            time.sleep(self.delay)
+            yield i
+
+
+def test_prefetch_overlaps_sources():
+    """With prefetching, the sources load in parallel instead of one after the other."""
+    mixed = MixedIterable(
+        {name: SlowDataLoader(5, delay=0.02) for name in "abcd"}, prefetch_depth=5
+    )
+
+    start = time.perf_counter()
+    assert len(batches(mixed)) == 20
+    # serially, 20 batches take 0.4 seconds to load
+    assert time.perf_counter() - start < 0.3
+
+    mixed.close()
+    time.sleep(0.05)
+    assert not [t for t in threading.enumerate() if t.name == "dloop-prefetch"]
@@ -0,0 +1,153 @@
+import math
+
+import pytest
+
+from dloop.events import Event, LoopEvents
+from dloop.loop import Loop
+from dloop.monitors import _Divergence, _Plateau
+
+
+def test_plateau_invalid_args():
+    with pytest.raises(ValueError, match="patience"):
+        Event(on_plateau="loss", patience=0)
+    with pytest.raises(ValueError, match="min_delta"):
+        Event(on_plateau="loss", min_delta=-1)
+    with pytest.raises(ValueError, match="mode"):
+        Event(on_plateau="loss", mode="lowest")
+    with pytest.raises(ValueError, match="ema_alpha"):
+        Event(on_plateau="loss", ema_alpha=2)
+
+
+def test_plateau():
+    plateau = _Plateau(patience=2, min_delta=0.1, mode="min", ema_alpha=None)
+    fired = [plateau.update(v) for v in (5, 4, 4.95, 3.95, 3.9, 3.9, 3.89, 3.88, 3.87)]
+    # values within 0.1 of the best one don't count as improvements
+    assert fired == [False, False, False, True, False, True, False, False, True]
+
+
+def test_plateau_max_mode():
+    plateau = _Plateau(patience=1, min_delta=0, mode="max", ema_alpha=None)
+    assert [plateau.update(v) for v in (0.5, 0.6, 0.6, 0.7, 0.1)] == [
+        False,
+        False,
+        True,
+        False,
+        True,
+    ]
+
+
+def test_plateau_ema():
+    plateau = _Plateau(patience=1, min_delta=0, mode="min", ema_alpha=0.5)
+    # the spike is smoothed, the smoothed value still improves
+    assert [plateau.update(v) for v in (4, 2, 2.5, 1)] == [False, False, False, False]
+    assert plateau.ema == 1.875
+    # a spike breaking the smoothed trend fires
+    assert plateau.update(5)
+
+
+def test_plateau_skips_non_finite():
+    plateau = _Plateau(patience=1, min_delta=0, mode="min", ema_alpha=0.5)
+    assert [plateau.update(v) for v in (4, math.nan, math.inf, 2)] == [False] * 4
+    # the average isn't stuck at NaN
+    assert plateau.ema == 3.0
+    assert plateau.update(3.5)
+
+
+def test_divergence():
+    divergence = _Divergence(threshold=10, mode="min")
+    assert [divergence.update(v) for v in (1, 9.9, 11, math.nan, math.inf)] == [
+        False,
+        False,
+        True,
+        True,
+        True,
+    ]
+    assert _Divergence(threshold=None, mode="min").update(math.nan)
+    assert not _Divergence(threshold=None, mode="min").update(1e30)
+
+
+def test_loop_early_stopping():
+    events = {
+        "Eval": Event(every_n_steps=10),
+        "EarlyStop": Event(on_plateau="val_loss", patience=2, end_training=True),
+    }
+    val_losses = iter([5, 4, 4.5, 4.2, 3])
+    loop = Loop(range(100), events=events, max_epochs=1)
+    steps = []
+    for batch, batch_events in loop:
+        steps.append((batch, batch_events))
+        if "Eval" in batch_events:
+            loop.report(val_loss=next(val_losses))
+
+    # plateau after the evals of steps 29 and 39, training ends on the next step
+    assert len(steps) == 41
+    batch, batch_events = steps[-1]
+    assert batch == 40
+    assert batch_events == {"EarlyStop", LoopEvents.TRAINING_END}
+    assert loop._loop_state.training_end
+
+
+def test_loop_divergence_event_doesnt_end_training():
+    events = {"Diverged": Event(on_divergence="loss")}
+    loop = Loop(range(10), events=events, max_steps=10)
+    diverged = []
+    for batch, batch_events in loop:
+        if "Diverged" in batch_events:
+            diverged.append(batch)
+        loop.report(loss=math.nan if batch == 3 else 1.0, other=math.nan)
+    assert diverged == [4]
+
+
+def test_loop_early_stopping_chunked():
+    events = {"Stop": Event(on_divergence="loss", end_training=True)}
+    loop = Loop(range(100), events=events, max_steps=100, chunk_size=4)
+    chunks = []
+    for chunk, chunk_events in loop:
+        chunks.append((chunk, chunk_events))
+        if chunk.global_step[0] == 4:
+            loop.report(loss=math.inf)
+
+    assert len(chunks) == 3
+    chunk, chunk_events = chunks[-1]
+    assert chunk_events == {"Stop", LoopEvents.TRAINING_END}
+    assert chunk.events[0] == {"Stop"}
+    assert chunk.events[-1] == {LoopEvents.TRAINING_END}
+    assert chunk.loop_state(-1).training_end
+
+
+def test_loop_early_stopping_state(tmp_path):
+    state_file = str(tmp_path / "state.json")
+    events = {"Stop": Event(on_plateau="val_loss", patience=3, end_training=True)}
+    loop = Loop(range(10), events=events, max_steps=10, state_file=state_file)
+    for batch, _ in loop:
+        if batch == 2:
+            break
+        loop.report(val_loss=1.0)
+    loop.save_state()
+
+    # the statistics of the plateau are restored
+    loop = Loop(range(10), events=events, max_steps=10, state_file=state_file)
+    batches = []
+    for batch, _ in loop:
+        batches.append(batch)
+        loop.report(val_loss=1.0)
+    assert batches == [2, 3, 4]
+
+    # training ended, the loop doesn't run again
+    loop = Loop(range(10), events=events, max_steps=10, state_file=state_file)
+    assert list(loop) == []
+
+
+def test_loop_report_on_last_step():
+    events = {"Stop": Event(on_divergence="loss", end_training=True)}
+    loop = Loop(range(3), events=events, max_steps=3)
+    stopped = []
+    loop.on("Stop", lambda loop_state: stopped.append(loop_state.global_step))
+    for batch, _ in loop:
+        if batch == 2:
+            loop.report(loss=math.nan)
+
+    # there is no next step, the handlers are called once the last one is done
+    assert stopped == [2]
+    with pytest.raises(ValueError, match="finished"):
+        loop.report(loss=math.nan)
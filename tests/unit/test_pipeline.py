@@ -0,0 +1,241 @@
+import threading
+import time
+
+import pytest
+
+from dloop.events import LoopEvents
+from dloop.loop import Loop
+from dloop.pipeline import Pipeline
+from dloop.utils import seek
+
+
+def _square(x):
+    return x * x
+
+
+def _is_even(x):
+    return x % 2 == 0
+
+
+def test_pipeline_invalid_args():
+    with pytest.raises(ValueError, match="workers"):
+        Pipeline().map(_square, workers=-1)
+    with pytest.raises(ValueError, match="executor"):
+        Pipeline().map(_square, executor="gpu")
+    with pytest.raises(ValueError, match="max_in_flight"):
+        Pipeline().filter(_is_even, max_in_flight=0)
+    with pytest.raises(ValueError, match="size"):
+        Pipeline().batch(0)
+
+
+def test_pipeline_is_immutable():
+    pipeline = Pipeline().map(_square)
+    pipeline.filter(_is_even)
+    assert len(pipeline.stages) == 1
+    assert pipeline.preserves_length
+    assert not pipeline.filter(_is_even).preserves_length
+
+
+@pytest.mark.parametrize("workers", [0, 1, 4])
+def test_pipeline_stages(workers):
+    pipeline = (
+        Pipeline()
+        .map(_square, workers=workers)
+        .filter(_is_even, workers=workers)
+        .batch(3, collate=tuple)
+        .unbatch()
+        .batch(2)
+    )
+    iterable = pipeline.apply(range(10))
+    expected = [[0, 4], [16, 36], [64]]
+    # re-iterable, once per epoch
+    assert list(iterable) == expected
+    assert list(iterable) == expected
+    iterable.close()
+    assert list(Pipeline().batch(4, drop_last=True).apply(range(10))) == [
+        [0, 1, 2, 3],
+        [4, 5, 6, 7],
+    ]
+
+
+def test_pipeline_preserves_order_with_workers():
+    def slow_first(x):
+        # earlier items finish last
+        time.sleep(0.01 * (8 - x))
+        return x
+
+    iterable = Pipeline().map(slow_first, workers=8).apply(range(8))
+    assert list(iterable) == list(range(8))
+    iterable.close()
+
+
+def test_pipeline_bounded_in_flight():
+    started = []
+    release = threading.Event()
+
+    def blocked(x):
+        started.append(x)
+        release.wait()
+        return x
+
+    iterable = Pipeline().map(blocked, workers=2, max_in_flight=3).apply(range(100))
+    iterator = iter(iterable)
+    threading.Timer(0.05, release.set).start()
+    assert next(iterator) == 0
+    # the items submitted before the first result, and the one submitted to replace it
+    assert len(started) <= 4
+    iterator.close()
+    iterable.close()
+
+
+def test_pipeline_reads_inputs_in_background():
+    readers = set()
+
+    def dataloader():
+        for i in range(4):
+            readers.add(threading.current_thread())
+            yield i
+
+    iterable = Pipeline().map(_square, workers=2).apply(dataloader())
+    assert list(iterable) == [0, 1, 4, 9]
+    assert threading.current_thread() not in readers
+    iterable.close()
+
+
+def test_pipeline_pools_reused_across_epochs():
+    workers = set()
+
+    def record_worker(x):
+        workers.add(threading.current_thread())
+        return x
+
+    loop = Loop(range(8), pipeline=Pipeline().map(record_worker, workers=2), max_epochs=3)
+    assert [batch for batch, _ in loop] == list(range(8)) * 3
+    # the same 2 workers for every epoch
+    assert len(workers) <= 2
+    # shut down when the loop ends
+    assert not any(worker.is_alive() for worker in workers)
+
+
+def test_loop_pipeline_stops_with_blocked_upstream():
+    release = threading.Event()
+
+    class Dataloader:
+        def __len__(self):
+            return 10
+
+        def __iter__(self):
+            yield from range(2)
+            # e.g. a stream reader waiting on a queue
+            release.wait()
+            yield from range(2, 10)
+
+    start = time.perf_counter()
+    loop = Loop(Dataloader(), pipeline=Pipeline().map(_square, workers=2), max_steps=2)
+    assert [batch for batch, _ in loop] == [0, 1]
+    # the loop ends without waiting for the upstream
+    assert time.perf_counter() - start < 1
+    release.set()
+
+
+def test_pipeline_process_executor():
+    pipeline = (
+        Pipeline()
+        .map(_square, workers=2, executor="process")
+        .filter(_is_even, workers=2, executor="process")
+    )
+    iterable = pipeline.apply(range(6))
+    assert list(iterable) == [0, 4, 16]
+    iterable.close()
+
+
+def test_pipeline_exception():
+    def fail_on_3(x):
+        if x == 3:
+            raise ValueError("bad sample")
+        return x
+
+    iterable = Pipeline().map(fail_on_3, workers=2).apply(range(10))
+    iterator = iter(iterable)
+    assert [next(iterator) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(ValueError, match="bad sample"):
+        next(iterator)
+    iterable.close()
+
+
+def test_pipeline_skip():
+    loaded = []
+
+    class Dataloader:
+        def __iter__(self):
+            for i in range(10):
+                loaded.append(i)
+                yield i
+
+        def skip(self, n):
+            return range(n, 10)
+
+    # a length-preserving pipeline seeks in the dataloader
+    iterable = Pipeline().map(_square).apply(Dataloader())
+    assert list(seek(iterable, 7)) == [49, 64, 81]
+    assert loaded == []
+    iterable.close()
+    # otherwise the skipped outputs are computed and discarded
+    iterable = Pipeline().filter(_is_even).apply(Dataloader())
+    assert list(seek(iterable, 2)) == [4, 6, 8]
+    assert loaded == list(range(10))
+    iterable.close()
+
+
+def test_loop_pipeline_map_keeps_length():
+    loop = Loop(range(6), pipeline=Pipeline().map(_square, workers=2), max_epochs=2)
+    steps = list(loop)
+    assert [batch for batch, _ in steps] == [0, 1, 4, 9, 16, 25] * 2
+    assert LoopEvents.EPOCH_END in steps[5][1]
+
+
+def test_loop_pipeline_map_schedule():
+    pytest.importorskip("numpy")
+    loop = Loop(range(6), pipeline=Pipeline().map(_square, workers=2), max_epochs=2)
+    assert loop.schedule().n_steps == 12
+
+
+@pytest.mark.parametrize("strategy", ["pairwise", "prefetch", "lookahead_free"])
+def test_loop_pipeline_filter_unknown_length(strategy):
+    # the length of range(10) is known, but not after filtering
+    loop = Loop(
+        range(10),
+        pipeline=Pipeline().filter(_is_even, workers=2).batch(2),
+        max_epochs=2,
+        no_len_iteration_strategy=strategy,
+        dataloader_len=10,
+    )
+    steps = [(batch, batch_events, loop._loop_state) for batch, batch_events in loop]
+    batches = [batch for batch, _, _ in steps if batch is not None]
+    assert batches == [[0, 2], [4, 6], [8]] * 2
+
+    epoch_ends = [state.global_step for _, events, state in steps if LoopEvents.EPOCH_END in events]
+    assert epoch_ends == [2, 5]
+    assert LoopEvents.TRAINING_END in steps[-1][1]
+    with pytest.raises(ValueError, match="length"):
+        loop.schedule()
+
+
+def test_loop_pipeline_resume(tmp_path):
+    state_file = str(tmp_path / "state.json")
+    pipeline = Pipeline().filter(_is_even)
+    batches = []
+    with Loop(range(10), pipeline=pipeline, max_epochs=1, state_file=state_file) as loop:
+        for batch, _ in loop:
+            batches.append(batch)
+            if batch == 4:
+                break
+    with Loop(range(10), pipeline=pipeline, max_epochs=1, state_file=state_file) as loop:
+        batches.extend(batch for batch, _ in loop)
+    # the interrupted step is repeated
+    assert batches == [0, 2, 4, 4, 6, 8]
+
+
+def test_loop_pipeline_mixed():
+    with pytest.raises(ValueError, match="pipeline"):
+        Loop({"a": [1], "b": [2]}, max_steps=2, pipeline=Pipeline().map(_square))
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+import traceback
+
+import pytest
+
+from dloop.prefetch import PrefetchIterable, aprefetch, prefetch
+
+
+def test_prefetch_order():
+    assert list(prefetch(range(100), depth=3)) == list(range(100))
+    assert list(prefetch([], depth=3)) == []
+
+
+def test_prefetch_bounded_queue():
+    """The producer never gets more than depth items (+1 being put) ahead of the consumer."""
+    produced = []
+
+    def gen():
+        for i in range(20):
+            produced.append(i)
+            yield i
+
+    it = prefetch(gen(), depth=2)
+    assert next(it) == 0
+    time.sleep(0.1)
+    # 1 consumed, 2 in the queue, 1 waiting to be put
+    assert len(produced) <= 4
+    it.close()
+
+
+def test_prefetch_exception_traceback():
+    def failing_gen():
+        yield 0
+        raise RuntimeError("corrupt sample")
+
+    it = prefetch(failing_gen())
+    assert next(it) == 0
+    with pytest.raises(RuntimeError, match="corrupt sample") as exc_info:
+        next(it)
+
+    # the traceback still points at the line that raised in the producer thread
+    frames = [frame.name for frame in traceback.extract_tb(exc_info.value.__traceback__)]
+    assert "failing_gen" in frames
+
+
+def test_prefetch_close_stops_producer():
+    def infinite_gen():
+        i = 0
+        while True:
+            yield i
+            i += 1
+
+    n_threads = threading.active_count()
+    it = prefetch(infinite_gen(), depth=1)
+    assert next(it) == 0
+    it.close()
+
+    # the producer notices the stop request and exits
+    deadline = time.time() + 2
+    while threading.active_count() > n_threads and time.time() < deadline:
+        time.sleep(0.01)
+    assert threading.active_count() == n_threads
+
+
+def test_prefetch_iterable():
+    dl = PrefetchIterable([1, 2, 3], depth=2)
+    # re-iterable, once per epoch
+    assert list(dl) == [1, 2, 3]
+    assert list(dl) == [1, 2, 3]
+
+    with pytest.raises(ValueError, match="depth"):
+        PrefetchIterable([1, 2, 3], depth=0)
+
+
+def test_aprefetch():
+    async def agen():
+        for i in range(10):
+            await asyncio.sleep(0)
+            yield i
+
+    async def collect(depth):
+        return [item async for item in aprefetch(agen(), depth=depth)]
+
+    assert asyncio.run(collect(1)) == list(range(10))
+    assert asyncio.run(collect(4)) == list(range(10))
+
+
+def test_prefetch_iterable_skip():
+    dl = PrefetchIterable([1, 2, 3, 4], depth=2)
+    assert list(dl.skip(3)) == [4]
@@ -0,0 +1,126 @@
+import json
+import os
+import pstats
+import tracemalloc
+
+import pytest
+
+from dloop.events import Event
+from dloop.loop import Loop
+from dloop.profiling import Profiler
+from dloop.types import LoopState
+
+
+def _user_code():
+    return sum(range(100))
+
+
+def _state(global_step: int) -> LoopState:
+    return LoopState(
+        epoch=0,
+        global_step=global_step,
+        epoch_step=global_step,
+        epoch_end=False,
+        training_end=False,
+    )
+
+
+def _functions(path: str) -> set[str]:
+    return {function for _, _, function in pstats.Stats(path).stats}
+
+
+def test_profiler_invalid_args():
+    with pytest.raises(ValueError, match="n_steps"):
+        Profiler("profile.prof", n_steps=0)
+    with pytest.raises(ValueError, match="kind"):
+        Profiler("profile.prof", kind="perf")
+
+
+def test_profiler_window(tmp_path):
+    profiler = Profiler(str(tmp_path / "profile-{global_step}.prof"), n_steps=2)
+    profiler.open(_state(3))
+    assert profiler.active
+    with pytest.raises(RuntimeError, match="already open"):
+        profiler.open(_state(3))
+
+    for _ in range(2):
+        _user_code()
+        profiler.loop_code()
+        sorted(range(100))
+        profiler.step_done()
+        if profiler.active:
+            profiler.user_code()
+    assert not profiler.active
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "profile-3.json",
+        "profile-3.loop.prof",
+        "profile-3.prof",
+    ]
+    assert "_user_code" in _functions(str(tmp_path / "profile-3.prof"))
+    assert "_user_code" not in _functions(str(tmp_path / "profile-3.loop.prof"))
+    assert "<built-in method builtins.sorted>" in _functions(str(tmp_path / "profile-3.loop.prof"))
+
+    with open(tmp_path / "profile-3.json") as f:
+        summary = json.load(f)
+    assert summary["global_step"] == 3
+    assert summary["n_steps"] == 2
+    assert summary["user_seconds"] > 0
+    assert summary["loop_seconds"] > 0
+
+
+def test_profiler_tracemalloc(tmp_path):
+    assert not tracemalloc.is_tracing()
+    profiler = Profiler(str(tmp_path / "mem.snapshot"), kind="tracemalloc")
+    profiler.open(_state(0))
+    kept = bytearray(50_000)
+    # temporary allocations count towards the peak of the part they are made in
+    assert len(bytearray(200_000)) == 200_000
+    profiler.loop_code()
+    profiler.step_done()
+
+    # tracing is stopped if the profiler started it
+    assert not tracemalloc.is_tracing()
+    snapshot = tracemalloc.Snapshot.load(str(tmp_path / "mem.snapshot"))
+    assert sum(stat.size for stat in snapshot.statistics("filename")) >= 50_000
+    with open(tmp_path / "mem.json") as f:
+        summary = json.load(f)
+    assert summary["user_peak_bytes"] >= 250_000
+    assert 50_000 <= summary["loop_peak_bytes"] < 250_000
+    del kept
+
+
+def test_loop_profile_on(tmp_path):
+    events = {"Profile": Event(every_n_steps=4)}
+    profiler = Profiler(str(tmp_path / "profile-{global_step}.prof"), n_steps=2)
+    loop = Loop(range(10), events=events, max_steps=10, profiler=profiler, profile_on=["Profile"])
+    for _ in loop:
+        _user_code()
+
+    assert not profiler.active
+    # windows open on steps 3 and 7
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith(".json")) == [
+        "profile-3.json",
+        "profile-7.json",
+    ]
+    for step in (3, 7):
+        assert "_user_code" in _functions(str(tmp_path / f"profile-{step}.prof"))
+        # fetching the next batch is the loop's own code
+        loop_functions = _functions(str(tmp_path / f"profile-{step}.loop.prof"))
+        assert "_user_code" not in loop_functions
+        assert "get_iter_dl_with_events" in loop_functions
+        with open(tmp_path / f"profile-{step}.json") as f:
+            assert json.load(f)["n_steps"] == 2
+
+
+def test_loop_profile_window_cut_short(tmp_path):
+    events = {"Profile": Event(at_step=8)}
+    profiler = Profiler(str(tmp_path / "profile.prof"), n_steps=5)
+    loop = Loop(range(10), events=events, max_steps=10, profiler=profiler, profile_on=["Profile"])
+    for _ in loop:
+        pass
+
+    # the loop ended 2 steps into the window
+    assert not profiler.active
+    with open(tmp_path / "profile.json") as f:
+        assert json.load(f)["n_steps"] == 2
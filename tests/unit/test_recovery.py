@@ -0,0 +1,306 @@
+import pytest
+
+from dloop.events import Event, LoopEvents
+from dloop.exceptions import DataloaderErrorRateExceeded
+from dloop.loop import Loop
+from dloop.recovery import ErrorPolicy, RecoveringIterable
+
+
+class FlakyDataLoader:
+    """Dataloader whose iterator raises on some batches, either failing once or every time."""
+
+    def __init__(self, n: int, failing: set[int], transient: bool = False, survives: bool = False):
+        self.n = n
+        self.failing = set(failing)
+        self.transient = transient
+        # whether the iterator keeps going after raising, like PyTorch's DataLoader
+        self.survives = survives
+
+    def __len__(self):
+        return self.n
+
+    def _generate(self, start: int):
+        for i in range(start, self.n):
+            if i in self.failing:
+                if self.transient:
+                    self.failing.discard(i)
+                raise OSError(f"can't read batch {i}")
+            yield i
+
+    def skip(self, n: int):
+        return _Skipped(self, n)
+
+    def __iter__(self):
+        return self._iter(0)
+
+    def _iter(self, start: int):
+        if self.survives:
+            return _SurvivingIterator(self, start)
+        return self._generate(start)
+
+
+class _Skipped:
+    def __init__(self, dl: FlakyDataLoader, n: int):
+        self.dl = dl
+        self.n = n
+
+    def __iter__(self):
+        return self.dl._iter(self.n)
+
+
+class _SurvivingIterator:
+    def __init__(self, dl: FlakyDataLoader, start: int):
+        self.dl = dl
+        self.i = start
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        i = self.i
+        if i >= self.dl.n:
+            raise StopIteration
+        self.i += 1
+        if i in self.dl.failing:
+            raise OSError(f"can't read batch {i}")
+        return i
+
+
+def test_error_policy_invalid_args():
+    with pytest.raises(ValueError, match="action"):
+        ErrorPolicy("ignore")
+    with pytest.raises(ValueError, match="max_retries"):
+        ErrorPolicy(max_retries=-1)
+    with pytest.raises(ValueError, match="max_error_rate"):
+        ErrorPolicy(max_error_rate=2)
+    with pytest.raises(ValueError, match="window"):
+        ErrorPolicy(window=0)
+    with pytest.raises(ValueError, match="max_kept_errors"):
+        ErrorPolicy(max_kept_errors=-1)
+
+
+@pytest.mark.parametrize(
+    "action,dl",
+    [
+        ("continue", FlakyDataLoader(6, {2}, survives=True)),
+        ("restart", FlakyDataLoader(6, {2})),
+    ],
+)
+def test_recovering_iterable_skips(action, dl):
+    batches = list(RecoveringIterable(dl, ErrorPolicy(action)))
+    assert [b if isinstance(b, int) else None for b in batches] == [0, 1, None, 3, 4, 5]
+    assert str(batches[2].exception) == "can't read batch 2"
+
+
+class _NotSeekable:
+    # re-iterable without `skip` or index-based access, so seeking replays it from the start
+    def __init__(self, dl):
+        self.dl = dl
+
+    def __iter__(self):
+        return iter(self.dl)
+
+
+@pytest.mark.parametrize("action", ["restart", "retry"])
+def test_recovering_iterable_not_seekable(action):
+    # the epoch would be replayed up to the failed batch
+    with pytest.raises(ValueError, match="seek"):
+        RecoveringIterable(_NotSeekable(FlakyDataLoader(8, {2})), ErrorPolicy(action))
+    with pytest.raises(ValueError, match="seek"):
+        Loop(_NotSeekable(FlakyDataLoader(8, {2})), max_epochs=1, error_policy=ErrorPolicy(action))
+
+
+def test_recovering_iterable_not_seekable_survives():
+    # the iterator survives exceptions, so it continues past the failed batches
+    dl = _NotSeekable(FlakyDataLoader(8, {2, 5}, survives=True))
+    batches = list(RecoveringIterable(dl, ErrorPolicy("continue")))
+    assert [b if isinstance(b, int) else None for b in batches] == [0, 1, None, 3, 4, None, 6, 7]
+
+
+def test_loop_error_policy_generator():
+    def generate():
+        for i in range(8):
+            if i == 2:
+                raise OSError("corrupt sample")
+            yield i
+
+    class GeneratorDataLoader:
+        def __iter__(self):
+            return generate()
+
+    loop = Loop(GeneratorDataLoader(), max_epochs=2, error_policy=ErrorPolicy("continue"))
+    batches = [batch for batch, _ in loop]
+    # the generator stops on the exception, ending the epoch. A single incident per epoch, far
+    # from the default max_error_rate
+    assert batches == [0, 1, None, 0, 1, None]
+    assert [(e.epoch, e.epoch_step) for e in loop.dataloader_errors] == [(0, 2), (1, 2)]
+
+
+def test_error_policy_default_exceptions():
+    class BuggyDataLoader(FlakyDataLoader):
+        def _generate(self, start: int):
+            yield 0
+            raise TypeError("bug in collate")
+
+    # only I/O errors are recovered from by default
+    loop = Loop(BuggyDataLoader(4, set()), max_epochs=1, error_policy=ErrorPolicy())
+    with pytest.raises(TypeError, match="collate"):
+        list(loop)
+
+
+def test_recovering_iterable_retry():
+    dl = FlakyDataLoader(4, {1}, transient=True)
+    batches = list(RecoveringIterable(dl, ErrorPolicy("retry", backoff_seconds=0)))
+    assert [b if isinstance(b, int) else b.batch for b in batches] == [0, 1, 2, 3]
+    assert batches[1].n_retries == 1
+
+
+def test_recovering_iterable_not_recovered():
+    dl = FlakyDataLoader(4, {1})
+    iterator = iter(RecoveringIterable(dl, ErrorPolicy(exceptions=(ValueError,))))
+    assert next(iterator) == 0
+    with pytest.raises(OSError):
+        next(iterator)
+
+
+def test_loop_error_policy_restart():
+    dl = FlakyDataLoader(5, {1, 4})
+    events = {"Every2": Event(every_n_steps=2)}
+    loop = Loop(dl, events=events, max_epochs=2, error_policy=ErrorPolicy("restart"))
+    steps = [(batch, batch_events) for batch, batch_events in loop]
+
+    # the failed batches are still counted as steps
+    assert [batch for batch, _ in steps] == [0, None, 2, 3, None] * 2
+    assert [LoopEvents.EXCEPTION in batch_events for _, batch_events in steps] == [
+        False,
+        True,
+        False,
+        False,
+        True,
+    ] * 2
+    # the events of failed steps still trigger, including the end of each epoch
+    assert steps[1][1] == {"Every2", LoopEvents.EXCEPTION}
+    assert LoopEvents.EPOCH_END in steps[4][1]
+    assert LoopEvents.TRAINING_END in steps[9][1]
+
+    assert [(e.epoch, e.global_step, e.epoch_step) for e in loop.dataloader_errors] == [
+        (0, 1, 1),
+        (0, 4, 4),
+        (1, 6, 1),
+        (1, 9, 4),
+    ]
+    assert all(e.lost and e.n_retries == 0 for e in loop.dataloader_errors)
+    assert loop.dataloader_errors[0].exception_type is OSError
+    assert loop.dataloader_errors[0].message == "can't read batch 1"
+
+
+def test_loop_error_policy_retry():
+    dl = FlakyDataLoader(5, {2}, transient=True)
+    loop = Loop(
+        dl, max_epochs=1, error_policy=ErrorPolicy("retry", backoff_seconds=0, max_retries=2)
+    )
+    steps = list(loop)
+    assert [batch for batch, _ in steps] == [0, 1, 2, 3, 4]
+    assert LoopEvents.EXCEPTION in steps[2][1]
+    (error,) = loop.dataloader_errors
+    assert (error.global_step, error.n_retries, error.lost) == (2, 1, False)
+
+
+def test_loop_error_policy_retry_exhausted():
+    dl = FlakyDataLoader(4, {2})
+    loop = Loop(
+        dl, max_epochs=1, error_policy=ErrorPolicy("retry", backoff_seconds=0, max_retries=2)
+    )
+    assert [batch for batch, _ in loop] == [0, 1, None, 3]
+    (error,) = loop.dataloader_errors
+    assert (error.n_retries, error.lost) == (2, True)
+
+
+def test_loop_error_policy_max_error_rate():
+    dl = FlakyDataLoader(10, {1, 3, 4})
+    policy = ErrorPolicy("restart", max_error_rate=0.5, window=4)
+    loop = Loop(dl, max_epochs=1, error_policy=policy)
+    batches = []
+    with pytest.raises(DataloaderErrorRateExceeded) as excinfo:
+        for batch, _ in loop:
+            batches.append(batch)
+    # steps 1, 3 and 4 failed: 3 of the last 4 steps
+    assert batches == [0, None, 2, None]
+    assert isinstance(excinfo.value.__cause__, OSError)
+
+
+def test_loop_error_policy_max_kept_errors():
+    dl = FlakyDataLoader(10, {1, 3, 5, 7})
+    policy = ErrorPolicy("restart", max_error_rate=1, max_kept_errors=2)
+    loop = Loop(dl, max_epochs=1, error_policy=policy)
+    assert [batch for batch, _ in loop] == [0, None, 2, None, 4, None, 6, None, 8, 9]
+    # only the most recent incidents are kept
+    assert [e.global_step for e in loop.dataloader_errors] == [5, 7]
+
+
+def test_loop_error_policy_unknown_length():
+    dl = FlakyDataLoader(4, {1})
+    loop = Loop(
+        _Unsized(dl),
+        max_steps=4,
+        dataloader_len=None,
+        error_policy=ErrorPolicy("restart"),
+    )
+    assert [batch for batch, _ in loop] == [0, None, 2, 3]
+
+
+class _Unsized:
+    def __init__(self, dl):
+        self.dl = dl
+
+    def skip(self, n: int):
+        return self.dl.skip(n)
+
+    def __iter__(self):
+        return iter(self.dl)
+
+
+class RecordingDataLoader:
+    def __init__(self):
+        self.used = False
+
+    def __len__(self):
+        self.used = True
+        return 1
+
+    def __iter__(self):
+        self.used = True
+        return iter([0])
+
+
+def test_loop_error_policy_mixed():
+    sources = {"a": RecordingDataLoader(), "b": RecordingDataLoader()}
+    with pytest.raises(ValueError, match="error_policy"):
+        Loop(sources, max_steps=2, error_policy=ErrorPolicy())
+    # the arguments are checked before the sources start loading
+    assert not any(source.used for source in sources.values())
+
+
+@pytest.mark.parametrize(
+    "action,transient,expected",
+    [
+        # the failed batches are lost, and count as 0
+        ("restart", False, [(1, 10), (1, 10), (4, 20), (4, 20), (9, 30)]),
+        # the failed batches are loaded by a retry, and counted
+        ("retry", True, [(1, 10), (3, 20), (6, 30), (10, 40), (15, 50)]),
+    ],
+)
+def test_loop_error_policy_counts(action, transient, expected):
+    dl = FlakyDataLoader(5, {1, 3}, transient=transient)
+    loop = Loop(
+        dl,
+        max_epochs=1,
+        error_policy=ErrorPolicy(action, backoff_seconds=0),
+        batch_size_fn=lambda batch: batch + 1,
+        token_count_fn=lambda batch: 10,
+    )
+    counts = []
+    for _ in loop:
+        counts.append((loop._loop_state.n_samples, loop._loop_state.n_tokens))
+    assert counts == expected
+    assert len(loop.dataloader_errors) == 2
@@ -0,0 +1,64 @@
+import pytest
+
+from dloop.events import Event, LoopEvents
+from dloop.loop import Loop
+from dloop.schedule import compile_schedule
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.mark.parametrize("stop", [{"max_epochs": 3}, {"max_steps": 10}])
+def test_schedule_matches_loop(stop):
+    events = {
+        "Every3": Event(every_n_steps=3),
+        "At5": Event(at_step=5),
+        "Both": Event(every_n_steps=2, at_step=4),
+    }
+    loop = Loop(list(range(4)), events=events, **stop)
+    schedule = loop.schedule()
+    run = [batch_events for _, batch_events in loop]
+
+    assert schedule.keys == ["Every3", "At5", "Both"]
+    assert schedule.n_steps == len(run)
+    for step, batch_events in enumerate(run):
+        assert {k for k, fired in zip(schedule.keys, schedule.events[step]) if fired} == (
+            batch_events - set(LoopEvents)
+        )
+        assert schedule.epoch_end[step] == (LoopEvents.EPOCH_END in batch_events)
+        assert schedule.training_end[step] == (LoopEvents.TRAINING_END in batch_events)
+    assert list(schedule.epoch_step) == [step % 4 for step in range(len(run))]
+
+
+def test_schedule_steps_and_count():
+    schedule = compile_schedule(
+        {"Logging": Event(every_n_steps=100), "DecreaseLR": Event(at_step=10_000)},
+        dl_len=1000,
+        max_steps=1_000_000,
+    )
+    assert schedule.count("Logging") == 10_000
+    assert list(schedule.steps("Logging")[:3]) == [99, 199, 299]
+    assert list(schedule.steps("DecreaseLR")) == [10_000]
+    assert schedule.epoch[-1] == 999
+    assert schedule.epoch_end.sum() == 1000
+
+
+def test_schedule_skips_dynamic_events():
+    events = {
+        "Step": Event(every_n_steps=2),
+        "Time": Event(every_n_seconds=1),
+        "Mixed": Event(every_n_steps=2, at_time=3),
+        "Custom": Event(condition_function=lambda s: True),
+        # fires on the steps after the metric plateaus too
+        "Plateau": Event(every_n_steps=2, on_plateau="val_loss"),
+        "Divergence": Event(at_step=1, on_divergence="loss"),
+    }
+    schedule = compile_schedule(events, dl_len=4, max_epochs=1)
+    assert schedule.keys == ["Step"]
+    assert schedule.events.shape == (4, 1)
+
+
+def test_schedule_unknown():
+    with pytest.raises(ValueError):
+        Loop(iter(range(4)), max_epochs=1).schedule()
+    with pytest.raises(ValueError):
+        Loop(list(range(4)), max_seconds=1).schedule()
@@ -0,0 +1,168 @@
+from dloop.events import Event, LoopEvents
+from dloop.scheduler import EventScheduler
+from dloop.types import LoopState
+
+
+def iter_states(epoch_lengths):
+    global_step = 0
+    for epoch, epoch_len in enumerate(epoch_lengths):
+        for epoch_step in range(epoch_len):
+            yield LoopState(
+                epoch=epoch,
+                global_step=global_step,
+                epoch_step=epoch_step,
+                epoch_end=epoch_step == epoch_len - 1,
+                training_end=False,
+            )
+            global_step += 1
+
+
+def make_events():
+    return {
+        "Every3": Event(every_n_steps=3),
+        "Every5": Event(every_n_steps=5),
+        "At7": Event(at_step=7),
+        "At100": Event(at_step=100),
+        "Every4At6": Event(every_n_steps=4, at_step=6),
+        "Custom": Event(lambda loop_state: loop_state.global_step % 7 == 2),
+        "CustomAndEvery2": Event(lambda loop_state: loop_state.epoch == 1, every_n_steps=2),
+    }
+
+
+def test_scheduler_matches_should_trigger():
+    """Step-based scheduling gives the same result as polling every event."""
+    # uneven epochs check that epoch_step-based periods are reset on every new epoch
+    epoch_lengths = [10, 7, 3, 12]
+
+    polled_events = make_events()
+    scheduler = EventScheduler(make_events())
+
+    for loop_state in iter_states(epoch_lengths):
+        expected = {k for k, e in polled_events.items() if e.should_trigger(loop_state)}
+        assert scheduler.triggered_events(loop_state) == expected
+
+
+def test_scheduler_no_events():
+    scheduler = EventScheduler()
+    for loop_state in iter_states([4, 4]):
+        assert scheduler.triggered_events(loop_state) == set()
+
+
+def test_scheduler_skipped_steps():
+    """Entries left behind by skipped steps are rescheduled from the current step."""
+    scheduler = EventScheduler({"Every4": Event(every_n_steps=4), "At5": Event(at_step=5)})
+
+    def state(global_step):
+        return LoopState(
+            epoch=0,
+            global_step=global_step,
+            epoch_step=global_step,
+            epoch_end=False,
+            training_end=False,
+        )
+
+    assert scheduler.triggered_events(state(0)) == set()
+    assert scheduler.triggered_events(state(7)) == {"Every4"}
+    assert scheduler.triggered_events(state(9)) == set()
+    assert scheduler.triggered_events(state(11)) == {"Every4"}
+
+
+def test_scheduler_time_events():
+    """Time-based events trigger on the same steps as with polling."""
+    # one step every 0.7 seconds
+    steps = [
+        LoopState(
+            epoch=0,
+            global_step=i,
+            epoch_step=i,
+            epoch_end=False,
+            training_end=False,
+            elapsed_seconds=0.7 * i,
+        )
+        for i in range(50)
+    ]
+
+    def make_events():
+        return {
+            "Every5s": Event(every_n_seconds=5),
+            "At12s": Event(at_time=12),
+            "Mixed": Event(every_n_steps=4, every_n_seconds=3),
+            "Both": Event(every_n_seconds=2, at_time=6),
+        }
+
+    polled_events = make_events()
+    expected = [{k for k, e in polled_events.items() if e.should_trigger(s)} for s in steps]
+
+    scheduler = EventScheduler(make_events())
+    got = [scheduler.triggered_events(s) for s in steps]
+
+    assert got == expected
+    assert sum("At12s" in e for e in got) == 1
+
+
+def test_scheduler_count_events():
+    """Sample- and token-based events trigger on the same steps as with polling."""
+    # variable batch sizes, with 12 tokens per sample
+    batch_sizes = [3, 1, 8, 2, 2, 16, 1, 1, 5, 4] * 3
+    steps = []
+    n_samples = 0
+    for i, batch_size in enumerate(batch_sizes):
+        n_samples += batch_size
+        steps.append(
+            LoopState(
+                epoch=0,
+                global_step=i,
+                epoch_step=i,
+                epoch_end=False,
+                training_end=False,
+                n_samples=n_samples,
+                n_tokens=12 * n_samples,
+            )
+        )
+
+    def make_events():
+        return {
+            "Every10Samples": Event(every_n_samples=10),
+            "Every100Tokens": Event(every_n_tokens=100),
+            "Mixed": Event(every_n_steps=3, every_n_samples=7),
+            "Both": Event(every_n_samples=4, every_n_tokens=50),
+        }
+
+    polled_events = make_events()
+    expected = [{k for k, e in polled_events.items() if e.should_trigger(s)} for s in steps]
+
+    scheduler = EventScheduler(make_events())
+    got = [scheduler.triggered_events(s) for s in steps]
+
+    assert got == expected
+    # a batch crossing several multiples of 10 (16 samples, from 16 to 32) triggers once
+    assert [i for i, e in enumerate(got) if "Every10Samples" in e][:4] == [2, 5, 9, 12]
+
+
+def test_scheduler_interned_events():
+    """Interned event sets match triggered_events, and are shared across steps."""
+    epoch_lengths = [10, 7, 3, 12]
+
+    scheduler = EventScheduler(make_events())
+    interned_scheduler = EventScheduler(make_events())
+
+    seen = {}
+    for loop_state in iter_states(epoch_lengths):
+        expected = scheduler.triggered_events(loop_state)
+        if loop_state.epoch_end:
+            expected.add(LoopEvents.EPOCH_END)
+
+        batch_events = interned_scheduler.triggered_events_interned(loop_state)
+        assert isinstance(batch_events, frozenset)
+        assert batch_events == expected, loop_state
+
+        assert seen.setdefault(batch_events, batch_events) is batch_events
+
+
+def test_scheduler_interned_builtin_events():
+    scheduler = EventScheduler()
+    state = LoopState(epoch=0, global_step=0, epoch_step=0, epoch_end=True, training_end=True)
+    assert scheduler.triggered_events_interned(state) == {
+        LoopEvents.EPOCH_END,
+        LoopEvents.TRAINING_END,
+    }
@@ -0,0 +1,47 @@
+import json
+import os
+from enum import Enum, auto
+
+import pytest
+
+from dloop.state import event_key_id, load_state, save_state
+
+
+def test_save_and_load_state(tmp_path):
+    path = str(tmp_path / "state.json")
+    assert load_state(path) is None
+
+    save_state(path, {"global_step": 3})
+    assert load_state(path) == {"global_step": 3}
+
+    # overwriting leaves no temporary files behind
+    save_state(path, {"global_step": 4})
+    assert load_state(path) == {"global_step": 4}
+    assert os.listdir(tmp_path) == ["state.json"]
+
+
+def test_save_state_failure_keeps_previous_state(tmp_path):
+    path = str(tmp_path / "state.json")
+    save_state(path, {"global_step": 3})
+
+    with pytest.raises(TypeError):
+        save_state(path, {"global_step": object()})
+
+    assert load_state(path) == {"global_step": 3}
+    assert os.listdir(tmp_path) == ["state.json"]
+
+
+def test_load_state_version_mismatch(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text(json.dumps({"version": 0, "global_step": 3}))
+
+    with pytest.raises(ValueError, match="version"):
+        load_state(str(path))
+
+
+def test_event_key_id():
+    class CustomEvents(Enum):
+        VALIDATION = auto()
+
+    assert event_key_id("Logging") == "Logging"
+    assert event_key_id(CustomEvents.VALIDATION) == "CustomEvents.VALIDATION"
@@ -0,0 +1,45 @@
+import pytest
+
+from dloop.timing import StepTimer
+
+
+def test_step_timer_no_steps():
+    assert StepTimer().stats() is None
+
+
+def test_step_timer_stats():
+    timer = StepTimer(window=100)
+    for i in range(100):
+        timer.record(data_wait=0.001 * (i + 1), compute=0.003)
+
+    stats = timer.stats()
+    assert stats.n_steps == 100
+    assert stats.data_wait_p50 == pytest.approx(0.051)
+    assert stats.data_wait_p99 == pytest.approx(0.1)
+    assert stats.compute_p50 == pytest.approx(0.003)
+    assert stats.compute_p99 == pytest.approx(0.003)
+
+    total_data_wait = 0.001 * 100 * 101 / 2
+    total = total_data_wait + 0.3
+    assert stats.steps_per_second == pytest.approx(100 / total)
+    assert stats.data_starvation_ratio == pytest.approx(total_data_wait / total)
+
+
+def test_step_timer_window():
+    timer = StepTimer(window=10)
+    for _ in range(10):
+        timer.record(data_wait=1.0, compute=1.0)
+    for _ in range(10):
+        timer.record(data_wait=0.0, compute=1.0)
+
+    # only the most recent steps count
+    stats = timer.stats()
+    assert stats.n_steps == 10
+    assert stats.data_wait_p99 == 0.0
+    assert stats.data_starvation_ratio == 0.0
+    assert stats.steps_per_second == pytest.approx(1.0)
+
+
+def test_step_timer_invalid_window():
+    with pytest.raises(ValueError):
+        StepTimer(window=0)
@@ -0,0 +1,131 @@
+import pytest
+
+from dloop.events import Event, LoopEvents
+from dloop.loop import Loop
+from dloop.scheduler import EventScheduler
+from dloop.triggers import after, at, every, when
+from dloop.types import LoopState
+
+
+def iter_states(epoch_lengths):
+    global_step = 0
+    for epoch, epoch_len in enumerate(epoch_lengths):
+        for epoch_step in range(epoch_len):
+            yield LoopState(
+                epoch=epoch,
+                global_step=global_step,
+                epoch_step=epoch_step,
+                epoch_end=epoch_step == epoch_len - 1,
+                training_end=False,
+            )
+            global_step += 1
+
+
+def make_events():
+    return {
+        "EveryAfter": Event(trigger=every(4) & after(9)),
+        "GlobalOffset": Event(trigger=every(5, offset=3, per_epoch=False)),
+        "Or": Event(trigger=at(2) | every(7, per_epoch=False)),
+        "Not": Event(trigger=~every(3) & ~after(20)),
+        "NotAfter": Event(trigger=~after(5)),
+        "Never": Event(trigger=every(2) & every(2, offset=1)),
+        "Limit": Event(trigger=every(3).limit(4)),
+        "When": Event(trigger=every(2) & when(lambda s: s.epoch % 2 == 1)),
+        "WithStepConditions": Event(every_n_steps=5, trigger=every(3).limit(3)),
+    }
+
+
+def test_triggers():
+    states = list(iter_states([30]))
+
+    def fired(trigger):
+        return [s.global_step for s in states if trigger(s)]
+
+    assert fired(every(4)) == [3, 7, 11, 15, 19, 23, 27]
+    assert fired(every(4, offset=2)) == [5, 9, 13, 17, 21, 25, 29]
+    assert fired(every(10) & after(15)) == [19, 29]
+    assert fired(at(3) | at(5)) == [3, 5]
+    assert fired(~after(3)) == [0, 1, 2]
+    assert fired(every(2).limit(3)) == [1, 3, 5]
+
+
+@pytest.mark.parametrize("epoch_lengths", [[40], [10, 7, 3, 12]])
+def test_triggers_scheduled_like_polled(epoch_lengths):
+    """Triggers evaluated on their candidate steps fire on the same steps as when polled."""
+    polled_events = make_events()
+    scheduler = EventScheduler(make_events())
+
+    for loop_state in iter_states(epoch_lengths):
+        expected = {k for k, e in polled_events.items() if e.should_trigger(loop_state)}
+        assert scheduler.triggered_events(loop_state) == expected
+
+
+def test_triggers_next_step():
+    trigger = every(100) & after(5000)
+    assert trigger.next_step(0, 0) == 5099
+    assert (~after(10)).next_step(12, 12) is None
+    assert every(2, offset=1).next_step(0, 0) == 2
+    # no common step, the search gives up with a lower bound instead of looping forever
+    assert (every(2) & every(2, offset=1)).next_step(0, 0) is not None
+
+
+def test_triggers_invalid():
+    with pytest.raises(ValueError):
+        every(0)
+    with pytest.raises(TypeError):
+        every(2).limit(3) & after(4)
+    with pytest.raises(TypeError):
+        every(2) & (lambda s: True)
+
+
+def test_loop_trigger_limit_resume(tmp_path):
+    state_file = str(tmp_path / "state.json")
+
+    def make_loop():
+        return Loop(
+            list(range(4)),
+            max_epochs=4,
+            events={"Eval": Event(trigger=every(3, per_epoch=False).limit(3))},
+            state_file=state_file,
+        )
+
+    def eval_steps(results):
+        return [step for step, (_, events) in results if "Eval" in events]
+
+    expected = eval_steps(list(enumerate(make_loop())))
+    assert expected == [2, 5, 8]
+    (tmp_path / "state.json").unlink()
+
+    first_run = []
+    with make_loop() as loop:
+        for step, (batch, events) in enumerate(loop):
+            first_run.append((step, (batch, events)))
+            if step == 6:
+                break
+
+    # the interrupted step is repeated
+    resumed = list(enumerate(make_loop(), start=6))
+    assert eval_steps(first_run[:-1] + resumed) == expected
+    assert LoopEvents.TRAINING_END in resumed[-1][1][1]
+
+
+def test_schedule_with_triggers():
+    pytest.importorskip("numpy")
+    events = make_events()
+    schedule = Loop(list(range(10)), max_epochs=4, events=events).schedule()
+
+    # `when` conditions aren't known ahead of time
+    assert "When" not in schedule.keys
+
+    polled_events = make_events()
+    for loop_state in iter_states([10] * 4):
+        expected = {
+            k
+            for k, e in polled_events.items()
+            if k in schedule.keys and e.should_trigger(loop_state)
+        }
+        row = schedule.events[loop_state.global_step]
+        assert {k for k, f in zip(schedule.keys, row) if f} == expected
+
+    # computing the schedule doesn't consume the limits of the loop's events
+    assert events["Limit"]._trigger._get_state()["count"] == 0
@@ -0,0 +1,96 @@
+from dloop.iter_logic import iter_dl_known_length, iter_dl_unknown_length_with_pairwise_load
+from dloop.types import LoopPosition
+from dloop.utils import iter_epoch, seek
+
+
+class CountingIterable:
+    """Iterable that counts how many items were loaded."""
+
+    def __init__(self, n):
+        self.n = n
+        self.n_loaded = 0
+
+    def __iter__(self):
+        for i in range(self.n):
+            self.n_loaded += 1
+            yield i
+
+
+class SkippableDataLoader(CountingIterable):
+    def __init__(self, n):
+        super().__init__(n)
+        self.epochs = []
+        self.start = 0
+
+    def set_epoch(self, epoch):
+        self.epochs.append(epoch)
+
+    def skip(self, n):
+        skipped = SkippableDataLoader(self.n)
+        skipped.start = n
+        return skipped
+
+    def __iter__(self):
+        for i in range(self.start, self.n):
+            self.n_loaded += 1
+            yield i
+
+
+class MapStyleDataset:
+    """Iterated through __getitem__, like a map-style dataset."""
+
+    def __init__(self, n):
+        self.n = n
+        self.loaded = []
+
+    def __getitem__(self, index):
+        if index >= self.n:
+            raise IndexError(index)
+        self.loaded.append(index)
+        return index
+
+
+def test_seek_fallback():
+    dl = CountingIterable(6)
+    assert list(seek(dl, 2)) == [2, 3, 4, 5]
+    assert dl.n_loaded == 6
+
+    assert seek(dl, 0) is dl
+
+
+def test_seek_skip():
+    dl = SkippableDataLoader(6)
+    skipped = seek(dl, 4)
+    assert list(skipped) == [4, 5]
+    assert skipped.n_loaded == 2
+
+
+def test_seek_index():
+    dataset = MapStyleDataset(6)
+    assert list(seek(dataset, 4)) == [4, 5]
+    assert dataset.loaded == [4, 5]
+
+    assert list(seek([0, 1, 2, 3], 3)) == [3]
+    assert list(seek(range(10), 8)) == [8, 9]
+
+
+def test_iter_epoch_set_epoch():
+    dl = SkippableDataLoader(3)
+    assert list(iter_epoch(dl, epoch=0)) == [0, 1, 2]
+    assert list(iter_epoch(dl, epoch=1, epoch_step=2)) == [2]
+    assert dl.epochs == [0, 1]
+
+
+def test_resume_seeks_instead_of_loading():
+    """Resuming mid-epoch doesn't load the batches before the resume position."""
+    resume_from = LoopPosition(epoch=1, global_step=9, epoch_step=4)
+
+    dataset = MapStyleDataset(5)
+    it = iter_dl_known_length(dataset, dl_len=5, max_epochs=2, resume_from=resume_from)
+    assert [b for b, _ in it] == [4]
+    assert dataset.loaded == [4]
+
+    dataset = MapStyleDataset(5)
+    it = iter_dl_unknown_length_with_pairwise_load(dataset, max_epochs=2, resume_from=resume_from)
+    assert [(b, s.global_step, s.epoch_end) for b, s in it] == [(4, 9, True)]
+    assert dataset.loaded == [4]